@@ -8,6 +8,8 @@ from pydantic import BaseModel
 import asyncio
 import redis.asyncio as redis
 from typing import Optional, List
+from core.blob_store import get_blob_store
+from core.metrics import stage
 
 router = APIRouter(prefix="/api")
 
@@ -18,6 +20,7 @@ redis_client = None
 class Invoice(BaseModel):
     id: str
     filename: str
+    blob_key: Optional[str] = None
     uploader: Optional[str] = None
     state: str  # uploaded, processing, needs_approval, approved, paid, pin_required, completed
     amount: float = 0.0
@@ -60,14 +63,13 @@ async def upload_file(file: UploadFile = File(...), uploader: Optional[str] = No
         raise HTTPException(status_code=400, detail="Empty file")
 
     invoice_id = str(uuid.uuid4())
-    save_path = f"./uploads/{invoice_id}_{file.filename}"
-    os.makedirs("./uploads", exist_ok=True)
-    with open(save_path, "wb") as f:
-        f.write(contents)
+    with stage("upload_write", task="process_invoice"):
+        blob_key = await asyncio.to_thread(get_blob_store().put, contents, file.filename)
 
     inv = Invoice(
         id=invoice_id,
-        filename=os.path.basename(save_path),
+        filename=os.path.basename(file.filename or blob_key),
+        blob_key=blob_key,
         uploader=uploader,
         state="uploaded",
         amount=0.0,
@@ -76,13 +78,13 @@ async def upload_file(file: UploadFile = File(...), uploader: Optional[str] = No
     )
     await save_invoice(inv)
 
-    # enqueue Celery extraction, passing file path and invoice_id
+    # enqueue Celery extraction, passing the blob key and invoice_id
     # We import here to avoid circular imports if any
     from worker.tasks import process_invoice
-    # Note: process_invoice signature in worker/tasks.py is (file_path, invoice_id, user_id)
+    # Note: process_invoice signature in worker/tasks.py is (blob_key, invoice_id, user_id)
     # We pass uploader as user_id or a default if None
     user_id = uploader if uploader else "portal_user"
-    process_invoice.delay(save_path, invoice_id, user_id)
+    process_invoice.delay(blob_key, invoice_id, user_id)
     
     return JSONResponse({"invoice_id": invoice_id})
 
@@ -0,0 +1,70 @@
+import asyncio
+from decimal import Decimal
+
+from core.state_machine import EDITABLE_STATUSES
+from worker.dedupe import DuplicateDetector, fingerprints
+
+MAX_BULK_UPDATES = 1000
+
+# Applies per-row corrections from unnested arrays; NULL leaves a field unchanged.
+# Ownership and status are checked in the same statement, so there's no SELECT first.
+BULK_UPDATE_SQL = """
+    UPDATE transactions t SET
+        vendor = COALESCE(u.vendor, t.vendor),
+        amount = COALESCE(u.amount, t.amount),
+        account_number = COALESCE(u.account_number, t.account_number),
+        ifsc_code = COALESCE(u.ifsc_code, t.ifsc_code),
+        remarks = COALESCE(u.remarks, t.remarks),
+        updated_at = NOW()
+    FROM unnest($1::int[], $2::varchar[], $3::numeric[], $4::varchar[], $5::varchar[], $6::text[])
+        AS u(id, vendor, amount, account_number, ifsc_code, remarks)
+    WHERE t.id = u.id AND t.user_id = $7 AND t.status = ANY($8::varchar[])
+    RETURNING t.*
+"""
+
+# The dedupe key is built in Python (worker.dedupe), so it's written back in the same transaction
+FINGERPRINT_UPDATE_SQL = """
+    UPDATE transactions t SET fingerprint = f.fingerprint
+    FROM unnest($1::int[], $2::varchar[]) AS f(id, fingerprint)
+    WHERE t.id = f.id AND t.user_id = $3
+"""
+
+duplicate_detector = DuplicateDetector()
+
+
+def bulk_update_params(items: list, user_id: str) -> list:
+    return [
+        [item.id for item in items],
+        [item.vendor for item in items],
+        [Decimal(str(item.amount)) if item.amount is not None else None for item in items],
+        [item.account_number for item in items],
+        [item.ifsc_code for item in items],
+        [item.remarks for item in items],
+        user_id,
+        list(EDITABLE_STATUSES),
+    ]
+
+
+def row_fingerprint(row) -> str:
+    """The stored dedupe key for a row as it now reads, or None without an account."""
+    if not row["account_number"]:
+        return None
+    return fingerprints(row["vendor"], row["account_number"], row["amount"], row["date"])[0]
+
+
+async def apply_updates(conn, items: list, user_id: str) -> list:
+    """
+    Applies corrections to the user's editable transactions and returns the
+    updated rows; rows of other users, or past review, are left out. Edited
+    vendors, accounts and amounts get a fresh fingerprint, so duplicate
+    detection compares against what will actually be paid.
+    """
+    async with conn.transaction():
+        rows = await conn.fetch(BULK_UPDATE_SQL, *bulk_update_params(items, user_id))
+        if not rows:
+            return []
+        stored = [row_fingerprint(row) for row in rows]
+        await conn.execute(FINGERPRINT_UPDATE_SQL, [row["id"] for row in rows], stored, user_id)
+    # Blocking Redis pipeline; keep it off the event loop
+    await asyncio.to_thread(duplicate_detector.remember, stored)
+    return [dict(row, fingerprint=fp) for row, fp in zip(rows, stored)]
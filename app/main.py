@@ -1,31 +1,46 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form, Depends, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form, Depends, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from contextlib import asynccontextmanager
-import asyncpg
 from pydantic import BaseModel
-import shutil
 import os
 import uuid
 import redis
 import json
-from worker.tasks import process_invoice
+import re
+import asyncio
+from worker.tasks import process_invoice, celery_app
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from core.state_machine import transition, PENDING_STATUSES, APPROVABLE_STATUSES, NEEDS_APPROVAL, QUEUED_FOR_PAYMENT
+from app.outbox import OutboxDispatcher, enqueue
+from app.edits import apply_updates, MAX_BULK_UPDATES
+from core.bulk_file import PAYMENT_MODE
+from core.evidence import EvidenceStore
+from core.blob_store import get_blob_store
+from core import metrics
+from core.db_pool import create_pool, PoolTimeout
+from worker.notifications import NOTIFICATIONS_QUEUE
 from app.auth import verify_password, get_password_hash, create_access_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    app.state.pool = await asyncpg.create_pool(os.getenv("DATABASE_URL"))
+    # Sized and bounded by DB_POOL_*; waits show up in payagent_db_pool_wait_seconds
+    app.state.pool = await create_pool(os.getenv("DATABASE_URL"))
     # Create test user if not exists
     async with app.state.pool.acquire() as conn:
         user = await conn.fetchrow("SELECT * FROM users WHERE email = 'admin@example.com'")
         if not user:
             hashed_pw = get_password_hash("password")
             await conn.execute("INSERT INTO users (email, password_hash, role) VALUES ($1, $2, 'admin')", "admin@example.com", hashed_pw)
+    # Publishes payment tasks recorded by the approve endpoints
+    app.state.outbox = OutboxDispatcher(app.state.pool, celery_app)
+    app.state.outbox.start()
     yield
     # Shutdown
+    await app.state.outbox.stop()
     await app.state.pool.close()
 
 app = FastAPI(title="Agentic Payment Assistant", lifespan=lifespan)
@@ -43,6 +58,15 @@ app.add_middleware(
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+evidence_store = EvidenceStore()
+# Queue depth and the Redis-kept component stats are read at scrape time
+metrics.register_api_collectors(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0")), ["celery", NOTIFICATIONS_QUEUE])
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    # Saturated, not broken: tell clients (and load tests) to back off and retry
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = decode_access_token(token)
@@ -83,21 +107,20 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @app.post("/upload")
 async def upload_invoice(file: UploadFile = File(...), current_user_id: str = Depends(get_current_user)):
     """
-    Ingests an invoice PDF, saves it, and triggers the processing task.
+    Ingests an invoice PDF, stores it in the blob store, and triggers the processing task.
     """
     try:
         # Generate unique ID
         invoice_id = str(uuid.uuid4())
-        file_location = f"invoices/{invoice_id}_{file.filename}"
-        os.makedirs("invoices", exist_ok=True)
-        
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        contents = await file.read()
+        # Resends of the same file share one blob; workers fetch it by key
+        with metrics.stage("upload_write", task="process_invoice"):
+            blob_key = await asyncio.to_thread(get_blob_store().put, contents, file.filename)
             
         # Trigger Celery task
-        task = process_invoice.delay(file_location, invoice_id, current_user_id)
+        task = process_invoice.delay(blob_key, invoice_id, current_user_id)
         
-        return {"status": "processing", "invoice_id": invoice_id, "task_id": task.id}
+        return {"status": "processing", "invoice_id": invoice_id, "task_id": task.id, "blob_key": blob_key}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -110,6 +133,8 @@ async def get_audits(current_user_id: str = Depends(get_current_user)):
         async with app.state.pool.acquire() as conn:
             rows = await conn.fetch("SELECT * FROM audits ORDER BY created_at DESC LIMIT 50")
             return [dict(row) for row in rows]
+    except PoolTimeout:
+        raise
     except Exception as e:
         print(f"DB Error: {e}")
         return []
@@ -121,8 +146,11 @@ async def get_pending_transactions(current_user_id: str = Depends(get_current_us
     """
     try:
         async with app.state.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM transactions WHERE (status = 'NEEDS_APPROVAL' OR status = 'NEEDS_REVIEW' OR status = 'QUEUED_FOR_PAYMENT' OR status = 'WAITING_FOR_PIN') AND user_id = $1 ORDER BY created_at DESC", current_user_id)
+            # Pending rows are never cold, so the cold tiers are pruned from the plan
+            rows = await conn.fetch("SELECT * FROM transactions WHERE status = ANY($1::varchar[]) AND user_id = $2 AND tier = 'hot' ORDER BY created_at DESC", list(PENDING_STATUSES), current_user_id)
             return [dict(row) for row in rows]
+    except PoolTimeout:
+        raise
     except Exception as e:
         print(f"DB Error: {e}")
         return []
@@ -136,9 +164,16 @@ async def get_transaction(transaction_id: int, current_user_id: str = Depends(ge
         async with app.state.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM transactions WHERE id = $1 AND user_id = $2", transaction_id, current_user_id)
             if row:
-                return dict(row)
+                transaction = dict(row)
+                # Set by the worker's browser session while this transaction is being paid
+                r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), decode_responses=True)
+                feed = await asyncio.to_thread(r.get, f"transaction:{transaction_id}:live_feed")
+                transaction["live_feed"] = f"/static/live/{feed}" if feed else None
+                return transaction
             else:
                 raise HTTPException(status_code=404, detail="Transaction not found")
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -149,57 +184,59 @@ class TransactionUpdate(BaseModel):
     ifsc_code: str | None = None
     remarks: str | None = None
 
+class TransactionBulkUpdateItem(TransactionUpdate):
+    id: int
+
+class TransactionBulkUpdate(BaseModel):
+    updates: list[TransactionBulkUpdateItem]
+
 @app.put("/transactions/{transaction_id}")
 async def update_transaction(transaction_id: int, transaction: TransactionUpdate, current_user_id: str = Depends(get_current_user)):
     """
     Updates transaction details (e.g. adding missing account number).
     """
+    # If updating account number, we can auto-move from NEEDS_REVIEW to NEEDS_APPROVAL if desired.
+    # But let's keep it simple: just update data. User clicks Approve separately.
+    if not transaction.model_dump(exclude_none=True):
+        return {"status": "no_changes"}
+
     try:
         async with app.state.pool.acquire() as conn:
-            # Verify ownership
-            row = await conn.fetchrow("SELECT * FROM transactions WHERE id = $1 AND user_id = $2", transaction_id, current_user_id)
-            if not row:
-                raise HTTPException(status_code=404, detail="Transaction not found")
-            
-            # Update fields
-            query = "UPDATE transactions SET "
-            params = []
-            updates = []
-            i = 1
-            
-            if transaction.vendor is not None:
-                updates.append(f"vendor = ${i}")
-                params.append(transaction.vendor)
-                i += 1
-            if transaction.amount is not None:
-                updates.append(f"amount = ${i}")
-                params.append(transaction.amount)
-                i += 1
-            if transaction.account_number is not None:
-                updates.append(f"account_number = ${i}")
-                params.append(transaction.account_number)
-                i += 1
-            if transaction.ifsc_code is not None:
-                updates.append(f"ifsc_code = ${i}")
-                params.append(transaction.ifsc_code)
-                i += 1
-            if transaction.remarks is not None:
-                updates.append(f"remarks = ${i}")
-                params.append(transaction.remarks)
-                i += 1
-            
-            # If updating account number, we can auto-move from NEEDS_REVIEW to NEEDS_APPROVAL if desired.
-            # But let's keep it simple: just update data. User clicks Approve separately.
-            
-            if not updates:
-                return {"status": "no_changes"}
-                
-            query += ", ".join(updates) + f" WHERE id = ${i} AND user_id = ${i+1}"
-            params.append(transaction_id)
-            params.append(current_user_id)
-            
-            await conn.execute(query, *params)
-            return {"status": "updated"}
+            item = TransactionBulkUpdateItem(id=transaction_id, **transaction.model_dump())
+            rows = await apply_updates(conn, [item], current_user_id)
+            if not rows:
+                raise HTTPException(status_code=404, detail="Transaction not found or no longer editable")
+            return {"status": "updated", "transaction": rows[0]}
+    except (HTTPException, PoolTimeout):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.patch("/transactions")
+async def bulk_update_transactions(request: TransactionBulkUpdate, current_user_id: str = Depends(get_current_user)):
+    """
+    Applies review corrections to many transactions in one statement
+    (e.g. filling account numbers for a whole batch).
+    """
+    updates = [item for item in request.updates if item.model_dump(exclude={"id"}, exclude_none=True)]
+    if not updates:
+        return {"status": "no_changes", "updated": [], "not_updated": []}
+    if len(updates) > MAX_BULK_UPDATES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_UPDATES} updates per request")
+    if len({item.id for item in updates}) != len(updates):
+        raise HTTPException(status_code=400, detail="Each transaction may appear only once")
+
+    try:
+        async with app.state.pool.acquire() as conn:
+            rows = await apply_updates(conn, updates, current_user_id)
+            updated_ids = {row["id"] for row in rows}
+            return {
+                "status": "updated",
+                "updated": rows,
+                "not_updated": [item.id for item in updates if item.id not in updated_ids],
+            }
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -210,21 +247,18 @@ async def approve_transaction(transaction_id: int, current_user_id: str = Depend
     """
     try:
         async with app.state.pool.acquire() as conn:
-            # Update status
-            result = await conn.execute("UPDATE transactions SET status = 'QUEUED_FOR_PAYMENT' WHERE id = $1 AND user_id = $2", transaction_id, current_user_id)
-            if result == "UPDATE 0":
-                 raise HTTPException(status_code=404, detail="Transaction not found or unauthorized")
+            # Guarded transition: a second approve (or an EXTRACTED preview) matches nothing.
+            # The payment task is recorded in the outbox in the same transaction.
+            async with conn.transaction():
+                rows = await transition(conn, QUEUED_FOR_PAYMENT, APPROVABLE_STATUSES, ids=[transaction_id], user_id=current_user_id)
+                if not rows:
+                    raise HTTPException(status_code=404, detail="Transaction not found, unauthorized or not awaiting approval")
+                task_ids = await enqueue(conn, "worker.tasks.execute_payment", [dict(rows[0])])
 
-            # Fetch details
-            row = await conn.fetchrow("SELECT * FROM transactions WHERE id = $1", transaction_id)
-            
-            if row:
-                # Trigger payment execution
-                from worker.tasks import execute_payment
-                execute_payment.delay(dict(row))
-                return {"status": "queued", "transaction_id": transaction_id}
-            else:
-                raise HTTPException(status_code=404, detail="Transaction not found")
+        app.state.outbox.wake()
+        return {"status": "queued", "transaction_id": transaction_id, "task_id": task_ids[0]}
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -235,23 +269,97 @@ async def approve_batch(batch_id: str, current_user_id: str = Depends(get_curren
     """
     try:
         async with app.state.pool.acquire() as conn:
-            # Fetch all NEEDS_APPROVAL for this batch and user
-            rows = await conn.fetch("SELECT * FROM transactions WHERE batch_id = $1 AND status = 'NEEDS_APPROVAL' AND user_id = $2", batch_id, current_user_id)
-            
-            if not rows:
-                return {"status": "no_pending_transactions"}
-                
-            # Update all to QUEUED_FOR_PAYMENT
-            await conn.execute("UPDATE transactions SET status = 'QUEUED_FOR_PAYMENT' WHERE batch_id = $1 AND status = 'NEEDS_APPROVAL' AND user_id = $2", batch_id, current_user_id)
-            
-            # Trigger tasks
-            from worker.tasks import execute_payment
-            task_ids = []
-            for row in rows:
-                task = execute_payment.delay(dict(row))
-                task_ids.append(task.id)
-                
-            return {"status": "batch_queued", "count": len(rows), "task_ids": task_ids}
+            # Move every NEEDS_APPROVAL row of the batch and record its payment task atomically
+            async with conn.transaction():
+                rows = await transition(conn, QUEUED_FOR_PAYMENT, NEEDS_APPROVAL, batch_id=batch_id, user_id=current_user_id)
+                if not rows:
+                    return {"status": "no_pending_transactions"}
+                if PAYMENT_MODE == "bulk" and len(rows) > 1:
+                    # The whole batch goes to the bank as one bulk-upload file
+                    task_ids = await enqueue(conn, "worker.tasks.execute_bulk_payment", [[dict(row) for row in rows]])
+                else:
+                    task_ids = await enqueue(conn, "worker.tasks.execute_payment", [dict(row) for row in rows])
+
+        app.state.outbox.wake()
+        return {"status": "batch_queued", "count": len(rows), "task_ids": task_ids}
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/transactions/{transaction_id}/trace")
+async def get_transaction_trace(transaction_id: int, current_user_id: str = Depends(get_current_user)):
+    """
+    Browser step spans for each payment attempt of a transaction, newest first.
+    """
+    try:
+        async with app.state.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT p.spans, p.trace_files, p.created_at FROM payment_traces p
+                JOIN transactions t ON t.id = p.transaction_id
+                WHERE p.transaction_id = $1 AND t.user_id = $2
+                ORDER BY p.created_at DESC
+            """, transaction_id, current_user_id)
+            return [
+                {"spans": json.loads(row["spans"]), "trace_files": row["trace_files"] or [], "created_at": row["created_at"]}
+                for row in rows
+            ]
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/transactions/{transaction_id}/evidence")
+async def list_transaction_evidence(transaction_id: int, current_user_id: str = Depends(get_current_user)):
+    """
+    Payment screenshots linked to a transaction, newest first.
+    """
+    try:
+        async with app.state.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT e.id, e.sha256, e.kind, e.bytes, e.created_at FROM evidence e
+                JOIN transactions t ON t.id = e.transaction_id
+                WHERE e.transaction_id = $1 AND t.user_id = $2
+                ORDER BY e.created_at DESC
+            """, transaction_id, current_user_id)
+            return [
+                {**dict(row), "url": f"/evidence/{row['sha256']}", "thumbnail_url": f"/evidence/{row['sha256']}?thumbnail=true"}
+                for row in rows
+            ]
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/evidence/{sha256}")
+async def get_evidence(sha256: str, request: Request, thumbnail: bool = False, current_user_id: str = Depends(get_current_user)):
+    """
+    Serves an evidence image (or its lazily built thumbnail). Content never
+    changes for a hash, so clients may cache it indefinitely and revalidate
+    with If-None-Match.
+    """
+    if not SHA256_RE.match(sha256):
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    try:
+        async with app.state.pool.acquire() as conn:
+            owned = await conn.fetchval("""
+                SELECT 1 FROM evidence e JOIN transactions t ON t.id = e.transaction_id
+                WHERE e.sha256 = $1 AND t.user_id = $2 LIMIT 1
+            """, sha256, current_user_id)
+        if not owned:
+            raise HTTPException(status_code=404, detail="Evidence not found")
+
+        etag = f'"{sha256}{"-thumb" if thumbnail else ""}"'
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        path = await asyncio.to_thread(evidence_store.thumbnail, sha256) if thumbnail else evidence_store.path(sha256)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Evidence file missing")
+        return FileResponse(path, media_type="image/jpeg", headers=headers)
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -270,6 +378,8 @@ async def provide_pin(transaction_id: int, request: PinRequest, current_user_id:
         r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
         r.set(f"transaction:{transaction_id}:pin", request.pin)
         return {"status": "pin_received"}
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -296,6 +406,68 @@ async def twilio_status_webhook(
     print(f"Twilio Status Update - SID: {MessageSid}, Status: {MessageStatus}, To: {To}")
     return {"status": "ok"}
 
+@app.get("/ifsc/{ifsc_code}")
+async def lookup_ifsc(ifsc_code: str, current_user_id: str = Depends(get_current_user)):
+    """
+    Offline IFSC branch lookup, with suggestions for likely misreads.
+    """
+    from core.ifsc_directory import get_directory
+    directory = get_directory()
+    if not directory:
+        raise HTTPException(status_code=503, detail="IFSC directory unavailable")
+    branch = directory.lookup(ifsc_code)
+    if branch:
+        return {"valid": True, **branch}
+    return {"valid": False, "ifsc": ifsc_code.upper(), "suggestions": directory.suggest(ifsc_code)}
+
+@app.get("/extraction/stats")
+async def extraction_stats(current_user_id: str = Depends(get_current_user)):
+    """
+    Per-stage cascade hit rates and latency, plus hedge winners.
+    """
+    from worker.cascade import cascade_stats
+    try:
+        r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), decode_responses=True)
+        winners = {k: int(v) for k, v in r.hgetall("extraction:winners").items()}
+        return {"cascade": cascade_stats(), "winners": winners}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/browser/stats")
+async def browser_stats(current_user_id: str = Depends(get_current_user)):
+    """
+    Asset cache hits/misses, blocked requests and per-action step timings
+    across payment browsers.
+    """
+    from core.asset_cache import asset_cache_stats
+    from core.browser_engine import step_stats
+    try:
+        r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), decode_responses=True)
+        return {"asset_cache": asset_cache_stats(r), "steps": step_stats(r)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/workers/memory")
+async def workers_memory(current_user_id: str = Depends(get_current_user)):
+    """
+    Memory of each worker pool process and its browsers, per node, plus how
+    many processes were recycled and orphan browsers reaped.
+    """
+    from worker.watchdog import worker_memory_stats
+    try:
+        r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), decode_responses=True)
+        return worker_memory_stats(r)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition: API-side stage timings, queue depth per task type and component stats."""
+    body = await asyncio.to_thread(metrics.render_latest)
+    if body is None:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    return Response(content=body, media_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
@@ -0,0 +1,157 @@
+import os
+import json
+import asyncio
+
+import redis
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1.0"))
+# How long a worker remembers a delivered message id
+OUTBOX_DEDUPE_TTL_SECONDS = int(os.getenv("OUTBOX_DEDUPE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def message_id(outbox_id: int) -> str:
+    """Celery task id for an outbox row; stable across re-dispatches."""
+    return f"outbox-{outbox_id}"
+
+
+async def enqueue(conn, task_name: str, payloads: list) -> list:
+    """
+    Records tasks to publish in one INSERT. Call inside the same DB
+    transaction as the status change so both commit or neither does.
+    Returns the message ids the tasks will run under.
+    """
+    rows = await conn.fetch("""
+        INSERT INTO outbox (task_name, payload)
+        SELECT $1, p FROM unnest($2::jsonb[]) AS p
+        RETURNING id
+    """, task_name, [json.dumps(p, default=str) for p in payloads])
+    return [message_id(row["id"]) for row in rows]
+
+
+def _delivered_key(msg_id: str) -> str:
+    return f"outbox:delivered:{msg_id}"
+
+
+def was_delivered(msg_id: str, redis_url: str = None) -> bool:
+    """
+    Worker-side dedupe for at-least-once dispatch: True once a task run under
+    this message id has finished (see `mark_delivered`). If Redis is
+    unreachable the task runs anyway and the status guard in
+    core.state_machine is the backstop.
+    """
+    try:
+        r = redis.Redis.from_url(redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return bool(r.exists(_delivered_key(msg_id)))
+    except Exception as e:
+        print(f"Outbox dedupe unavailable for {msg_id}: {e}")
+        return False
+
+
+def mark_delivered(msg_id: str, redis_url: str = None):
+    """
+    Records a finished delivery. Called only after the task's work completes,
+    so a worker that dies mid-payment leaves the id unmarked and the
+    redelivery runs; two copies running at once are left to the status and
+    fence guards.
+    """
+    try:
+        r = redis.Redis.from_url(redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        r.set(_delivered_key(msg_id), 1, ex=OUTBOX_DEDUPE_TTL_SECONDS)
+    except Exception as e:
+        print(f"Outbox dedupe unavailable for {msg_id}: {e}")
+
+
+class OutboxDispatcher:
+    """
+    Publishes pending outbox rows to Celery in batches.
+
+    Each pass locks up to `batch_size` unsent rows with FOR UPDATE SKIP LOCKED
+    (so several API replicas can run a dispatcher), publishes them, and marks
+    the published ones sent in the same transaction. A row whose publish
+    fails stays pending with its error recorded and is retried on the next
+    pass. A crash between publishing and committing re-sends the row, which
+    the worker drops via `was_delivered`.
+    """
+
+    def __init__(self, pool, celery_app, batch_size: int = OUTBOX_BATCH_SIZE, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.pool = pool
+        self.celery_app = celery_app
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def _publish(self, rows) -> dict:
+        """Sends rows to the broker; returns {outbox id: error} for failures."""
+        failed = {}
+        for row in rows:
+            try:
+                self.celery_app.send_task(
+                    row["task_name"],
+                    args=[json.loads(row["payload"])],
+                    kwargs={"message_id": message_id(row["id"])},
+                    task_id=message_id(row["id"]),
+                )
+            except Exception as e:
+                failed[row["id"]] = str(e)
+        return failed
+
+    async def dispatch_once(self) -> int:
+        """Publishes one batch; returns how many rows were marked sent."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch("""
+                    SELECT id, task_name, payload FROM outbox
+                    WHERE sent_at IS NULL
+                    ORDER BY id
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                """, self.batch_size)
+                if not rows:
+                    return 0
+
+                # Broker calls are blocking; keep them off the event loop
+                failed = await asyncio.to_thread(self._publish, rows)
+                sent = [row["id"] for row in rows if row["id"] not in failed]
+                if sent:
+                    await conn.execute("UPDATE outbox SET sent_at = NOW(), attempts = attempts + 1 WHERE id = ANY($1::bigint[])", sent)
+                if failed:
+                    await conn.execute("""
+                        UPDATE outbox o SET attempts = o.attempts + 1, last_error = f.error
+                        FROM unnest($1::bigint[], $2::text[]) AS f(id, error)
+                        WHERE o.id = f.id
+                    """, list(failed), list(failed.values()))
+                    print(f"Outbox: {len(failed)} of {len(rows)} messages failed to publish, will retry")
+                return len(sent)
+
+    async def run(self):
+        while True:
+            try:
+                # Keep draining while full batches come back
+                while await self.dispatch_once() >= self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def wake(self):
+        """Dispatch right away instead of at the next poll (call after commit)."""
+        self.wakeup.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,237 @@
+"""
+End-to-end benchmark: uploads and approvals through the real API and workers.
+
+Stand up Postgres, Redis, the mock bank, the API, the workers and the local
+model stub (benchmarks/model_stub.py) first:
+
+    docker compose -f docker-compose.yml -f benchmarks/docker-compose.bench.yml up -d --build
+
+Then drive it:
+
+    python benchmarks/bench_e2e.py --uploads 50 --approvals 20 --concurrency 8
+
+Reports throughput, p50/p95/p99 per pipeline stage (from the Prometheus
+histograms, as the difference between scrapes before and after the run),
+end-to-end latencies measured by the driver, payment outcomes and resource
+use. Model latency injected by the stub is reported separately, so the
+pipeline's own overhead per invoice can be tracked apart from the
+provider's. The result is written as JSON under benchmarks/results/; pass
+--baseline to compare against an earlier run and exit 1 on regressions.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import glob
+import asyncio
+import argparse
+
+import httpx
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.report import (
+    percentiles, scrape, histogram_quantiles, counter_deltas, docker_stats, git_commit, write_result, compare,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTLED = {"NEEDS_APPROVAL", "NEEDS_REVIEW", "DUPLICATE_SUSPECTED"}
+FINAL = {"PAID", "FAILED"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--worker-metrics", default="http://localhost:9100/metrics")
+    parser.add_argument("--model-stub", default="http://localhost:8500", help="model stub to read injected latency from")
+    parser.add_argument("--user", default="admin@example.com")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--approvals", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--files", default=os.path.join(ROOT, "test_data", "*.jpg"))
+    parser.add_argument("--pin", default="1234")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for each phase")
+    parser.add_argument("--poll", type=float, default=1.0)
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args()
+
+
+async def login(client, args) -> dict:
+    response = await client.post(f"{args.api}/token", data={"username": args.user, "password": args.password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def upload_all(client, args, headers, files) -> dict:
+    """Posts every upload; returns {invoice_id: (started, request_ms)}."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    uploads = {}
+
+    async def upload(i):
+        path = files[i % len(files)]
+        with open(path, "rb") as f:
+            # Trailing bytes keep each upload distinct, so nothing is deduplicated as a resend
+            data = f.read() + f"\nbench-{uuid.uuid4()}".encode()
+        async with semaphore:
+            started = time.monotonic()
+            response = await client.post(f"{args.api}/upload", headers=headers,
+                                         files={"file": (os.path.basename(path), data)})
+            response.raise_for_status()
+            uploads[response.json()["invoice_id"]] = (started, (time.monotonic() - started) * 1000)
+
+    await asyncio.gather(*(upload(i) for i in range(args.uploads)))
+    return uploads
+
+
+async def wait_for_batches(client, args, headers, uploads) -> tuple:
+    """Polls the pending list until every batch has settled rows; returns (ingest ms per batch, transactions)."""
+    ingest, transactions = {}, {}
+    deadline = time.monotonic() + args.timeout
+    while len(ingest) < len(uploads) and time.monotonic() < deadline:
+        response = await client.get(f"{args.api}/transactions/pending", headers=headers)
+        now = time.monotonic()
+        for tx in response.json():
+            batch = tx.get("batch_id")
+            if batch in uploads and tx["status"] in SETTLED:
+                transactions[tx["id"]] = tx
+                ingest.setdefault(batch, (now - uploads[batch][0]) * 1000)
+        await asyncio.sleep(args.poll)
+    missing = len(uploads) - len(ingest)
+    if missing:
+        print(f"⚠️ {missing} uploads produced no approvable rows within {args.timeout}s")
+    return ingest, transactions
+
+
+async def pay(client, args, headers, transactions) -> dict:
+    """Approves transactions, answers the PIN prompt, and waits for PAID/FAILED. Returns per-tx results."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = {}
+
+    async def one(tx_id):
+        async with semaphore:
+            started = time.monotonic()
+            response = await client.post(f"{args.api}/transactions/{tx_id}/approve", headers=headers)
+            if response.status_code != 200:
+                results[tx_id] = {"status": f"approve_{response.status_code}"}
+                return
+        pin_sent = False
+        deadline = started + args.timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(args.poll)
+            status = (await client.get(f"{args.api}/transactions/{tx_id}", headers=headers)).json().get("status")
+            if status == "WAITING_FOR_PIN" and not pin_sent:
+                await client.post(f"{args.api}/transactions/{tx_id}/provide_pin", headers=headers, json={"pin": args.pin})
+                pin_sent = True
+            if status in FINAL:
+                results[tx_id] = {"status": status, "ms": (time.monotonic() - started) * 1000}
+                return
+        results[tx_id] = {"status": "timeout"}
+
+    await asyncio.gather(*(one(tx_id) for tx_id in transactions))
+    return results
+
+
+async def model_stub_stats(client, args) -> dict:
+    try:
+        return (await client.get(f"{args.model_stub}/stats")).json()
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"Could not read model stub stats: {e}")
+        return {}
+
+
+def model_time(before: dict, after: dict, ingest: dict) -> dict:
+    """What the stub served during the run, and ingest latency net of the model time it injected."""
+    served = {k: round(v - before.get(k, 0), 1) for k, v in after.items()}
+    if not served or not ingest:
+        return {"stub": served}
+    injected_per_invoice = served.get("injected_ms", 0) / len(ingest)
+    ingest_mean = sum(ingest.values()) / len(ingest)
+    return {
+        "stub": served,
+        "injected_ms_per_invoice": round(injected_per_invoice, 1),
+        "pipeline_overhead_ms_per_invoice": round(ingest_mean - injected_per_invoice, 1),
+    }
+
+
+async def run(args) -> dict:
+    files = sorted(glob.glob(args.files))
+    if not files:
+        raise SystemExit(f"No input files match {args.files}")
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        headers = await login(client, args)
+        before_api = await asyncio.to_thread(scrape, httpx, f"{args.api}/metrics")
+        before_worker = await asyncio.to_thread(scrape, httpx, args.worker_metrics)
+        before_model = await model_stub_stats(client, args)
+
+        started = time.monotonic()
+        uploads = await upload_all(client, args, headers, files)
+        ingest, transactions = await wait_for_batches(client, args, headers, uploads)
+        ingest_seconds = time.monotonic() - started
+        after_model = await model_stub_stats(client, args)
+
+        approvable = [tx_id for tx_id, tx in sorted(transactions.items()) if tx["status"] == "NEEDS_APPROVAL"][:args.approvals]
+        started = time.monotonic()
+        payments = await pay(client, args, headers, approvable)
+        payment_seconds = time.monotonic() - started
+
+        after_api = await asyncio.to_thread(scrape, httpx, f"{args.api}/metrics")
+        after_worker = await asyncio.to_thread(scrape, httpx, args.worker_metrics)
+        memory = (await client.get(f"{args.api}/workers/memory", headers=headers)).json()
+
+    stages = histogram_quantiles(before_worker, after_worker, "payagent_stage_seconds", ("task", "stage"))
+    stages.update(histogram_quantiles(before_api, after_api, "payagent_stage_seconds", ("task", "stage")))
+    statuses = {}
+    for result in payments.values():
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    paid = statuses.get("PAID", 0)
+
+    return {
+        "run": {
+            "commit": git_commit(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "uploads": args.uploads, "approvals": len(approvable), "concurrency": args.concurrency,
+            "model_stub": {k: v for k, v in os.environ.items() if k.startswith("MODEL_STUB_")},
+        },
+        "throughput": {
+            "invoices_per_s": round(len(ingest) / ingest_seconds, 3) if ingest_seconds else 0,
+            "payments_per_s": round(paid / payment_seconds, 3) if payment_seconds else 0,
+        },
+        "latency": {
+            "upload_request": percentiles([ms for _, ms in uploads.values()]),
+            "upload_to_approvable": percentiles(list(ingest.values())),
+            "approve_to_final": percentiles([r["ms"] for r in payments.values() if "ms" in r]),
+        },
+        "stages": stages,
+        "model": model_time(before_model, after_model, ingest),
+        "payments": statuses,
+        "outcomes": counter_deltas(before_worker, after_worker, "payagent_payment_outcomes_total", ("task", "outcome")),
+        "extraction_failures": counter_deltas(before_worker, after_worker, "payagent_extraction_failures_total", ("task", "reason")),
+        "resources": {"workers": memory, "containers": docker_stats()},
+    }
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(run(args))
+    path = write_result("e2e", result)
+
+    print(json.dumps({k: result[k] for k in ("throughput", "latency", "model", "payments")}, indent=2))
+    for stage, summary in sorted(result["stages"].items()):
+        print(f"{stage:40} n={summary['count']:<6} p50={summary.get('p50')}ms p95={summary.get('p95')}ms p99={summary.get('p99')}ms")
+    print(f"Result written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
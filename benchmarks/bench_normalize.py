@@ -0,0 +1,62 @@
+"""
+Benchmark for the batch normalization stage.
+
+Usage: python benchmarks/bench_normalize.py [rows]
+"""
+import os
+import random
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.normalize import normalize_batch, parse_amount, parse_date, normalize_account, normalize_ifsc
+
+VENDORS = ["Acme Corp", "Bob Traders", "Sharma & Sons", "Patil Hardware", "Om Sai Logistics", "Green Leaf Foods"]
+AMOUNTS = ["5k", "₹1,20,000", "Rs. 500/-", "1.5 lakh", "2500", 1999.5, "INR 12,345.00", "2L", "abc"]
+DATES = ["2023-10-27", "27/10/2023", "27-10-23", "27 Oct 2023", "Oct 27, 2023", "27.10.2023", "someday", None]
+ACCOUNTS = ["1234567890", "1234 5678 9012", "98765-43210-11", "12AB", None]
+IFSCS = ["HDFC0001234", "sbin0004321", "ICICO000123", "BAD", None]
+
+
+def synthetic_rows(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "vendor": rng.choice(VENDORS),
+            "amount": rng.choice(AMOUNTS) if rng.random() < 0.5 else str(rng.randint(100, 500000)),
+            "date": rng.choice(DATES),
+            "account_number": rng.choice(ACCOUNTS) if rng.random() < 0.5 else str(rng.randint(10**9, 10**12)),
+            "ifsc_code": rng.choice(IFSCS),
+            "remarks": None,
+        }
+        for _ in range(n)
+    ]
+
+
+def clear_caches():
+    for parser in (parse_amount, parse_date, normalize_account, normalize_ifsc):
+        parser.cache_clear()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = synthetic_rows(n)
+
+    clear_caches()
+    start = time.perf_counter()
+    columns = normalize_batch(rows)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalize_batch(rows)
+    warm = time.perf_counter() - start
+
+    review = sum(1 for s in columns.status if s == "NEEDS_REVIEW")
+    print(f"rows={n} cold={cold:.3f}s ({n / cold:,.0f} rows/s) warm={warm:.3f}s ({n / warm:,.0f} rows/s)")
+    print(f"needs_review={review} total={columns.total()}")
+
+
+if __name__ == "__main__":
+    main()
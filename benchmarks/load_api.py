@@ -0,0 +1,296 @@
+"""
+API load scenarios: step up concurrent users and find where latency turns.
+
+Runs against a live stack (see bench_e2e.py for bringing one up). Each
+scenario is repeated once per --users level. Every step reports per-endpoint
+latency percentiles, status codes and requests/s, plus the API's database pool
+waits and timeouts scraped from /metrics. The knee is the first level whose
+p95 is over --knee-factor times the first level's, or whose error rate passes
+--max-errors.
+
+    python benchmarks/load_api.py poll --users 10,50,100,200 --duration 30
+
+Scenarios:
+  login    bursts of logins (password hashing included)
+  poll     the dashboard fleet: each user fetches /transactions/pending every --interval seconds
+  approve  the incident shape: a polling fleet, an approve storm over every approvable
+           transaction (or --batches via approve_batch), then PIN submission while each
+           approved transaction is watched like the live monitor does
+  upload   bursts of invoice uploads
+
+approve consumes NEEDS_APPROVAL transactions; seed some first (bench_e2e.py
+with --approvals 0, or upload bursts against the model stub).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import glob
+import asyncio
+import argparse
+
+import httpx
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.report import percentiles, scrape, histogram_quantiles, counter_deltas, git_commit, write_result, compare
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINAL = {"PAID", "FAILED"}
+# Endpoint whose p95 decides the knee, per scenario
+HEADLINE = {"login": "token", "poll": "pending", "approve": "approve", "upload": "upload"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(HEADLINE))
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--user", default="admin@example.com")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--users", default="10,25,50,100", help="comma-separated concurrency levels to step through")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per poll step")
+    parser.add_argument("--interval", type=float, default=2.0, help="dashboard poll interval")
+    parser.add_argument("--requests", type=int, default=0, help="logins/uploads per step (default: 5 per user)")
+    parser.add_argument("--approvals", type=int, default=100, help="transactions approved per approve step")
+    parser.add_argument("--batches", action="store_true", help="approve whole batches instead of single rows")
+    parser.add_argument("--pin", default="1234")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for approved payments")
+    parser.add_argument("--files", default=os.path.join(ROOT, "test_data", "*.jpg"))
+    parser.add_argument("--knee-factor", type=float, default=2.0)
+    parser.add_argument("--max-errors", type=float, default=0.01, help="error rate that counts as the knee")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args()
+
+
+class Recorder:
+    """Latencies (ms) and status codes per endpoint for one step."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.payments = None
+
+    async def request(self, client, endpoint: str, method: str, url: str, **kwargs):
+        started = time.monotonic()
+        try:
+            response = await client.request(method, url, **kwargs)
+            outcome = response.status_code
+        except httpx.HTTPError as e:
+            response, outcome = None, type(e).__name__
+        self.latencies.setdefault(endpoint, []).append((time.monotonic() - started) * 1000)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[str(outcome)] = counts.get(str(outcome), 0) + 1
+        return response
+
+    def summary(self, seconds: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in self.latencies.items():
+            statuses = self.statuses[endpoint]
+            # 5xx (pool timeouts answer 503) and transport failures; a 404 from a raced approve is expected
+            errors = sum(n for code, n in statuses.items() if not code.startswith(("2", "3", "4")))
+            endpoints[endpoint] = {
+                **percentiles(samples), "statuses": statuses,
+                "rps": round(len(samples) / seconds, 2) if seconds else 0,
+                "error_rate": round(errors / len(samples), 4),
+            }
+        return endpoints
+
+
+async def login(client, args) -> dict:
+    response = await client.post(f"{args.api}/token", data={"username": args.user, "password": args.password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def poll_fleet(client, args, headers, users: int, rec: Recorder, stop: asyncio.Event):
+    """Users polling the pending list like the dashboard, until `stop` is set."""
+    async def user(i):
+        # Spread the fleet over one interval instead of polling in lockstep
+        await asyncio.sleep(args.interval * i / users)
+        while not stop.is_set():
+            started = time.monotonic()
+            await rec.request(client, "pending", "GET", f"{args.api}/transactions/pending", headers=headers)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(0.0, args.interval - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                pass
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+
+
+async def run_bounded(users: int, total: int, job):
+    semaphore = asyncio.Semaphore(users)
+
+    async def one(i):
+        async with semaphore:
+            await job(i)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+
+
+async def scenario_login(client, args, headers, users, rec):
+    form = {"username": args.user, "password": args.password}
+    await run_bounded(users, args.requests or users * 5,
+                      lambda i: rec.request(client, "token", "POST", f"{args.api}/token", data=form))
+
+
+async def scenario_poll(client, args, headers, users, rec):
+    stop = asyncio.Event()
+    fleet = asyncio.create_task(poll_fleet(client, args, headers, users, rec, stop))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await fleet
+
+
+async def scenario_upload(client, args, headers, users, rec):
+    files = sorted(glob.glob(args.files))
+    if not files:
+        raise SystemExit(f"No input files match {args.files}")
+
+    async def upload(i):
+        path = files[i % len(files)]
+        with open(path, "rb") as f:
+            # Trailing bytes keep each upload distinct, so nothing is deduplicated as a resend
+            data = f.read() + f"\nload-{uuid.uuid4()}".encode()
+        await rec.request(client, "upload", "POST", f"{args.api}/upload", headers=headers,
+                          files={"file": (os.path.basename(path), data)})
+
+    await run_bounded(users, args.requests or users * 5, upload)
+
+
+async def watch_and_pin(client, args, headers, tx_id, rec, deadline):
+    """The live monitor: poll one transaction, answer its PIN prompt, stop when it's final."""
+    pin_sent = False
+    while time.monotonic() < deadline:
+        response = await rec.request(client, "transaction", "GET", f"{args.api}/transactions/{tx_id}", headers=headers)
+        status = response.json().get("status") if response is not None and response.status_code == 200 else None
+        if status == "WAITING_FOR_PIN" and not pin_sent:
+            response = await rec.request(client, "provide_pin", "POST", f"{args.api}/transactions/{tx_id}/provide_pin",
+                                         headers=headers, json={"pin": args.pin})
+            pin_sent = response is not None and response.status_code == 200
+        if status in FINAL:
+            return status
+        await asyncio.sleep(args.interval)
+    return "timeout"
+
+
+async def scenario_approve(client, args, headers, users, rec):
+    stop = asyncio.Event()
+    fleet = asyncio.create_task(poll_fleet(client, args, headers, users, rec, stop))
+    try:
+        pending = (await client.get(f"{args.api}/transactions/pending", headers=headers)).json()
+        approvable = [tx for tx in pending if tx["status"] == "NEEDS_APPROVAL"][:args.approvals]
+        if not approvable:
+            print("⚠️ Nothing awaiting approval; seed transactions before running the approve scenario")
+            return
+
+        # Everyone clicks at once
+        if args.batches:
+            batch_ids = sorted({tx["batch_id"] for tx in approvable if tx.get("batch_id")})
+            await asyncio.gather(*(rec.request(client, "approve", "POST", f"{args.api}/transactions/approve_batch/{batch}",
+                                               headers=headers) for batch in batch_ids))
+            approved = [tx["id"] for tx in approvable if tx.get("batch_id") in batch_ids]
+        else:
+            responses = await asyncio.gather(*(rec.request(client, "approve", "POST", f"{args.api}/transactions/{tx['id']}/approve",
+                                                           headers=headers) for tx in approvable))
+            approved = [tx["id"] for tx, r in zip(approvable, responses) if r is not None and r.status_code == 200]
+
+        deadline = time.monotonic() + args.timeout
+        results = await asyncio.gather(*(watch_and_pin(client, args, headers, tx_id, rec, deadline) for tx_id in approved))
+        rec.payments = {status: results.count(status) for status in set(results)}
+    finally:
+        stop.set()
+        await fleet
+
+
+SCENARIOS = {"login": scenario_login, "poll": scenario_poll, "approve": scenario_approve, "upload": scenario_upload}
+
+
+async def step(client, args, headers, users: int) -> dict:
+    rec = Recorder()
+    before = await asyncio.to_thread(scrape, httpx, f"{args.api}/metrics")
+    started = time.monotonic()
+    await SCENARIOS[args.scenario](client, args, headers, users, rec)
+    seconds = time.monotonic() - started
+    after = await asyncio.to_thread(scrape, httpx, f"{args.api}/metrics")
+
+    result = {
+        "users": users, "seconds": round(seconds, 1), "endpoints": rec.summary(seconds),
+        "pool_wait": histogram_quantiles(before, after, "payagent_db_pool_wait_seconds", ("pool",)),
+        "pool_timeouts": counter_deltas(before, after, "payagent_db_pool_timeouts_total", ("pool",)),
+        # Peak isn't observable from two scrapes; this is the pool as the step ended
+        "pool_connections": {dict(labels)["state"]: value for (name, labels), value in after.items()
+                             if name == "payagent_db_pool_connections"},
+    }
+    if rec.payments is not None:
+        result["payments"] = rec.payments
+    return result
+
+
+def find_knee(steps: list, endpoint: str, factor: float, max_errors: float):
+    """Users at the first step that degraded past the thresholds, or None."""
+    first = steps[0]["endpoints"].get(endpoint, {}).get("p95") if steps else None
+    for s in steps:
+        summary = s["endpoints"].get(endpoint, {})
+        if summary.get("error_rate", 0) > max_errors or (first and summary.get("p95", 0) > first * factor):
+            return s["users"]
+    return None
+
+
+def print_step(s: dict):
+    pool = next(iter(s["pool_wait"].values()), {})
+    timeouts = sum(s["pool_timeouts"].values())
+    print(f"--- {s['users']} users, {s['seconds']}s: pool wait p95={pool.get('p95')}ms p99={pool.get('p99')}ms "
+          f"timeouts={int(timeouts)} connections={s['pool_connections']}")
+    for endpoint, summary in sorted(s["endpoints"].items()):
+        print(f"  {endpoint:12} n={summary['count']:<6} {summary['rps']:>8}/s p50={summary.get('p50')}ms "
+              f"p95={summary.get('p95')}ms p99={summary.get('p99')}ms errors={summary['error_rate']:.2%} {summary['statuses']}")
+
+
+async def run(args) -> dict:
+    levels = [int(n) for n in args.users.split(",") if n.strip()]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        headers = await login(client, args)
+        steps = []
+        for users in levels:
+            steps.append(await step(client, args, headers, users))
+            print_step(steps[-1])
+
+    headline = HEADLINE[args.scenario]
+    return {
+        "run": {
+            "commit": git_commit(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenario": args.scenario,
+            "users": levels, "interval": args.interval, "duration": args.duration,
+            "pool": {k: v for k, v in os.environ.items() if k.startswith("DB_POOL_")},
+        },
+        "steps": steps,
+        "knee_users": find_knee(steps, headline, args.knee_factor, args.max_errors),
+        # Keyed by level so compare() lines up each step with the baseline's
+        "latency": {f"{s['users']}_users": s["endpoints"].get(headline, {"count": 0}) for s in steps},
+    }
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(run(args))
+    path = write_result(f"load-{args.scenario}", result)
+    knee = result["knee_users"]
+    print(f"Knee: {f'{knee} users' if knee else 'not reached'} ({HEADLINE[args.scenario]} p95 x{args.knee_factor} "
+          f"or errors > {args.max_errors:.0%})")
+    print(f"Result written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Local stand-in for the extraction models, for offline and reproducible load tests.
+
+Speaks both API shapes the pipeline uses:
+  - Gemini REST (GEMINI_API_ENDPOINT, transport="rest"): generateContent and
+    streamGenerateContent under /v1beta/models/, plus the Files API pair
+    (POST /upload/v1beta/files, GET /v1beta/files/{id}) for direct REST clients
+  - OpenAI-compatible chat (OPENROUTER_BASE_URL): POST /v1/chat/completions,
+    streamed or not
+
+Answers are synthetic (a deterministic set of well-formed transactions derived
+from the request) or replayed from recorded responses. Latency, errors and
+truncation are injected; everything injected is counted under /stats, so a
+benchmark can take model time out of the pipeline's latencies.
+
+Usage: uvicorn benchmarks.model_stub:app --host 0.0.0.0 --port 8500
+
+MODEL_STUB_LATENCY_MS     total time per answer (default 1500)
+MODEL_STUB_JITTER_MS      +/- uniform jitter on that (default 300)
+MODEL_STUB_ERROR_RATE     fraction of requests answered 503 (default 0)
+MODEL_STUB_TRUNCATE_RATE  fraction of answers cut off mid-JSON (default 0)
+MODEL_STUB_ROWS           transactions per synthetic answer (default 5)
+MODEL_STUB_CHUNKS         stream chunks per answer (default 4)
+MODEL_STUB_REPLAY         comma-separated files or globs of recorded responses, served round-robin
+MODEL_STUB_SEED           seed for jitter, error and truncation draws (default 0)
+
+A recorded response is a raw Gemini or OpenAI response body, or a result dict
+the pipeline saved (e.g. test_data/debug_gemini_result.json). A saved result
+with an error and no transactions is replayed as that provider error.
+"""
+import os
+import re
+import glob
+import json
+import time
+import random
+import asyncio
+import hashlib
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("MODEL_STUB_LATENCY_MS", "1500"))
+JITTER_MS = float(os.getenv("MODEL_STUB_JITTER_MS", "300"))
+ERROR_RATE = float(os.getenv("MODEL_STUB_ERROR_RATE", "0"))
+TRUNCATE_RATE = float(os.getenv("MODEL_STUB_TRUNCATE_RATE", "0"))
+ROWS = int(os.getenv("MODEL_STUB_ROWS", "5"))
+CHUNKS = max(1, int(os.getenv("MODEL_STUB_CHUNKS", "4")))
+REPLAY = os.getenv("MODEL_STUB_REPLAY", "")
+rng = random.Random(os.getenv("MODEL_STUB_SEED", "0"))
+
+VENDORS = ["Acme Corp", "Bob Traders", "Sharma & Sons", "Patil Hardware", "Om Sai Logistics", "Green Leaf Foods"]
+BANKS = ["HDFC", "SBIN", "ICIC", "UTIB", "KKBK"]
+GEMINI_STATUS = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}
+
+app = FastAPI(title="Model stub")
+counters = {"requests": 0, "errors": 0, "streams": 0, "truncated": 0, "replayed": 0, "injected_ms": 0.0,
+            "gemini": 0, "openai": 0, "uploads": 0}
+files = {}
+
+
+def transactions_for(seed: str, rows: int = None) -> list:
+    """Valid rows, so benchmark batches reach NEEDS_APPROVAL instead of review."""
+    rng = random.Random(seed)
+    return [
+        {
+            "vendor": rng.choice(VENDORS),
+            "amount": rng.randint(500, 250000),
+            # Duplicates are fingerprinted on vendor, account and amount, so the account is
+            # derived from the request and row: no benchmark row repeats another one
+            "account_number": str(10**11 + int(hashlib.sha256(f"{seed}-{i}".encode()).hexdigest(), 16) % (9 * 10**11)),
+            "ifsc_code": f"{rng.choice(BANKS)}0{rng.randint(0, 999999):06d}",
+            "remarks": f"bench {seed[:8]}-{i}",
+        }
+        for i in range(ROWS if rows is None else rows)
+    ]
+
+
+def load_recording(path: str) -> dict:
+    """{"text": model output} or {"error": (status, message)} for one recorded response."""
+    with open(path) as f:
+        data = json.load(f)
+    if "candidates" in data:
+        return {"text": "".join(part.get("text", "") for part in data["candidates"][0]["content"]["parts"])}
+    if "choices" in data:
+        return {"text": data["choices"][0]["message"]["content"]}
+    if data.get("error") and not data.get("transactions"):
+        message = str(data["error"])
+        status = re.match(r"(\d{3})\b", message)
+        return {"error": (int(status.group(1)) if status else 500, message)}
+    return {"text": json.dumps(data)}
+
+
+def load_replay(spec: str) -> list:
+    paths = []
+    for pattern in filter(None, (p.strip() for p in spec.split(","))):
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return [load_recording(path) for path in paths]
+
+
+recordings = load_replay(REPLAY)
+
+
+def answer_for(body: bytes) -> dict:
+    """
+    The answer to one request: {"text", "truncated"} or {"error": (status, message)},
+    with injected errors and truncation applied and counted.
+    """
+    counters["requests"] += 1
+    if ERROR_RATE and rng.random() < ERROR_RATE:
+        counters["errors"] += 1
+        return {"error": (503, "model stub overload")}
+
+    if recordings:
+        answer = dict(recordings[counters["replayed"] % len(recordings)])
+        counters["replayed"] += 1
+        if "error" in answer:
+            counters["errors"] += 1
+            return answer
+    else:
+        txs = transactions_for(hashlib.sha256(body).hexdigest())
+        answer = {"text": json.dumps({"transactions": txs, "total": sum(tx["amount"] for tx in txs)})}
+
+    answer["truncated"] = bool(TRUNCATE_RATE and len(answer["text"]) > 1 and rng.random() < TRUNCATE_RATE)
+    if answer["truncated"]:
+        counters["truncated"] += 1
+        answer["text"] = answer["text"][:rng.randint(1, len(answer["text"]) - 1)]
+    return answer
+
+
+def latency_seconds() -> float:
+    seconds = max(0.0, LATENCY_MS + rng.uniform(-JITTER_MS, JITTER_MS)) / 1000
+    counters["injected_ms"] += seconds * 1000
+    return seconds
+
+
+def chunks_of(text: str) -> list:
+    size = max(1, -(-len(text) // CHUNKS))
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+async def paced(pieces: list):
+    """Yields (index, piece, last) spread over one answer's latency."""
+    delay = latency_seconds() / len(pieces)
+    for i, piece in enumerate(pieces):
+        await asyncio.sleep(delay)
+        yield i, piece, i == len(pieces) - 1
+
+
+# --- Gemini ---
+
+def gemini_error(status: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={
+        "error": {"code": status, "message": message, "status": GEMINI_STATUS.get(status, "INTERNAL")}})
+
+
+def gemini_chunk(text: str, final: bool, truncated: bool = False) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if final:
+        candidate["finishReason"] = "MAX_TOKENS" if truncated else "STOP"
+    return {"candidates": [candidate]}
+
+
+@app.post("/v1beta/models/{target}")
+async def models(target: str, request: Request):
+    """`{model}:generateContent` or `{model}:streamGenerateContent`."""
+    _, _, method = target.partition(":")
+    if method not in ("generateContent", "streamGenerateContent"):
+        return gemini_error(404, f"Unknown method {method}")
+    counters["gemini"] += 1
+    answer = answer_for(await request.body())
+    if "error" in answer:
+        await asyncio.sleep(latency_seconds() / 4)
+        return gemini_error(*answer["error"])
+
+    if method == "generateContent":
+        await asyncio.sleep(latency_seconds())
+        return gemini_chunk(answer["text"], final=True, truncated=answer["truncated"])
+
+    counters["streams"] += 1
+    sse = request.query_params.get("alt") == "sse"
+
+    async def stream():
+        # REST transport: one JSON array, elements arriving as they're generated
+        if not sse:
+            yield "["
+        async for i, piece, last in paced(chunks_of(answer["text"])):
+            chunk = json.dumps(gemini_chunk(piece, final=last, truncated=answer["truncated"]))
+            if sse:
+                yield f"data: {chunk}\r\n\r\n"
+            else:
+                yield ("," if i else "") + chunk
+        if not sse:
+            yield "]"
+
+    return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/json")
+
+
+def file_resource(file_id: str) -> dict:
+    meta = files[file_id]
+    return {"name": f"files/{file_id}", "displayName": meta["display_name"], "mimeType": meta["mime_type"],
+            "sizeBytes": str(meta["size"]), "sha256Hash": meta["sha256"], "state": "ACTIVE",
+            "uri": f"/v1beta/files/{file_id}"}
+
+
+@app.post("/upload/v1beta/files")
+async def upload_file(request: Request):
+    """Files API media upload; the file is ACTIVE immediately."""
+    body = await request.body()
+    counters["uploads"] += 1
+    digest = hashlib.sha256(body).hexdigest()
+    file_id = digest[:16]
+    files[file_id] = {"size": len(body), "sha256": digest, "display_name": request.headers.get("x-goog-upload-file-name", file_id),
+                      "mime_type": request.headers.get("x-goog-upload-header-content-type", request.headers.get("content-type", ""))}
+    await asyncio.sleep(latency_seconds() / 4)
+    return {"file": file_resource(file_id)}
+
+
+@app.get("/v1beta/files/{file_id}")
+async def get_file(file_id: str):
+    if file_id not in files:
+        return gemini_error(404, f"File files/{file_id} not found")
+    return file_resource(file_id)
+
+
+# --- OpenAI-compatible chat ---
+
+def openai_error(status: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": "model_stub", "code": status}})
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.body()
+    try:
+        params = json.loads(body)
+    except ValueError:
+        return openai_error(400, "Request body is not JSON")
+    counters["openai"] += 1
+    answer = answer_for(body)
+    if "error" in answer:
+        await asyncio.sleep(latency_seconds() / 4)
+        return openai_error(*answer["error"])
+
+    completion_id = f"chatcmpl-stub-{counters['requests']}"
+    base = {"id": completion_id, "created": int(time.time()), "model": params.get("model", "stub")}
+    finish_reason = "length" if answer["truncated"] else "stop"
+
+    if not params.get("stream"):
+        await asyncio.sleep(latency_seconds())
+        return {**base, "object": "chat.completion", "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": answer["text"]}, "finish_reason": finish_reason}]}
+
+    counters["streams"] += 1
+
+    async def stream():
+        async for _, piece, last in paced(chunks_of(answer["text"])):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": piece}, "finish_reason": finish_reason if last else None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return counters
@@ -0,0 +1,143 @@
+"""
+Shared helpers for the benchmark drivers: percentiles, Prometheus scrape
+deltas, machine-readable results and regression checks against a baseline.
+"""
+import os
+import json
+import math
+import time
+import subprocess
+
+from prometheus_client.parser import text_string_to_metric_families
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentiles(samples: list) -> dict:
+    """Nearest-rank p50/p95/p99 (ms in, ms out) plus count and mean."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    summary = {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 1)}
+    for q in QUANTILES:
+        summary[f"p{int(q * 100)}"] = round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 1)
+    return summary
+
+
+def scrape(client, url: str) -> dict:
+    """{(metric sample name, sorted labels): value} for one /metrics endpoint; empty if unreachable."""
+    try:
+        text = client.get(url, timeout=10).text
+    except Exception as e:
+        print(f"Could not scrape {url}: {e}")
+        return {}
+    values = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            values[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return values
+
+
+def histogram_quantiles(before: dict, after: dict, name: str, group_by: tuple) -> dict:
+    """
+    Per-group p50/p95/p99 (ms) of what a Prometheus histogram observed
+    between two scrapes, interpolated within buckets as histogram_quantile does.
+    """
+    buckets = {}
+    for (sample, labels), value in after.items():
+        if sample != f"{name}_bucket":
+            continue
+        labels = dict(labels)
+        delta = value - before.get((sample, tuple(sorted(labels.items()))), 0)
+        key = "/".join(labels.get(label, "") for label in group_by)
+        upper = float(labels["le"])
+        buckets.setdefault(key, []).append((upper, delta))
+
+    result = {}
+    for key, points in buckets.items():
+        points.sort()
+        total = points[-1][1]
+        if total <= 0:
+            continue
+        summary = {"count": int(total)}
+        for q in QUANTILES:
+            rank, lower, below = q * total, 0.0, 0.0
+            for upper, cumulative in points:
+                if cumulative >= rank:
+                    if math.isinf(upper):
+                        value = lower  # beyond the largest bucket: report its bound
+                    else:
+                        span = cumulative - below
+                        value = lower + (upper - lower) * ((rank - below) / span if span else 1)
+                    summary[f"p{int(q * 100)}"] = round(value * 1000, 1)
+                    break
+                lower, below = upper, cumulative
+        result[key] = summary
+    return result
+
+
+def counter_deltas(before: dict, after: dict, name: str, group_by: tuple) -> dict:
+    deltas = {}
+    for (sample, labels), value in after.items():
+        if sample != name:
+            continue
+        key = "/".join(dict(labels).get(label, "") for label in group_by)
+        delta = value - before.get((sample, labels), 0)
+        if delta:
+            deltas[key] = deltas.get(key, 0) + delta
+    return deltas
+
+
+def docker_stats() -> dict:
+    """CPU and memory per container of the running stack, if docker is available."""
+    try:
+        out = subprocess.run(["docker", "stats", "--no-stream", "--format", "{{json .}}"],
+                             capture_output=True, text=True, timeout=30, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    stats = {}
+    for line in out.splitlines():
+        row = json.loads(line)
+        stats[row["Name"]] = {"cpu": row.get("CPUPerc"), "memory": row.get("MemUsage")}
+    return stats
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_result(name: str, result: dict, out_dir: str = RESULTS_DIR) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    return path
+
+
+def _latencies(result: dict, prefix: str = ""):
+    """Yields (path, summary) for every percentile summary in a result."""
+    for key, value in result.items():
+        if isinstance(value, dict):
+            if "p95" in value:
+                yield prefix + key, value
+            else:
+                yield from _latencies(value, f"{prefix}{key}.")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions: p95s that grew, or throughputs that fell, by more than `tolerance`."""
+    regressions = []
+    previous = dict(_latencies(baseline))
+    for path, summary in _latencies(result):
+        old = previous.get(path, {}).get("p95")
+        if old and summary["p95"] > old * (1 + tolerance):
+            regressions.append(f"{path} p95 {old}ms -> {summary['p95']}ms")
+    for name, value in result.get("throughput", {}).items():
+        old = baseline.get("throughput", {}).get(name)
+        if old and value < old * (1 - tolerance):
+            regressions.append(f"throughput {name} {old} -> {value}")
+    return regressions
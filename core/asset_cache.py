@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import time
+import hashlib
+
+import redis
+
+# Opt-in: route every browser request through the blocklist and asset cache
+BROWSER_ROUTING = os.getenv("BROWSER_ROUTING", "off") == "on"
+BROWSER_ASSET_CACHE_DIR = os.getenv("BROWSER_ASSET_CACHE_DIR", os.path.join(os.getcwd(), ".cache", "browser_assets"))
+BROWSER_ASSET_CACHE_TTL_SECONDS = int(os.getenv("BROWSER_ASSET_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Resource types the payment flows never read; screenshots lose them, forms don't
+BLOCKED_RESOURCE_TYPES = set(filter(None, os.getenv("BROWSER_BLOCK_RESOURCES", "image,font,media").split(",")))
+BLOCKED_HOSTS_RE = re.compile(
+    os.getenv("BROWSER_BLOCK_HOSTS", r"google-analytics\.com|googletagmanager\.com|doubleclick\.net|hotjar\.com|segment\.io|fonts\.googleapis\.com")
+)
+CACHEABLE_RE = re.compile(os.getenv("BROWSER_CACHE_PATTERN", r"\.(js|css|woff2?)(\?|$)"))
+STATS_KEY = "browser:asset_cache"
+
+# Replayed from the cache; hop-by-hop and length headers are recomputed by the browser
+KEPT_HEADERS = ("content-type", "cache-control", "etag", "last-modified")
+
+
+class AssetCache:
+    """
+    On-disk cache of static assets shared by every page and worker on a node.
+
+    Entries are sharded by the sha256 of the URL (`ab/abcdef...`), with the
+    body and a small JSON sidecar holding status and headers. Writes go to a
+    temp file and are renamed into place so concurrent workers never read a
+    partial entry.
+    """
+
+    def __init__(self, root: str = BROWSER_ASSET_CACHE_DIR, ttl_seconds: int = BROWSER_ASSET_CACHE_TTL_SECONDS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, url: str):
+        """Returns (status, headers, body) or None when missing or expired."""
+        path = self._path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            with open(path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta["status"], meta["headers"], body
+
+    def put(self, url: str, status: int, headers: dict, body: bytes):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {"url": url, "status": status, "headers": {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS}}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp + ".json", "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp + ".json", path + ".json")
+        # The body lands last; its mtime is what `get` checks
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+
+class AssetRouter:
+    """
+    Playwright route handler: aborts blocked requests, serves cacheable GETs
+    from the AssetCache and lets everything else through untouched.
+    Counters are kept per browser session and flushed to Redis on close.
+    """
+
+    def __init__(self, cache: AssetCache = None):
+        self.cache = cache or AssetCache()
+        self.stats = {"hits": 0, "misses": 0, "blocked": 0, "passed": 0}
+
+    def is_blocked(self, request) -> bool:
+        return request.resource_type in BLOCKED_RESOURCE_TYPES or bool(BLOCKED_HOSTS_RE.search(request.url))
+
+    def is_cacheable(self, request) -> bool:
+        return request.method == "GET" and request.resource_type != "document" and bool(CACHEABLE_RE.search(request.url))
+
+    async def handle(self, route):
+        request = route.request
+        if self.is_blocked(request):
+            self.stats["blocked"] += 1
+            await route.abort("blockedbyclient")
+            return
+        if not self.is_cacheable(request):
+            self.stats["passed"] += 1
+            await route.continue_()
+            return
+
+        cached = self.cache.get(request.url)
+        if cached:
+            self.stats["hits"] += 1
+            status, headers, body = cached
+            await route.fulfill(status=status, headers=headers, body=body)
+            return
+
+        self.stats["misses"] += 1
+        response = await route.fetch()
+        if response.ok and "no-store" not in response.headers.get("cache-control", ""):
+            try:
+                self.cache.put(request.url, response.status, response.headers, await response.body())
+            except OSError as e:
+                print(f"Asset cache write failed for {request.url}: {e}")
+        await route.fulfill(response=response)
+
+    def flush_stats(self, redis_url: str = None):
+        counts = {k: v for k, v in self.stats.items() if v}
+        if not counts:
+            return
+        try:
+            r = redis.Redis.from_url(redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            pipe = r.pipeline(transaction=False)
+            for name, value in counts.items():
+                pipe.hincrby(STATS_KEY, name, value)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to record asset cache stats: {e}")
+        self.stats = dict.fromkeys(self.stats, 0)
+
+
+def asset_cache_stats(redis_client) -> dict:
+    """Totals across workers, plus the hit rate over cacheable requests."""
+    raw = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in redis_client.hgetall(STATS_KEY).items()}
+    stats = {name: raw.get(name, 0) for name in ("hits", "misses", "blocked", "passed")}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
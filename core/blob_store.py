@@ -0,0 +1,163 @@
+import os
+import re
+import hashlib
+from contextlib import contextmanager
+
+import redis
+
+# local: sharded directory (needs a shared volume across nodes); s3: any S3-compatible service
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(os.getcwd(), "blobs"))
+# Workers using S3 keep downloaded blobs here so retries don't fetch again
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(os.getcwd(), ".cache", "blobs"))
+S3_BUCKET = os.getenv("S3_BUCKET", "pay-agent-uploads")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000 for a local stand-in
+# Drop the upload's reference once its transactions are saved (off keeps every invoice for audit)
+BLOB_RELEASE_AFTER_EXTRACT = os.getenv("BLOB_RELEASE_AFTER_EXTRACT", "off") == "on"
+REFS_KEY = "blob:refs"
+
+KEY_RE = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+EXT_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+def blob_key(data: bytes, filename: str = "") -> str:
+    """sha256 of the content, plus the upload's extension so MIME detection still works."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    return hashlib.sha256(data).hexdigest() + (ext if EXT_RE.match(ext) else "")
+
+
+def is_blob_key(value: str) -> bool:
+    return bool(KEY_RE.match(value or ""))
+
+
+def _shard(key: str) -> str:
+    return os.path.join(key[:2], key[2:4], key)
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded invoices.
+
+    Identical uploads share one blob; Redis counts references so a blob is
+    only deleted when its last user releases it. Backends implement
+    `_write`, `_read`, `_exists`, `_remove` and `local_path`.
+    """
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    def _redis(self):
+        return redis.Redis.from_url(self.redis_url)
+
+    def put(self, data: bytes, filename: str = "") -> str:
+        key = blob_key(data, filename)
+        if not self._exists(key):
+            self._write(key, data)
+        self._redis().hincrby(REFS_KEY, key, 1)
+        return key
+
+    def get(self, key: str) -> bytes:
+        return self._read(key)
+
+    def release(self, key: str) -> bool:
+        """Drops one reference; deletes the blob when none remain. Returns True if deleted."""
+        r = self._redis()
+        remaining = r.hincrby(REFS_KEY, key, -1)
+        if remaining > 0:
+            return False
+        r.hdel(REFS_KEY, key)
+        self._remove(key)
+        return True
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs under `root/ab/cd/<key>`, written atomically."""
+
+    def __init__(self, root: str = BLOB_DIR, redis_url: str = None):
+        super().__init__(redis_url)
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, _shard(key))
+
+    def _exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def _write(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_path(self, key: str):
+        yield self.path(key)
+
+
+class S3BlobStore(BlobStore):
+    """Blobs in an S3 bucket under `ab/cd/<key>`; boto3 is only needed when this backend is used."""
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: str = S3_ENDPOINT_URL,
+                 cache_dir: str = BLOB_CACHE_DIR, redis_url: str = None):
+        super().__init__(redis_url)
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("BLOB_BACKEND=s3 requires boto3 (pip install boto3)")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=_shard(key))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def _write(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=_shard(key), Body=data)
+
+    def _read(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=_shard(key))["Body"].read()
+
+    def _remove(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=_shard(key))
+        try:
+            os.remove(os.path.join(self.cache_dir, _shard(key)))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_path(self, key: str):
+        # Content-addressed, so a cached copy is always current
+        path = os.path.join(self.cache_dir, _shard(key))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            self.client.download_file(self.bucket, _shard(key), tmp)
+            os.replace(tmp, path)
+        yield path
+
+
+_store = None
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store for the configured backend."""
+    global _store
+    if _store is None:
+        _store = S3BlobStore() if BLOB_BACKEND == "s3" else LocalBlobStore()
+    return _store
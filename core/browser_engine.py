@@ -1,45 +1,178 @@
 import asyncio
 import os
+import re
+import time
 import redis
 from playwright.async_api import async_playwright, Page, Browser, Playwright
+from core.asset_cache import AssetRouter, BROWSER_ROUTING
+from core.metrics import stage
+
+# Upper bound for any single step; a step can lower or raise it with "timeout_ms"
+BROWSER_STEP_TIMEOUT_MS = int(os.getenv("BROWSER_STEP_TIMEOUT_MS", "10000"))
+WAIT_CONDITIONS = ("selector", "network_idle", "stable", "predicate", "response")
+# Steps slower than this keep a Playwright trace chunk (0 disables tracing)
+BROWSER_TRACE_SLOW_MS = int(os.getenv("BROWSER_TRACE_SLOW_MS", "0"))
+BROWSER_TRACE_DIR = os.getenv("BROWSER_TRACE_DIR", os.path.join(os.getcwd(), "traces"))
+STEP_STATS_KEY = "browser:steps"
+# One live feed image per browser session, served by the API under /static/live/
+LIVE_FEED_DIR = os.getenv("LIVE_FEED_DIR", "/app/static/live")
+LIVE_FEED_TTL_SECONDS = 3600
+
+# Sets every field and fires the events page.fill would; returns selectors that weren't found
+FILL_MANY_JS = """
+(fields) => {
+    const missing = [];
+    for (const [selector, text] of fields) {
+        const el = document.querySelector(selector);
+        if (!el || el.disabled || el.readOnly) { missing.push(selector); continue; }
+        el.focus();
+        el.value = text;
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+    return missing;
+}
+"""
 
 class BrowserAgent:
-    def __init__(self):
+    def __init__(self, label: str = "session", feed_ids: list = None):
+        self.label = label
+        # Transactions whose live monitor should show this session's feed
+        self.feed_ids = list(feed_ids or [])
+        self.live_feed_path = os.path.join(LIVE_FEED_DIR, f"{re.sub(r'[^A-Za-z0-9_-]', '_', label)}.png")
         self.playwright: Playwright = None
         self.browser: Browser = None
         self.page: Page = None
         self.redis_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+        # One entry per wait: {"action", "until", "waited_ms"}
+        self.wait_log = []
+        self.router = AssetRouter() if BROWSER_ROUTING else None
+        # One span per execute_step call, see `execute_step`
+        self.spans = []
+        self.trace_files = []
+        self.tracing = False
 
     async def start(self):
         """Initializes the Playwright instance and browser."""
-        self.playwright = await async_playwright().start()
-        # Launch headless for Docker environment
-        self.browser = await self.playwright.chromium.launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
-        self.page = await self.browser.new_page()
+        with stage("browser_launch"):
+            self.playwright = await async_playwright().start()
+            # Launch headless for Docker environment
+            self.browser = await self.playwright.chromium.launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
+            self.page = await self.browser.new_page()
+        self.page.set_default_timeout(BROWSER_STEP_TIMEOUT_MS)
+        if self.router:
+            await self.page.route("**/*", self.router.handle)
+        self._register_live_feed()
+        if BROWSER_TRACE_SLOW_MS > 0:
+            try:
+                await self.page.context.tracing.start(snapshots=True, screenshots=False)
+                self.tracing = True
+            except Exception as e:
+                print(f"Playwright tracing unavailable: {e}")
 
     async def stop(self):
         """Cleans up resources."""
-        if self.page:
-            await self.page.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
-
-    async def execute_step(self, command: dict) -> any:
+        if self.tracing:
+            try:
+                await self.page.context.tracing.stop()
+            except Exception as e:
+                print(f"Failed to stop tracing: {e}")
+            self.tracing = False
+        # Each close is attempted even if an earlier one fails, so no Chromium outlives the task
+        for name, close in (("page", self.page and self.page.close),
+                            ("browser", self.browser and self.browser.close),
+                            ("playwright", self.playwright and self.playwright.stop)):
+            if close:
+                try:
+                    await close()
+                except Exception as e:
+                    print(f"Failed to close {name}: {e}")
+        self.page = self.browser = self.playwright = None
+        if self.router:
+            print(f"Browser asset routing: {self.router.stats}")
+            self.router.flush_stats()
+        self.flush_step_stats()
+
+    def flush_step_stats(self):
+        """Adds this session's per-action counts and timings to the shared Redis hash."""
+        if not self.spans:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for span in self.spans:
+                action = span["action"]
+                pipe.hincrby(STEP_STATS_KEY, f"{action}:count", 1)
+                pipe.hincrbyfloat(STEP_STATS_KEY, f"{action}:duration_ms_total", span["duration_ms"])
+                pipe.hincrbyfloat(STEP_STATS_KEY, f"{action}:screenshot_ms_total", span.get("screenshot_ms", 0))
+                if not span["ok"]:
+                    pipe.hincrby(STEP_STATS_KEY, f"{action}:failed", 1)
+                if span.get("trace"):
+                    pipe.hincrby(STEP_STATS_KEY, f"{action}:slow", 1)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to record browser step stats: {e}")
+
+    async def _wait(self, condition: dict, timeout: float, action: str = "wait") -> str:
         """
-        Executes a single step based on the provided JSON command.
+        Blocks until `condition` holds and records how long that took.
+
+        until: "selector" (default; selector + state), "network_idle",
+        "stable" (selector visible and no longer animating), "predicate"
+        (JS expression that becomes truthy) or "response" (url substring or
+        /regex/; arm it with the step's "wait_for" so the response isn't missed).
         """
-        if not self.page:
-            await self.start()
+        until = condition.get("until", "selector")
+        selector = condition.get("selector")
+        started = time.monotonic()
 
-        action = command.get("action")
+        if until == "selector":
+            if not selector:
+                raise ValueError("Selector is required for a selector wait")
+            state = condition.get("state", "visible")
+            await self.page.wait_for_selector(selector, state=state, timeout=timeout)
+            detail = f"{selector} to be {state}"
+        elif until == "network_idle":
+            await self.page.wait_for_load_state("networkidle", timeout=timeout)
+            detail = "network idle"
+        elif until == "stable":
+            if not selector:
+                raise ValueError("Selector is required for a stable wait")
+            element = await self.page.wait_for_selector(selector, state="visible", timeout=timeout)
+            await element.wait_for_element_state("stable", timeout=timeout)
+            detail = f"{selector} to be stable"
+        elif until == "predicate":
+            expression = condition.get("expression")
+            if not expression:
+                raise ValueError("Expression is required for a predicate wait")
+            await self.page.wait_for_function(expression, timeout=timeout)
+            detail = f"predicate {expression}"
+        elif until == "response":
+            await self.page.wait_for_response(self._response_matcher(condition), timeout=timeout)
+            detail = f"response {condition.get('url')}"
+        else:
+            raise ValueError(f"Unknown wait condition: {until} (expected one of {', '.join(WAIT_CONDITIONS)})")
+
+        waited_ms = round((time.monotonic() - started) * 1000, 1)
+        self.wait_log.append({"action": action, "until": until, "waited_ms": waited_ms})
+        return f"Waited {waited_ms}ms for {detail}"
+
+    @staticmethod
+    def _response_matcher(condition: dict):
+        url = condition.get("url")
+        if not url:
+            raise ValueError("URL is required for a response wait")
+        if len(url) > 1 and url.startswith("/") and url.endswith("/"):
+            pattern = re.compile(url[1:-1])
+            return lambda response: bool(pattern.search(response.url))
+        return lambda response: url in response.url
+
+    async def _perform(self, action: str, command: dict, timeout: float) -> any:
         result = None
-        
         if action == "navigate":
             url = command.get("url")
             if url:
-                await self.page.goto(url)
+                # "domcontentloaded" skips waiting for fonts/images the flow never reads
+                await self.page.goto(url, wait_until=command.get("wait_until", "load"), timeout=timeout)
                 result = f"Navigated to {url}"
             else:
                 raise ValueError("URL is required for navigate action")
@@ -48,15 +181,26 @@ class BrowserAgent:
             selector = command.get("selector")
             text = command.get("text")
             if selector and text is not None:
-                await self.page.fill(selector, text)
+                await self.page.fill(selector, text, timeout=timeout)
                 result = f"Filled {selector} with {text}"
             else:
                 raise ValueError("Selector and text are required for fill action")
 
+        elif action == "fill_many":
+            fields = command.get("fields")
+            if not fields:
+                raise ValueError("Fields are required for fill_many action")
+            # One evaluate for the whole form; fields not rendered yet fall back to page.fill's auto-wait
+            missing = await self.page.evaluate(FILL_MANY_JS, fields)
+            for selector, text in fields:
+                if selector in missing:
+                    await self.page.fill(selector, text, timeout=timeout)
+            result = f"Filled {len(fields)} fields"
+
         elif action == "click":
             selector = command.get("selector")
             if selector:
-                await self.page.click(selector)
+                await self.page.click(selector, timeout=timeout)
                 result = f"Clicked {selector}"
             else:
                 raise ValueError("Selector is required for click action")
@@ -64,34 +208,165 @@ class BrowserAgent:
         elif action == "read":
             selector = command.get("selector")
             if selector:
-                result = await self.page.inner_text(selector)
+                result = await self.page.inner_text(selector, timeout=timeout)
             else:
                 raise ValueError("Selector is required for read action")
         
-        elif action == "screenshot":
-            path = command.get("path", "screenshot.png")
-            await self.page.screenshot(path=path)
-            result = f"Screenshot saved to {path}"
-
-        elif action == "wait":
+        elif action == "read_rows":
+            # Cell texts of every row matching the selector, e.g. a results table
             selector = command.get("selector")
-            state = command.get("state", "visible")
             if selector:
-                await self.page.wait_for_selector(selector, state=state)
-                result = f"Waited for {selector} to be {state}"
+                result = await self.page.eval_on_selector_all(
+                    selector, "rows => rows.map(r => Array.from(r.cells || r.children).map(c => c.innerText.trim()))"
+                )
             else:
-                raise ValueError("Selector is required for wait action")
+                raise ValueError("Selector is required for read_rows action")
+
+        elif action == "upload":
+            selector = command.get("selector")
+            path = command.get("path")
+            if selector and path:
+                await self.page.set_input_files(selector, path, timeout=timeout)
+                result = f"Uploaded {os.path.basename(path)} to {selector}"
+            else:
+                raise ValueError("Selector and path are required for upload action")
+
+        elif action == "screenshot":
+            # Without a path the image bytes are returned (e.g. for the evidence store)
+            path = command.get("path")
+            options = {"type": command["format"]} if command.get("format") else {}
+            if command.get("format") == "jpeg" and command.get("quality"):
+                options["quality"] = command["quality"]
+            if path:
+                await self.page.screenshot(path=path, **options)
+                result = f"Screenshot saved to {path}"
+            else:
+                result = await self.page.screenshot(**options)
+
+        elif action == "wait":
+            result = await self._wait(command, timeout)
 
         else:
             raise ValueError(f"Unknown action: {action}")
 
-        # LIVE FEED: Save screenshot after every action
+        return result
+
+    async def execute_step(self, command: dict, attempt: int = 0) -> any:
+        """
+        Executes a single step based on the provided JSON command.
+
+        Any step may carry "timeout_ms" and a "wait_for" condition (see
+        `_wait`) that must hold before the step counts as done. A response
+        condition is armed before the action runs.
+
+        Every call appends a span to `self.spans`: action, selector, attempt,
+        duration_ms (action and waits), wait_ms, screenshot_ms (live feed),
+        ok/error, and the trace file when the step was slow enough to keep one.
+        """
+        if not self.page:
+            await self.start()
+
+        span = {
+            "action": command.get("action"),
+            "selector": command.get("selector") or command.get("url") or (f"{len(command['fields'])} fields" if command.get("fields") else None),
+            "attempt": attempt,
+            "ok": False,
+        }
+        waits_before = len(self.wait_log)
+        await self._start_trace_chunk()
+        started = time.monotonic()
         try:
-            # Ensure directory exists. In container, /app/static maps to ./static on host
-            os.makedirs("/app/static", exist_ok=True)
-            await self.page.screenshot(path="/app/static/live_feed.png")
+            result = await self._run_step(command)
+            span["ok"] = True
+        except Exception as e:
+            span["error"] = str(e).splitlines()[0][:200] if str(e) else type(e).__name__
+            raise
+        finally:
+            span["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            span["wait_ms"] = round(sum(w["waited_ms"] for w in self.wait_log[waits_before:]), 1)
+            await self._stop_trace_chunk(span)
+            self.spans.append(span)
+
+        span["screenshot_ms"] = await self._update_live_feed()
+        return result
+
+    async def _start_trace_chunk(self):
+        if self.tracing:
+            try:
+                await self.page.context.tracing.start_chunk()
+            except Exception as e:
+                print(f"Failed to start trace chunk: {e}")
+
+    async def _stop_trace_chunk(self, span: dict):
+        """Keeps the chunk only for slow steps; fast ones are discarded unread."""
+        if not self.tracing:
+            return
+        try:
+            if span["duration_ms"] >= BROWSER_TRACE_SLOW_MS:
+                os.makedirs(BROWSER_TRACE_DIR, exist_ok=True)
+                path = os.path.join(BROWSER_TRACE_DIR, f"{self.label}_{len(self.spans)}_{span['action']}_{int(time.time())}.zip")
+                await self.page.context.tracing.stop_chunk(path=path)
+                span["trace"] = path
+                self.trace_files.append(path)
+            else:
+                await self.page.context.tracing.stop_chunk()
+        except Exception as e:
+            print(f"Failed to stop trace chunk: {e}")
+
+    def _register_live_feed(self):
+        """Points each transaction's live feed key at this session's image."""
+        if not self.feed_ids:
+            return
+        try:
+            name = os.path.basename(self.live_feed_path)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tx_id in self.feed_ids:
+                pipe.set(f"transaction:{tx_id}:live_feed", name, ex=LIVE_FEED_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to register live feed: {e}")
+
+    async def _update_live_feed(self) -> float:
+        """Saves the live feed screenshot; returns what it cost in ms."""
+        started = time.monotonic()
+        try:
+            # In container, /app/static maps to ./static on host
+            os.makedirs(LIVE_FEED_DIR, exist_ok=True)
+            image = await self.page.screenshot()
+            # Replaced atomically so the monitor never loads a half-written frame
+            tmp = f"{self.live_feed_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(image)
+            os.replace(tmp, self.live_feed_path)
         except Exception as e:
             print(f"Failed to save live feed screenshot: {e}")
+        return round((time.monotonic() - started) * 1000, 1)
+
+    async def _run_step(self, command: dict) -> any:
+        action = command.get("action")
+        timeout = command.get("timeout_ms", BROWSER_STEP_TIMEOUT_MS)
+        wait_for = command.get("wait_for")
+
+        expected_response = None
+        if wait_for and wait_for.get("until") == "response":
+            started = time.monotonic()
+            expected_response = asyncio.ensure_future(
+                self.page.wait_for_response(self._response_matcher(wait_for), timeout=timeout)
+            )
+
+        try:
+            result = await self._perform(action, command, timeout)
+        except Exception:
+            if expected_response is not None:
+                expected_response.cancel()
+            raise
+
+        if expected_response is not None:
+            await expected_response
+            waited_ms = round((time.monotonic() - started) * 1000, 1)
+            self.wait_log.append({"action": action, "until": "response", "waited_ms": waited_ms})
+        elif wait_for:
+            await self._wait(wait_for, timeout, action=action)
 
         return result
 
@@ -100,20 +375,40 @@ class BrowserAgent:
         Waits for a PIN to be set in Redis for the given transaction ID.
         """
         print(f"Waiting for PIN for transaction {transaction_id}...")
+        started = time.monotonic()
         # Poll every 1 second for 2 minutes
         for _ in range(120):
             pin = self.redis_client.get(f"transaction:{transaction_id}:pin")
             if pin:
                 print(f"PIN received for {transaction_id}")
+                # Human time, kept as its own span so it isn't mistaken for a slow page
+                self.spans.append({"action": "pin", "selector": None, "attempt": 0, "ok": True,
+                                   "duration_ms": round((time.monotonic() - started) * 1000, 1), "wait_ms": 0})
                 return pin.decode()
             
             # Update live feed while waiting
-            try:
-                if self.page:
-                    await self.page.screenshot(path="/app/static/live_feed.png")
-            except Exception as e:
-                print(f"Failed to update live feed during wait: {e}")
+            if self.page:
+                await self._update_live_feed()
                 
             await asyncio.sleep(1)
         
         raise TimeoutError(f"Timed out waiting for PIN for transaction {transaction_id}")
+
+
+def step_stats(redis_client) -> dict:
+    """Per-action count, mean duration and mean live-feed screenshot cost across workers."""
+    raw = {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in redis_client.hgetall(STEP_STATS_KEY).items()}
+    stats = {}
+    for key, value in raw.items():
+        action, metric = key.split(":", 1)
+        stats.setdefault(action, {})[metric] = value
+    for action, values in stats.items():
+        count = values.get("count", 0)
+        stats[action] = {
+            "count": int(count),
+            "failed": int(values.get("failed", 0)),
+            "slow": int(values.get("slow", 0)),
+            "mean_duration_ms": round(values.get("duration_ms_total", 0) / count, 1) if count else None,
+            "mean_screenshot_ms": round(values.get("screenshot_ms_total", 0) / count, 1) if count else None,
+        }
+    return stats
@@ -0,0 +1,94 @@
+import os
+import csv
+import io
+import re
+from decimal import Decimal
+from typing import NamedTuple
+
+# ui: one form submission per transfer; bulk: one NEFT/RTGS file per approved batch
+PAYMENT_MODE = os.getenv("PAYMENT_MODE", "ui")
+# RBI: RTGS is for transfers of ₹2 lakh and above
+RTGS_MINIMUM = Decimal("200000")
+REF_RE = re.compile(r"^TX(\d+)$")
+
+
+def reference(tx: dict) -> str:
+    """Customer reference the portal echoes back for each line."""
+    return f"TX{tx.get('id')}"
+
+
+def transaction_id(ref: str):
+    match = REF_RE.match(ref or "")
+    return int(match.group(1)) if match else None
+
+
+def payment_mode(amount) -> str:
+    return "RTGS" if Decimal(str(amount)) >= RTGS_MINIMUM else "NEFT"
+
+
+def _clean(text) -> str:
+    # Bank upload parsers are strict about separators and line breaks
+    return " ".join(re.sub(r"[\r\n,]+", " ", str(text or "")).split())
+
+
+def render_mock_bank(transactions: list) -> str:
+    """Titanium Trust Bank CSV: Ref, Beneficiary Name, Account Number, IFSC, Amount, Mode, Remarks."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["Ref", "Beneficiary Name", "Account Number", "IFSC", "Amount", "Mode", "Remarks"])
+    for tx in transactions:
+        amount = Decimal(str(tx.get("amount") or 0)).quantize(Decimal("0.01"))
+        writer.writerow([
+            reference(tx),
+            _clean(tx.get("vendor"))[:35],
+            tx.get("account_number") or "",
+            (tx.get("ifsc_code") or "").upper(),
+            f"{amount}",
+            payment_mode(amount),
+            _clean(tx.get("remarks"))[:30],
+        ])
+    return out.getvalue()
+
+
+# One renderer per bank flow plan (see core.flow_plan.BANK_FLOW)
+RENDERERS = {
+    "mock_bank": render_mock_bank,
+}
+
+
+class BulkResult(NamedTuple):
+    transaction_id: int
+    status: str  # SUCCESS or REJECTED
+    utr: str
+    reason: str
+
+
+def parse_results(rows: list) -> dict:
+    """
+    Maps the portal's result table (Ref, Account, Amount, Status, UTR,
+    Reason) to {transaction id: BulkResult}. Lines with an unknown Ref are
+    ignored.
+    """
+    results = {}
+    for cells in rows:
+        if len(cells) < 4:
+            continue
+        tx_id = transaction_id(cells[0])
+        if tx_id is None:
+            continue
+        status = cells[3].strip().upper()
+        utr = cells[4].strip() if len(cells) > 4 else ""
+        reason = cells[5].strip() if len(cells) > 5 else ""
+        results[tx_id] = BulkResult(tx_id, status, utr, reason)
+    return results
+
+
+def render_bulk_file(bank: str, transactions: list, directory: str) -> str:
+    """Writes the batch's upload file and returns its path."""
+    if bank not in RENDERERS:
+        raise ValueError(f"No bulk file format for bank {bank!r}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"bulk_{bank}_{reference(transactions[0])}_{len(transactions)}.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(RENDERERS[bank](transactions))
+    return path
@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+
+import asyncpg
+
+from core import metrics
+
+# asyncpg's own defaults; raise MAX with Postgres' max_connections (and the workers' share) in mind
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# A request waiting longer than this for a connection is answered 503 instead of queueing forever
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+# Connections above the minimum are closed after sitting idle this long
+DB_POOL_MAX_INACTIVE_SECONDS = float(os.getenv("DB_POOL_MAX_INACTIVE_SECONDS", "300"))
+# Per-statement limit, so one stuck query can't hold a connection indefinitely; 0 disables
+DB_COMMAND_TIMEOUT_SECONDS = float(os.getenv("DB_COMMAND_TIMEOUT_SECONDS", "0"))
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool timeout."""
+
+
+class _Acquire:
+    def __init__(self, owner, timeout: float):
+        self.owner = owner
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self):
+        owner = self.owner
+        owner.waiting += 1
+        started = time.perf_counter()
+        try:
+            self.conn = await owner.pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            metrics.pool_timeout(owner.name)
+            raise PoolTimeout(f"No database connection free within {self.timeout}s") from None
+        finally:
+            owner.waiting -= 1
+            metrics.pool_wait(owner.name, time.perf_counter() - started)
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        await self.owner.pool.release(self.conn)
+
+
+class InstrumentedPool:
+    """
+    An asyncpg pool whose acquire() is bounded by DB_POOL_TIMEOUT_SECONDS and
+    timed into payagent_db_pool_wait_seconds. Everything else is the pool's own.
+    """
+
+    def __init__(self, pool, name: str = "api", timeout: float = DB_POOL_TIMEOUT_SECONDS):
+        self.pool = pool
+        self.name = name
+        self.timeout = timeout
+        self.waiting = 0
+        self.collector = metrics.register_pool_collector(self)
+
+    def acquire(self, *, timeout: float = None):
+        return _Acquire(self, timeout or self.timeout)
+
+    def stats(self) -> dict:
+        size, idle = self.pool.get_size(), self.pool.get_idle_size()
+        return {"size": size, "idle": idle, "in_use": size - idle, "waiting": self.waiting,
+                "max": self.pool.get_max_size()}
+
+    async def close(self):
+        metrics.unregister(self.collector)
+        await self.pool.close()
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+async def create_pool(dsn: str, name: str = "api") -> InstrumentedPool:
+    pool = await asyncpg.create_pool(
+        dsn,
+        min_size=min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_SECONDS,
+        command_timeout=DB_COMMAND_TIMEOUT_SECONDS or None,
+    )
+    return InstrumentedPool(pool, name)
@@ -0,0 +1,103 @@
+import os
+import io
+import asyncio
+import hashlib
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails fall back to the full image
+    Image = None
+
+EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", os.path.join(os.getcwd(), "evidence"))
+EVIDENCE_JPEG_QUALITY = int(os.getenv("EVIDENCE_JPEG_QUALITY", "70"))
+# Proof of payment is kept for a year; evidence of failed attempts only briefly
+EVIDENCE_RETENTION_DAYS = int(os.getenv("EVIDENCE_RETENTION_DAYS", "365"))
+EVIDENCE_FAILED_RETENTION_DAYS = int(os.getenv("EVIDENCE_FAILED_RETENTION_DAYS", "30"))
+THUMBNAIL_WIDTH = 320
+
+
+class EvidenceStore:
+    """
+    Content-addressed store for payment screenshots.
+
+    Images are stored once per sha256 under `ab/cd/<sha>.jpg`, so a retried
+    step or a batch sharing one receipt costs no extra disk. Thumbnails are
+    made on first request and cached next to the original. File work is
+    blocking; the async methods run it in a thread.
+    """
+
+    def __init__(self, root: str = EVIDENCE_DIR):
+        self.root = root
+
+    def path(self, sha256: str, suffix: str = "") -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}{suffix}.jpg")
+
+    def put(self, data: bytes) -> str:
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return sha256
+
+    def thumbnail(self, sha256: str, width: int = THUMBNAIL_WIDTH) -> str:
+        """Path to a `width`-wide thumbnail, generating it on first use."""
+        original = self.path(sha256)
+        thumb = self.path(sha256, f"_w{width}")
+        if os.path.exists(thumb):
+            return thumb
+        if Image is None:
+            return original
+        with Image.open(original) as image:
+            image.thumbnail((width, width * 4))
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "JPEG", quality=EVIDENCE_JPEG_QUALITY, optimize=True)
+        tmp = f"{thumb}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, thumb)
+        return thumb
+
+    def delete(self, sha256: str):
+        directory = os.path.dirname(self.path(sha256))
+        for name in os.listdir(directory) if os.path.isdir(directory) else ():
+            if name.startswith(sha256):
+                os.remove(os.path.join(directory, name))
+
+    async def record(self, conn, transaction_ids: list, data: bytes, kind: str = "receipt") -> str:
+        """Stores the image and links it to each transaction in one INSERT."""
+        sha256 = await asyncio.to_thread(self.put, data)
+        await conn.execute("""
+            INSERT INTO evidence (transaction_id, sha256, kind, bytes)
+            SELECT id, $2, $3, $4 FROM unnest($1::int[]) AS id
+        """, transaction_ids, sha256, kind, len(data))
+        return sha256
+
+    async def prune(self, conn) -> int:
+        """
+        Applies retention: drops evidence rows past their age for PAID and
+        FAILED transactions, then deletes files no row references any more.
+        Returns how many files were removed.
+        """
+        rows = await conn.fetch("""
+            WITH expired AS (
+                DELETE FROM evidence e
+                USING transactions t
+                WHERE t.id = e.transaction_id
+                  AND ((t.status = 'PAID' AND e.created_at < NOW() - make_interval(days => $1))
+                    OR (t.status = 'FAILED' AND e.created_at < NOW() - make_interval(days => $2)))
+                RETURNING e.id, e.sha256
+            )
+            -- The CTE's snapshot still shows the deleted rows, so exclude them explicitly
+            SELECT DISTINCT x.sha256 FROM expired x
+            WHERE NOT EXISTS (
+                SELECT 1 FROM evidence e
+                WHERE e.sha256 = x.sha256 AND e.id NOT IN (SELECT id FROM expired)
+            )
+        """, EVIDENCE_RETENTION_DAYS, EVIDENCE_FAILED_RETENTION_DAYS)
+        for row in rows:
+            await asyncio.to_thread(self.delete, row["sha256"])
+        return len(rows)
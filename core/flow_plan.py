@@ -0,0 +1,208 @@
+import os
+import json
+import asyncio
+import string
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from core.browser_engine import WAIT_CONDITIONS
+
+FLOW_PLAN_DIR = os.getenv(
+    "FLOW_PLAN_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "flows"),
+)
+# Which plan in FLOW_PLAN_DIR drives payments
+BANK_FLOW = os.getenv("BANK_FLOW", "mock_bank")
+
+# Required keys per action; everything else on a step is passed through to BrowserAgent
+ACTIONS = {
+    "navigate": ("url",),
+    "fill": ("selector", "text"),
+    "click": ("selector",),
+    "read": ("selector",),
+    "read_rows": ("selector",),
+    "upload": ("selector", "path"),
+    "screenshot": (),
+    "wait": (),
+}
+# Fields that hold templates filled from run parameters
+TEMPLATED = ("url", "text", "path", "expression")
+SCREENSHOT_FORMATS = ("png", "jpeg")
+STEP_OPTIONS = ("retries", "retry_delay_ms", "optional")
+
+
+class PlanError(ValueError):
+    pass
+
+
+class CompiledStep(NamedTuple):
+    command: dict
+    params: Tuple[str, ...]
+    retries: int
+    retry_delay_ms: int
+    optional: bool
+
+
+class CompiledPlan(NamedTuple):
+    name: str
+    flows: dict
+
+    def params(self, flow: str) -> set:
+        return {p for step in self.flows[flow] for p in step.params}
+
+
+def _placeholders(template: str) -> Tuple[str, ...]:
+    try:
+        return tuple(name for _, name, _, _ in string.Formatter().parse(template) if name)
+    except ValueError as e:
+        raise PlanError(f"Bad template {template!r}: {e}")
+
+
+def _resolve(selector: str, selectors: dict, where: str) -> str:
+    if selector.startswith("@"):
+        if selector[1:] not in selectors:
+            raise PlanError(f"{where}: unknown selector {selector}")
+        return selectors[selector[1:]]
+    return selector
+
+
+def compile_plan(raw: dict) -> CompiledPlan:
+    """
+    Validates a plan and resolves it into ready-to-run step commands.
+
+    `@name` selectors are looked up in the plan's `selectors` table, defaults
+    are applied per step and template parameters are collected, so running a
+    step only has to fill in values.
+    """
+    name = raw.get("name") or "unnamed"
+    selectors = raw.get("selectors", {})
+    defaults = raw.get("defaults", {})
+    flows = {}
+
+    for flow_name, steps in (raw.get("flows") or {}).items():
+        if not steps:
+            raise PlanError(f"{name}.{flow_name}: flow has no steps")
+        compiled = []
+        for i, step in enumerate(steps):
+            where = f"{name}.{flow_name}[{i}]"
+            action = step.get("action")
+            if action not in ACTIONS:
+                raise PlanError(f"{where}: unknown action {action!r}")
+            missing = [key for key in ACTIONS[action] if step.get(key) is None]
+            if missing:
+                raise PlanError(f"{where}: {action} needs {', '.join(missing)}")
+
+            if action == "screenshot" and step.get("format", "png") not in SCREENSHOT_FORMATS:
+                raise PlanError(f"{where}: screenshot format must be one of {', '.join(SCREENSHOT_FORMATS)}")
+
+            command = {k: v for k, v in step.items() if k not in STEP_OPTIONS}
+            if "timeout_ms" not in command and defaults.get("timeout_ms"):
+                command["timeout_ms"] = defaults["timeout_ms"]
+            if "selector" in command:
+                command["selector"] = _resolve(command["selector"], selectors, where)
+
+            if command.get("wait_for"):
+                command["wait_for"] = dict(command["wait_for"])
+                if command["wait_for"].get("selector"):
+                    command["wait_for"]["selector"] = _resolve(command["wait_for"]["selector"], selectors, where)
+            for condition in (command if action == "wait" else None, command.get("wait_for")):
+                if condition is None:
+                    continue
+                until = condition.get("until", "selector")
+                if until not in WAIT_CONDITIONS:
+                    raise PlanError(f"{where}: unknown wait condition {until!r}")
+                if until in ("selector", "stable") and not condition.get("selector"):
+                    raise PlanError(f"{where}: {until} wait needs a selector")
+
+            params = tuple(p for key in TEMPLATED if isinstance(command.get(key), str) for p in _placeholders(command[key]))
+            compiled.append(CompiledStep(
+                command=command,
+                params=params,
+                retries=step.get("retries", defaults.get("retries", 0)),
+                retry_delay_ms=step.get("retry_delay_ms", defaults.get("retry_delay_ms", 0)),
+                optional=step.get("optional", False),
+            ))
+        flows[flow_name] = tuple(compiled)
+
+    if not flows:
+        raise PlanError(f"{name}: plan has no flows")
+    return CompiledPlan(name, flows)
+
+
+@lru_cache(maxsize=None)
+def load_plan(name: str = BANK_FLOW, plan_dir: str = FLOW_PLAN_DIR) -> CompiledPlan:
+    """Reads and compiles a plan once per worker process."""
+    with open(os.path.join(plan_dir, f"{name}.json"), encoding="utf-8") as f:
+        return compile_plan(json.load(f))
+
+
+def render(command: dict, params: dict) -> dict:
+    rendered = dict(command)
+    for key in TEMPLATED:
+        if isinstance(rendered.get(key), str):
+            rendered[key] = rendered[key].format_map(params)
+    return rendered
+
+
+def is_plain_fill(command: dict) -> bool:
+    return command["action"] == "fill" and not command.get("wait_for")
+
+
+def merge_fills(commands: list) -> dict:
+    """Adjacent plain fills become one fill_many, filled in a single page round-trip."""
+    merged = {"action": "fill_many", "fields": [[c["selector"], c["text"]] for c in commands]}
+    timeouts = [c["timeout_ms"] for c in commands if c.get("timeout_ms")]
+    if timeouts:
+        merged["timeout_ms"] = max(timeouts)
+    return merged
+
+
+class FlowExecutor:
+    """Runs compiled flows on a BrowserAgent with the plan's retry policy."""
+
+    def __init__(self, agent, plan: CompiledPlan):
+        self.agent = agent
+        self.plan = plan
+
+    async def run(self, flow: str, params: dict = None) -> list:
+        if flow not in self.plan.flows:
+            raise PlanError(f"{self.plan.name}: no flow named {flow!r}")
+        params = {k: "" if v is None else str(v) for k, v in (params or {}).items()}
+        missing = self.plan.params(flow) - params.keys()
+        if missing:
+            raise PlanError(f"{self.plan.name}.{flow}: missing parameters {', '.join(sorted(missing))}")
+
+        groups = []
+        for step in self.plan.flows[flow]:
+            if groups and is_plain_fill(step.command) and is_plain_fill(groups[-1][-1].command):
+                groups[-1].append(step)
+            else:
+                groups.append([step])
+
+        results = []
+        for group in groups:
+            commands = [render(step.command, params) for step in group]
+            if len(group) == 1:
+                results.append(await self._run_step(commands[0], group[0]))
+            else:
+                # The merged fill retries as hard as its most tolerant step
+                policy = group[0]._replace(
+                    retries=max(step.retries for step in group),
+                    optional=all(step.optional for step in group),
+                )
+                results.append(await self._run_step(merge_fills(commands), policy))
+        return results
+
+    async def _run_step(self, command: dict, step: CompiledStep) -> Optional[str]:
+        for attempt in range(step.retries + 1):
+            try:
+                return await self.agent.execute_step(command, attempt=attempt)
+            except Exception as e:
+                if attempt < step.retries:
+                    print(f"{self.plan.name}: {command['action']} failed ({e}), retrying")
+                    await asyncio.sleep(step.retry_delay_ms / 1000)
+                elif step.optional:
+                    print(f"{self.plan.name}: optional {command['action']} skipped: {e}")
+                    return None
+                else:
+                    raise
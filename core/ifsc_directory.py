@@ -0,0 +1,156 @@
+import csv
+import mmap
+import os
+import re
+import struct
+
+# The bundled CSV is a small sample; point this at RBI's full IFSC list in production
+IFSC_DIRECTORY_PATH = os.getenv(
+    "IFSC_DIRECTORY_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ifsc_directory.csv"),
+)
+# off: skip checks, advisory: annotate unknown codes, strict: unknown codes need review
+IFSC_DIRECTORY_MODE = os.getenv("IFSC_DIRECTORY_MODE", "advisory")
+
+MAGIC = b"IFSCIDX1"
+HEADER = struct.Struct("<8sII")   # magic, record count, strings offset
+RECORD = struct.Struct("<11sxII")  # code, pad, detail offset, detail length
+CODE_LEN = 11
+IFSC_RE = re.compile(r"^[A-Z]{4}0[A-Z0-9]{6}$")
+
+# Characters OCR commonly confuses in printed/handwritten codes
+OCR_CONFUSIONS = {
+    "0": "OD", "O": "0D", "D": "0O", "1": "IL", "I": "1L", "L": "1I",
+    "5": "S", "S": "5", "8": "B", "B": "8", "2": "Z", "Z": "2", "6": "G", "G": "6",
+}
+
+
+def build_index(csv_path: str, index_path: str):
+    """
+    Compiles the CSV into a sorted, fixed-width binary index.
+
+    Layout: header, then one 20-byte record per code sorted by code, then a
+    blob of 'BANK|BRANCH|CITY' strings the records point into. Written to a
+    temp file and renamed so concurrent workers never see a partial index.
+    """
+    entries = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            code = (row.get("ifsc") or "").strip().upper()
+            if IFSC_RE.match(code):
+                entries[code] = "|".join((row.get("bank", ""), row.get("branch", ""), row.get("city", ""))).encode()
+
+    codes = sorted(entries)
+    strings_offset = HEADER.size + RECORD.size * len(codes)
+    records, blob = [], bytearray()
+    for code in codes:
+        records.append(RECORD.pack(code.encode(), len(blob), len(entries[code])))
+        blob += entries[code]
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(codes), strings_offset))
+        f.write(b"".join(records))
+        f.write(blob)
+    os.replace(tmp_path, index_path)
+
+
+class IFSCDirectory:
+    """
+    Memory-mapped IFSC lookup shared by every worker process on a node.
+
+    The index is compiled once next to the CSV (and rebuilt when the CSV is
+    newer); each process maps it read-only so the pages live once in the OS
+    cache. Lookups are a binary search over fixed-width records.
+    """
+
+    def __init__(self, csv_path: str = IFSC_DIRECTORY_PATH):
+        index_path = os.path.splitext(csv_path)[0] + ".idx"
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(csv_path):
+            build_index(csv_path, index_path)
+
+        with open(index_path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.strings_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not an IFSC index")
+
+    def __len__(self):
+        return self.count
+
+    def _code_at(self, i: int) -> bytes:
+        start = HEADER.size + i * RECORD.size
+        return self.mm[start:start + CODE_LEN]
+
+    def _bisect(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._code_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, code: str):
+        """Returns {'ifsc', 'bank', 'branch', 'city'} or None."""
+        key = (code or "").strip().upper().encode()
+        if len(key) != CODE_LEN:
+            return None
+        i = self._bisect(key)
+        if i >= self.count or self._code_at(i) != key:
+            return None
+        _, offset, length = RECORD.unpack_from(self.mm, HEADER.size + i * RECORD.size)
+        start = self.strings_offset + offset
+        bank, branch, city = self.mm[start:start + length].decode().split("|")
+        return {"ifsc": key.decode(), "bank": bank, "branch": branch, "city": city}
+
+    def __contains__(self, code: str) -> bool:
+        return self.lookup(code) is not None
+
+    def suggest(self, code: str, limit: int = 3) -> list:
+        """
+        Nearest known codes for a likely OCR misread: first single-character
+        OCR confusions anywhere in the code, then any one-character difference
+        within the same bank prefix.
+        """
+        code = (code or "").strip().upper()
+        if len(code) != CODE_LEN:
+            return []
+
+        found = []
+        for i, ch in enumerate(code):
+            for alt in OCR_CONFUSIONS.get(ch, ""):
+                candidate = code[:i] + alt + code[i + 1:]
+                if candidate not in found and candidate in self:
+                    found.append(candidate)
+
+        # Scan the bank's contiguous range for codes one substitution away
+        prefix = code[:4].encode()
+        i = self._bisect(prefix)
+        while i < self.count and len(found) < limit:
+            other = self._code_at(i)
+            if not other.startswith(prefix):
+                break
+            other = other.decode()
+            if other not in found and sum(a != b for a, b in zip(code, other)) == 1:
+                found.append(other)
+            i += 1
+
+        return found[:limit]
+
+
+_directory = None
+
+
+def get_directory():
+    """Process-wide directory, mapped on first use. None when disabled or missing."""
+    global _directory
+    if _directory is None:
+        _directory = False
+        if IFSC_DIRECTORY_MODE != "off":
+            try:
+                _directory = IFSCDirectory()
+            except Exception as e:
+                print(f"IFSC directory unavailable: {e}")
+    return _directory or None
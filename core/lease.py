@@ -0,0 +1,130 @@
+import os
+import uuid
+import time
+import socket
+import asyncio
+from contextlib import asynccontextmanager
+
+# A lease outlives a stalled heartbeat by this much before another worker may take over
+PAYMENT_LEASE_TTL_MS = int(os.getenv("PAYMENT_LEASE_TTL_MS", "30000"))
+LEASE_PREFIX = "lease:tx:"
+# One counter for every lease, so tokens only ever grow
+FENCE_KEY = "lease:fence"
+
+# KEYS: lease keys..., fence counter. ARGV: owner, ttl_ms.
+# All-or-nothing, so a batch never holds half its transactions.
+ACQUIRE_LUA = """
+local fence = KEYS[#KEYS]
+for i = 1, #KEYS - 1 do
+    if redis.call('exists', KEYS[i]) == 1 then return 0 end
+end
+local token = redis.call('incr', fence)
+local value = ARGV[1] .. ':' .. token
+for i = 1, #KEYS - 1 do
+    redis.call('set', KEYS[i], value, 'PX', ARGV[2])
+end
+return token
+"""
+# KEYS: lease keys. ARGV: value, ttl_ms. Fails if any key changed hands or expired.
+RENEW_LUA = """
+for i = 1, #KEYS do
+    if redis.call('get', KEYS[i]) ~= ARGV[1] then return 0 end
+end
+for i = 1, #KEYS do
+    redis.call('pexpire', KEYS[i], ARGV[2])
+end
+return 1
+"""
+RELEASE_LUA = """
+local released = 0
+for i = 1, #KEYS do
+    if redis.call('get', KEYS[i]) == ARGV[1] then
+        redis.call('del', KEYS[i])
+        released = released + 1
+    end
+end
+return released
+"""
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """
+    Exclusive, expiring hold on a set of transactions across worker nodes.
+
+    `acquire` takes every key or none and returns a fencing token that grows
+    with each grant. Pass the token to `transition(..., fence=token)` so a
+    worker whose lease expired (a long GC pause, a partitioned node) can't
+    overwrite the state written by the worker that took over.
+    """
+
+    def __init__(self, redis_client, transaction_ids: list, ttl_ms: int = PAYMENT_LEASE_TTL_MS, owner: str = None):
+        self.redis = redis_client
+        self.keys = [f"{LEASE_PREFIX}{tx_id}" for tx_id in sorted({str(i) for i in transaction_ids})]
+        self.ttl_ms = ttl_ms
+        self.owner = owner or worker_id()
+        self.token = None
+        self.lost = False
+
+    @property
+    def value(self) -> str:
+        return f"{self.owner}:{self.token}"
+
+    def acquire(self) -> bool:
+        token = self.redis.eval(ACQUIRE_LUA, len(self.keys) + 1, *self.keys, FENCE_KEY, self.owner, self.ttl_ms)
+        if not token:
+            return False
+        self.token = int(token)
+        self.lost = False
+        return True
+
+    def renew(self) -> bool:
+        return bool(self.redis.eval(RENEW_LUA, len(self.keys), *self.keys, self.value, self.ttl_ms))
+
+    def release(self):
+        if self.token is not None:
+            self.redis.eval(RELEASE_LUA, len(self.keys), *self.keys, self.value)
+
+    def check(self):
+        """Raises LeaseLost once a heartbeat has failed; call before irreversible steps."""
+        if self.lost:
+            raise LeaseLost(f"Lease on {', '.join(self.keys)} (token {self.token}) was lost")
+
+    async def heartbeat(self):
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            try:
+                renewed = await asyncio.to_thread(self.renew)
+            except Exception as e:
+                # Redis blips are retried until the lease would have expired anyway
+                print(f"Lease heartbeat error for token {self.token}: {e}")
+                renewed = (time.monotonic() - renewed_at) * 1000 < self.ttl_ms
+                if renewed:
+                    continue
+            else:
+                renewed_at = time.monotonic()
+            if not renewed:
+                self.lost = True
+                print(f"⚠️ Lease lost for token {self.token} ({', '.join(self.keys)})")
+                return
+
+    @asynccontextmanager
+    async def held(self):
+        """Keeps an acquired lease alive for the duration of the block, then releases it."""
+        beat = asyncio.create_task(self.heartbeat())
+        try:
+            yield self
+        finally:
+            beat.cancel()
+            try:
+                await asyncio.to_thread(self.release)
+            except Exception as e:
+                print(f"Failed to release lease token {self.token}: {e}")
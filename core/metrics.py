@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+
+# Prefork workers share metrics through files here; must exist before prometheus_client loads
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST
+    from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+except ImportError:  # metrics become no-ops and /metrics reports them unavailable
+    prometheus_client = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+# Messages inspected per queue when counting backlog by task type
+QUEUE_SCAN_LIMIT = 10000
+# Pipeline stages, in order: invoice ingestion, then payment
+STAGES = (
+    "upload_write", "queue_wait", "model_upload", "model_inference", "json_parse", "db_insert",
+    "browser_launch", "login", "form_fill", "pin_wait", "confirm",
+)
+# Seconds; the long tail is for humans entering a PIN
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Seconds; an unsaturated pool hands out connections in well under a millisecond
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Celery task the current code runs under, set by the worker's task_prerun hook
+current_task = contextvars.ContextVar("current_task", default="none")
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+if prometheus_client:
+    STAGE_SECONDS = Histogram("payagent_stage_seconds", "Time spent in each pipeline stage",
+                              ["stage", "task"], buckets=STAGE_BUCKETS)
+    EXTRACTION_FAILURES = Counter("payagent_extraction_failures_total", "Invoices or extraction attempts that failed",
+                                  ["task", "reason"])
+    PAYMENT_OUTCOMES = Counter("payagent_payment_outcomes_total", "Transactions by how their payment attempt ended",
+                               ["task", "outcome"])
+    DB_POOL_WAIT = Histogram("payagent_db_pool_wait_seconds", "Time spent waiting for a database connection",
+                             ["pool"], buckets=POOL_WAIT_BUCKETS)
+    DB_POOL_TIMEOUTS = Counter("payagent_db_pool_timeouts_total", "Connection requests that gave up waiting", ["pool"])
+else:
+    STAGE_SECONDS = EXTRACTION_FAILURES = PAYMENT_OUTCOMES = DB_POOL_WAIT = DB_POOL_TIMEOUTS = _Noop()
+
+
+def task_label(name: str) -> str:
+    """worker.tasks.execute_payment -> execute_payment"""
+    return name.rsplit(".", 1)[-1] if name else "none"
+
+
+@contextmanager
+def stage(name: str, task: str = None):
+    """Times the block into payagent_stage_seconds, failed or not."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, task)
+
+
+def observe(name: str, seconds: float, task: str = None):
+    STAGE_SECONDS.labels(stage=name, task=task or current_task.get()).observe(seconds)
+
+
+def payment_outcome(outcome: str, count: int = 1, task: str = None):
+    if count:
+        PAYMENT_OUTCOMES.labels(task=task or current_task.get(), outcome=outcome).inc(count)
+
+
+def extraction_failure(reason: str, task: str = None):
+    EXTRACTION_FAILURES.labels(task=task or current_task.get(), reason=reason).inc()
+
+
+def pool_wait(pool: str, seconds: float):
+    DB_POOL_WAIT.labels(pool=pool).observe(seconds)
+
+
+def pool_timeout(pool: str):
+    DB_POOL_TIMEOUTS.labels(pool=pool).inc()
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class QueueDepthCollector:
+    """Celery backlog per queue and task type, read from the Redis broker at scrape time."""
+
+    def __init__(self, redis_client, queues):
+        self.redis = redis_client
+        self.queues = queues
+
+    def collect(self):
+        depth = GaugeMetricFamily("payagent_queue_depth", "Messages waiting in the broker", labels=["queue", "task"])
+        for queue in self.queues:
+            counts = {}
+            for raw in self.redis.lrange(queue, 0, QUEUE_SCAN_LIMIT - 1):
+                try:
+                    task = json.loads(raw)["headers"]["task"]
+                except (ValueError, KeyError, TypeError):
+                    task = "unknown"
+                counts[task_label(task)] = counts.get(task_label(task), 0) + 1
+            total = self.redis.llen(queue)
+            # Anything past the scan limit is counted without a task type
+            if total > sum(counts.values()):
+                counts["unscanned"] = total - sum(counts.values())
+            for task, count in counts.items():
+                depth.add_metric([queue, task], count)
+        yield depth
+
+
+class RedisStatsCollector:
+    """
+    Re-exports the counters components already keep in Redis hashes
+    (extraction winners, cascade stages, browser steps and asset cache,
+    worker memory), so one scrape covers everything.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def _hash(self, key) -> dict:
+        return {_text(k): float(v) for k, v in self.redis.hgetall(key).items()}
+
+    def collect(self):
+        wins = CounterMetricFamily("payagent_extraction_wins", "Extractions won per provider", labels=["provider"])
+        for provider, value in self._hash("extraction:winners").items():
+            wins.add_metric([provider], value)
+        yield wins
+
+        cascade = CounterMetricFamily("payagent_cascade_attempts", "Cascade stage attempts", labels=["stage", "result"])
+        for key, value in self._hash("extraction:cascade").items():
+            name, field = key.rsplit(":", 1)
+            if field in ("attempts", "accepted"):
+                cascade.add_metric([name, field], value)
+        yield cascade
+
+        steps = CounterMetricFamily("payagent_browser_steps", "Browser steps by action", labels=["action", "result"])
+        for key, value in self._hash("browser:steps").items():
+            action, field = key.split(":", 1)
+            if field in ("count", "failed", "slow"):
+                steps.add_metric([action, field], value)
+        yield steps
+
+        assets = CounterMetricFamily("payagent_browser_asset_requests", "Routed browser requests", labels=["result"])
+        for result, value in self._hash("browser:asset_cache").items():
+            assets.add_metric([result], value)
+        yield assets
+
+        memory = GaugeMetricFamily("payagent_worker_memory_megabytes", "Worker pool process memory",
+                                   labels=["host", "pid", "kind"])
+        for key in self.redis.scan_iter(match="worker:memory:*"):
+            host = _text(key).split(":", 2)[2]
+            if host == "events":
+                continue
+            for field, value in self._hash(key).items():
+                pid, name = field.split(":", 1)
+                if name.endswith("_mb"):
+                    memory.add_metric([host, pid, name[:-3]], value)
+        yield memory
+
+        events = CounterMetricFamily("payagent_worker_events", "Worker recycles and orphan browsers reaped", labels=["event"])
+        for event, value in self._hash("worker:memory:events").items():
+            events.add_metric([event], value)
+        yield events
+
+
+class PoolCollector:
+    """Connections of one database pool by state, read at scrape time."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        connections = GaugeMetricFamily("payagent_db_pool_connections", "Database pool connections by state",
+                                        labels=["pool", "state"])
+        for state, value in self.pool.stats().items():
+            connections.add_metric([self.pool.name, state], value)
+        yield connections
+
+
+def register_api_collectors(redis_client, queues):
+    if prometheus_client:
+        prometheus_client.REGISTRY.register(QueueDepthCollector(redis_client, queues))
+        prometheus_client.REGISTRY.register(RedisStatsCollector(redis_client))
+
+
+def register_pool_collector(pool):
+    """Returns the collector, for `unregister` when the pool closes."""
+    if prometheus_client is None:
+        return None
+    collector = PoolCollector(pool)
+    prometheus_client.REGISTRY.register(collector)
+    return collector
+
+
+def unregister(collector):
+    if prometheus_client and collector is not None:
+        prometheus_client.REGISTRY.unregister(collector)
+
+
+def render_latest() -> bytes:
+    """Exposition for this process's registry (the API's /metrics)."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(prometheus_client.REGISTRY)
+
+
+def clear_multiprocess_dir():
+    """Drops the previous run's files; call in the worker's main process before the pool forks."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        for name in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+            if name.endswith(".db"):
+                os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, name))
+
+
+def start_worker_exporter(port: int = WORKER_METRICS_PORT) -> bool:
+    """Serves every pool process's metrics from the worker's main process."""
+    if prometheus_client is None:
+        print("Metrics: prometheus_client not installed, worker exporter disabled")
+        return False
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    prometheus_client.start_http_server(port, registry=registry)
+    return True
+
+
+def mark_process_dead(pid: int):
+    if prometheus_client and PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,121 @@
+import os
+import datetime
+
+# PAID/FAILED transactions (by last update) and audits older than this move to the cold tier
+PARTITION_HOT_DAYS = int(os.getenv("PARTITION_HOT_DAYS", "90"))
+# Monthly partitions kept ready past the current month; rows beyond them wait in the default partition
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Existing tablespace (e.g. on cheaper disk) for new cold tiers; unset keeps them with the rest
+PARTITION_COLD_TABLESPACE = os.getenv("PARTITION_COLD_TABLESPACE") or None
+# Rows moved per statement, so archiving never holds many row locks at once
+PARTITION_ARCHIVE_BATCH_SIZE = int(os.getenv("PARTITION_ARCHIVE_BATCH_SIZE", "5000"))
+
+PARTITIONED_TABLES = ("transactions", "audits")
+# Only settled transactions go cold; anything that can still change status stays in the hot tier
+COLD_FILTERS = {"transactions": "status IN ('PAID', 'FAILED')"}
+# What a row's age is measured from, first choice first; rows written before updated_at existed have none
+AGE_COLUMNS = {"transactions": ("updated_at", "created_at"), "audits": ("created_at",)}
+
+
+def cold_rule(table: str, columns=None) -> str:
+    """
+    Condition for rows of `table` that belong in the cold tier, given the
+    cutoff as $1. `columns` limits it to those a table has, e.g. a plain one
+    from before updated_at was added.
+    """
+    ages = [column for column in AGE_COLUMNS[table] if columns is None or column in columns]
+    age = ages[0] if len(ages) == 1 else f"COALESCE({', '.join(ages)})"
+    return " AND ".join(filter(None, [COLD_FILTERS.get(table), f"{age} < $1"]))
+
+
+# The rules archive applies to the partitioned tables
+COLD_RULES = {table: cold_rule(table) for table in PARTITIONED_TABLES}
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: datetime.date, last: datetime.date) -> list:
+    """First day of every month from `first`'s through `last`'s, inclusive."""
+    months, month = [], month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: datetime.date, tier: str = None) -> str:
+    """transactions, 2026-10 -> transactions_202610 (or transactions_202610_hot)."""
+    name = f"{table}_{month:%Y%m}"
+    return f"{name}_{tier}" if tier else name
+
+
+async def ensure_partitions(conn, first: datetime.date = None, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list:
+    """
+    Creates any missing monthly partitions (with their hot and cold tiers) from
+    `first`'s month through `months_ahead` past the current one, moving rows
+    that were waiting for them out of the default partition. Returns the
+    names of the partitions created.
+    """
+    this_month = month_start(datetime.date.today())
+    created = []
+    for month in months_between(first or this_month, add_months(this_month, months_ahead)):
+        for table in PARTITIONED_TABLES:
+            if await conn.fetchval("SELECT ensure_month_partition($1, $2, $3)", table, month, PARTITION_COLD_TABLESPACE):
+                created.append(partition_name(table, month))
+    return created
+
+
+async def archive(conn, hot_days: int = PARTITION_HOT_DAYS, batch_size: int = PARTITION_ARCHIVE_BATCH_SIZE) -> dict:
+    """
+    Moves rows matching COLD_RULES from hot tiers to cold ones, a batch at a
+    time; rows locked by a payment or an approval in flight are skipped until
+    the next run, and so are rows still in the default partition until
+    ensure_partitions gives them a month. The hot tiers that shed rows are
+    vacuumed so their indexes stay small, and the cold tiers that took them
+    are frozen. Returns rows moved per table.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=hot_days)
+    moved = {}
+    for table, rule in COLD_RULES.items():
+        months, total = set(), 0
+        while True:
+            rows = await conn.fetch(f"""
+                UPDATE {table} SET tier = 'cold'
+                WHERE tier = 'hot' AND (id, created_at) IN (
+                    SELECT id, created_at FROM {table}
+                    WHERE tier = 'hot' AND tableoid <> '{table}_default'::regclass AND {rule}
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING created_at
+            """, cutoff, batch_size)
+            months.update(month_start(row["created_at"]) for row in rows)
+            total += len(rows)
+            if len(rows) < batch_size:
+                break
+        # VACUUM can't run inside a transaction block; callers pass a plain connection
+        for month in sorted(months):
+            await conn.execute(f"VACUUM (ANALYZE) {partition_name(table, month, 'hot')}")
+            await conn.execute(f"VACUUM (FREEZE, ANALYZE) {partition_name(table, month, 'cold')}")
+        moved[table] = total
+    return moved
+
+
+async def partition_sizes(conn) -> list:
+    """Rows (estimated), heap and index bytes of every leaf partition, oldest first."""
+    rows = await conn.fetch("""
+        SELECT t.relid::text AS name, c.reltuples::bigint AS rows,
+               pg_relation_size(t.relid) AS table_bytes, pg_indexes_size(t.relid) AS index_bytes
+        FROM unnest($1::text[]) AS parent, pg_partition_tree(parent::regclass) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf
+        ORDER BY t.relid::text
+    """, list(PARTITIONED_TABLES))
+    return [dict(row) for row in rows]
@@ -0,0 +1,99 @@
+EXTRACTED = "EXTRACTED"
+NEEDS_REVIEW = "NEEDS_REVIEW"
+NEEDS_APPROVAL = "NEEDS_APPROVAL"
+DUPLICATE_SUSPECTED = "DUPLICATE_SUSPECTED"
+QUEUED_FOR_PAYMENT = "QUEUED_FOR_PAYMENT"
+WAITING_FOR_PIN = "WAITING_FOR_PIN"
+PAID = "PAID"
+FAILED = "FAILED"
+
+TRANSITIONS = {
+    EXTRACTED: {NEEDS_REVIEW, NEEDS_APPROVAL, DUPLICATE_SUSPECTED},
+    NEEDS_REVIEW: {NEEDS_APPROVAL, QUEUED_FOR_PAYMENT},
+    NEEDS_APPROVAL: {NEEDS_REVIEW, QUEUED_FOR_PAYMENT},
+    DUPLICATE_SUSPECTED: {NEEDS_APPROVAL, QUEUED_FOR_PAYMENT},
+    QUEUED_FOR_PAYMENT: {WAITING_FOR_PIN, PAID, FAILED},
+    WAITING_FOR_PIN: {PAID, FAILED},
+    FAILED: {QUEUED_FOR_PAYMENT},
+    PAID: set(),
+}
+
+# Statuses shown in the dashboard's pending list
+PENDING_STATUSES = (EXTRACTED, NEEDS_APPROVAL, NEEDS_REVIEW, DUPLICATE_SUSPECTED, QUEUED_FOR_PAYMENT, WAITING_FOR_PIN)
+# Statuses a user can approve for payment
+APPROVABLE_STATUSES = (NEEDS_APPROVAL, NEEDS_REVIEW, DUPLICATE_SUSPECTED)
+# Statuses whose details a reviewer may still correct (nothing in flight or paid)
+EDITABLE_STATUSES = APPROVABLE_STATUSES + (FAILED,)
+
+
+class IllegalTransition(ValueError):
+    pass
+
+
+def check_transition(from_statuses, to_statuses):
+    if isinstance(to_statuses, str):
+        to_statuses = (to_statuses,)
+    for from_status in from_statuses:
+        for to_status in to_statuses:
+            if to_status not in TRANSITIONS.get(from_status, ()):
+                raise IllegalTransition(f"{from_status} -> {to_status} is not allowed")
+
+
+async def transition(conn, to_status: str, from_statuses, ids: list = None, batch_id: str = None, user_id: str = None,
+                     fence: int = None) -> list:
+    """
+    Moves every matching transaction currently in one of `from_statuses` to
+    `to_status` and returns the moved rows (with a `from_status` column).
+
+    Rows are selected by `ids` and/or `batch_id`, optionally scoped to
+    `user_id`. A row already moved by someone else no longer matches the
+    status guard, so concurrent callers can't both win the same transition.
+    One `transaction_events` row per moved transaction is written by the
+    same statement.
+
+    `fence` is a payment lease's fencing token (see core.lease): rows last
+    written under a newer token are left alone, and moved rows record it.
+
+    Moved rows land in the hot tier; only a retried FAILED row can come
+    from the cold one (see core.partitions).
+    """
+    if isinstance(from_statuses, str):
+        from_statuses = (from_statuses,)
+    check_transition(from_statuses, to_status)
+    if ids is None and batch_id is None:
+        raise ValueError("transition needs ids or a batch_id")
+
+    params = [to_status, list(from_statuses)]
+    filters = ["status = ANY($2::varchar[])"]
+    if ids is not None:
+        params.append(list(ids))
+        filters.append(f"id = ANY(${len(params)}::int[])")
+    if batch_id is not None:
+        params.append(batch_id)
+        filters.append(f"batch_id = ${len(params)}")
+    if user_id is not None:
+        params.append(user_id)
+        filters.append(f"user_id = ${len(params)}")
+    fence_set = ""
+    if fence is not None:
+        params.append(fence)
+        filters.append(f"(payment_fence IS NULL OR payment_fence <= ${len(params)})")
+        fence_set = f", payment_fence = ${len(params)}"
+
+    rows = await conn.fetch(f"""
+        WITH prev AS (
+            SELECT id, status FROM transactions
+            WHERE {" AND ".join(filters)}
+            FOR UPDATE
+        ), moved AS (
+            UPDATE transactions t SET status = $1, updated_at = NOW(), tier = 'hot'{fence_set}
+            FROM prev
+            WHERE t.id = prev.id AND t.status = prev.status
+            RETURNING t.*, prev.status AS from_status
+        ), events AS (
+            INSERT INTO transaction_events (transaction_id, from_status, to_status)
+            SELECT id, from_status, status FROM moved
+        )
+        SELECT * FROM moved ORDER BY id
+    """, *params)
+    return rows
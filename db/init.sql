@@ -1,9 +1,13 @@
 CREATE TABLE IF NOT EXISTS vendors (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
-    account_number VARCHAR(255)
+    account_number VARCHAR(255),
+    ifsc_code VARCHAR(255)
 );
 
+-- Columns added since the first release; CREATE TABLE IF NOT EXISTS leaves older databases without them
+ALTER TABLE vendors ADD COLUMN IF NOT EXISTS ifsc_code VARCHAR(255);
+
 CREATE TABLE IF NOT EXISTS users (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     email VARCHAR(255) UNIQUE NOT NULL,
@@ -30,17 +34,31 @@ CREATE TABLE IF NOT EXISTS payments (
     executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- transactions and audits are partitioned by month of created_at, and each month by tier:
+-- 'hot' for live rows, 'cold' for PAID/FAILED transactions and audits past PARTITION_HOT_DAYS
+-- (moved by core/partitions.py). Partitions are created by ensure_month_partition below.
+-- Ids come from a named sequence so db/migrate.py can carry an unpartitioned table's over.
+CREATE SEQUENCE IF NOT EXISTS audits_id_seq;
+
 CREATE TABLE IF NOT EXISTS audits (
-    id SERIAL PRIMARY KEY,
+    id INTEGER NOT NULL DEFAULT nextval('audits_id_seq'),
     request_hash VARCHAR(64) NOT NULL,
     response_hash VARCHAR(64) NOT NULL,
     raw_request TEXT,
     raw_response TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    tier VARCHAR(4) NOT NULL DEFAULT 'hot',
+    PRIMARY KEY (id, created_at, tier)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE audits_id_seq OWNED BY audits.id;
+
+CREATE INDEX IF NOT EXISTS idx_audits_created_at ON audits (created_at);
+
+CREATE SEQUENCE IF NOT EXISTS transactions_id_seq;
 
 CREATE TABLE IF NOT EXISTS transactions (
-    id SERIAL PRIMARY KEY,
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
     user_id UUID REFERENCES users(id) NOT NULL,
     batch_id VARCHAR(255) NOT NULL,
     vendor VARCHAR(255) NOT NULL,
@@ -49,6 +67,130 @@ CREATE TABLE IF NOT EXISTS transactions (
     account_number VARCHAR(255),
     ifsc_code VARCHAR(255),
     remarks TEXT,
-    status VARCHAR(50) DEFAULT 'NEEDS_APPROVAL', -- EXTRACTED, NEEDS_APPROVAL, NEEDS_REVIEW, QUEUED_FOR_PAYMENT, PAID, FAILED
+    status VARCHAR(50) DEFAULT 'NEEDS_APPROVAL', -- EXTRACTED, NEEDS_APPROVAL, NEEDS_REVIEW, DUPLICATE_SUSPECTED, QUEUED_FOR_PAYMENT, PAID, FAILED
+    fingerprint VARCHAR(64), -- sha256 of (normalized vendor, account, amount, date window)
+    payment_fence BIGINT, -- fencing token of the payment lease that last moved this row (core.lease)
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    tier VARCHAR(4) NOT NULL DEFAULT 'hot', -- hot, cold (see audits above)
+    PRIMARY KEY (id, created_at, tier)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+
+-- Existing rows keep updated_at NULL (read as created_at) rather than all taking the upgrade time
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE transactions ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS payment_fence BIGINT;
+
+-- Exact lookup behind the Redis Bloom pre-filter for duplicate payments
+CREATE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions (fingerprint) WHERE fingerprint IS NOT NULL;
+
+-- Vendor index refresh reads recently paid rows
+CREATE INDEX IF NOT EXISTS idx_transactions_paid_updated_at ON transactions (updated_at) WHERE status = 'PAID';
+
+-- One row per status change, written by core.state_machine.transition
+CREATE TABLE IF NOT EXISTS transaction_events (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id INTEGER NOT NULL,
+    from_status VARCHAR(50) NOT NULL,
+    to_status VARCHAR(50) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE INDEX IF NOT EXISTS idx_transaction_events_transaction_id ON transaction_events (transaction_id);
+
+-- Tasks to publish to Celery, written in the same transaction as the status change
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task_name VARCHAR(255) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (id) WHERE sent_at IS NULL;
+
+-- Browser step spans for each payment attempt (see core.browser_engine.BrowserAgent.execute_step)
+CREATE TABLE IF NOT EXISTS payment_traces (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id INTEGER NOT NULL,
+    spans JSONB NOT NULL,
+    trace_files TEXT[],
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_payment_traces_transaction_id ON payment_traces (transaction_id);
+
+-- Payment screenshots; the image lives in the content-addressed store (core.evidence)
+CREATE TABLE IF NOT EXISTS evidence (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id INTEGER NOT NULL,
+    sha256 VARCHAR(64) NOT NULL,
+    kind VARCHAR(32) NOT NULL DEFAULT 'receipt',
+    bytes INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_evidence_transaction_id ON evidence (transaction_id);
+CREATE INDEX IF NOT EXISTS idx_evidence_sha256 ON evidence (sha256);
+
+-- Rows for a month with no partition yet (the beat fell behind) land here rather than failing
+-- the INSERT; ensure_month_partition moves them out when it creates their month
+CREATE TABLE IF NOT EXISTS audits_default PARTITION OF audits DEFAULT;
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+
+-- Creates `parent`'s partition for the month containing `month`, split into hot and cold tiers.
+-- Cold tiers are packed full, TOAST-compress with lz4 from a small row size, may live on their
+-- own tablespace, and skip the dashboard index, which exists only on hot tiers of transactions.
+-- Rows waiting in the default partition move into it. Returns false if the partition already existed.
+CREATE OR REPLACE FUNCTION ensure_month_partition(parent TEXT, month DATE, cold_tablespace TEXT DEFAULT NULL)
+RETURNS BOOLEAN AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month);
+    name TEXT := parent || '_' || to_char(start_at, 'YYYYMM');
+    col NAME;
+BEGIN
+    IF to_regclass(name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    -- The default partition may not hold rows of the new range, so they wait in a temp table
+    IF to_regclass(parent || '_default') IS NOT NULL THEN
+        EXECUTE format('CREATE TEMP TABLE %I (LIKE %I)', name || '_waiting', parent);
+        EXECUTE format('WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved',
+                       parent || '_default', start_at, (start_at + INTERVAL '1 month')::DATE, name || '_waiting');
+    END IF;
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L) PARTITION BY LIST (tier)',
+                   name, parent, start_at, (start_at + INTERVAL '1 month')::DATE);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (''hot'')', name || '_hot', name);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (''cold'') WITH (fillfactor = 100, toast_tuple_target = 128)',
+                   name || '_cold', name)
+        || CASE WHEN cold_tablespace IS NULL THEN '' ELSE format(' TABLESPACE %I', cold_tablespace) END;
+    BEGIN
+        FOR col IN SELECT attname FROM pg_attribute
+                   WHERE attrelid = (name || '_cold')::REGCLASS AND attnum > 0 AND NOT attisdropped AND attstorage = 'x'
+        LOOP
+            EXECUTE format('ALTER TABLE %I ALTER COLUMN %I SET COMPRESSION lz4', name || '_cold', col);
+        END LOOP;
+    EXCEPTION WHEN feature_not_supported THEN
+        RAISE NOTICE 'lz4 is not available; % keeps the default compression', name || '_cold';
+    END;
+    IF parent = 'transactions' THEN
+        -- The pending list: one user's non-terminal rows, newest first
+        EXECUTE format('CREATE INDEX %I ON %I (user_id, status, created_at)', name || '_hot_dashboard', name || '_hot');
+    END IF;
+    IF to_regclass(name || '_waiting') IS NOT NULL THEN
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I', parent, name || '_waiting');
+        EXECUTE format('DROP TABLE %I', name || '_waiting');
+    END IF;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The current month and three ahead; the notifier's beat keeps extending this (core.partitions)
+SELECT ensure_month_partition(parent, (date_trunc('month', CURRENT_DATE) + make_interval(months => m))::DATE)
+FROM unnest(ARRAY['transactions', 'audits']) AS parent, generate_series(0, 3) AS m;
@@ -0,0 +1,171 @@
+"""
+Schema and partition management for Postgres.
+
+    python db/migrate.py upgrade       # bring a database to db/init.sql, partitioning old tables
+    python db/migrate.py partitions    # create monthly partitions through PARTITION_MONTHS_AHEAD
+    python db/migrate.py archive       # move old PAID/FAILED transactions and audits to cold tiers
+    python db/migrate.py maintain      # partitions + archive (what the notifier's beat runs daily)
+    python db/migrate.py status        # rows and table/index size per partition, hot vs cold
+
+upgrade is safe to re-run. A database created before partitioning has plain
+`transactions` and `audits` tables; upgrade copies each into the partitioned
+layout (ids and their sequence are kept) inside one transaction, so it holds
+an exclusive lock on them until it commits. Run it with the API and workers
+stopped.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.partitions import (
+    ensure_partitions, archive, partition_sizes, month_start,
+    cold_rule, PARTITIONED_TABLES, PARTITION_HOT_DAYS, PARTITION_MONTHS_AHEAD, PARTITION_ARCHIVE_BATCH_SIZE,
+)
+
+load_dotenv()
+
+INIT_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "init.sql")
+
+
+async def unpartitioned(conn) -> list:
+    """Partitioned tables that still exist as plain tables."""
+    rows = await conn.fetch("""
+        SELECT relname FROM pg_class
+        WHERE relname = ANY($1::text[]) AND relkind = 'r' AND relnamespace = 'public'::regnamespace
+    """, list(PARTITIONED_TABLES))
+    return [row["relname"] for row in rows]
+
+
+async def set_aside(conn, table: str) -> str:
+    """
+    Renames a plain table out of the way so init.sql can create the
+    partitioned one: its primary key and indexes are renamed or dropped (their
+    names are schema-wide) and its id sequence is released for the new table.
+    """
+    legacy = f"{table}_unpartitioned"
+    await conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    await conn.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+    indexes = await conn.fetch("""
+        SELECT indexrelid::regclass::text AS name FROM pg_index
+        WHERE indrelid = $1::regclass AND NOT indisprimary
+    """, legacy)
+    for index in indexes:
+        await conn.execute(f"DROP INDEX {index['name']}")
+    await conn.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    return legacy
+
+
+async def table_columns(conn, table: str) -> list:
+    rows = await conn.fetch("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = $1
+        ORDER BY ordinal_position
+    """, table)
+    return [row["column_name"] for row in rows]
+
+
+async def copy_into_partitions(conn, table: str, legacy: str, hot_days: int) -> int:
+    """
+    Copies every row, tiered by the cold rule for the columns the plain table
+    has, then drops it. Columns it predates are left NULL (updated_at then
+    reads as created_at, as on tables upgraded in place).
+    """
+    first = await conn.fetchval(f"SELECT min(created_at) FROM {legacy}")
+    await ensure_partitions(conn, first=first.date() if first else None)
+
+    old_columns, new_columns = await table_columns(conn, legacy), await table_columns(conn, table)
+    values = {name: name for name in new_columns if name in old_columns and name != "created_at"}
+    if "updated_at" in new_columns and "updated_at" not in old_columns:
+        values["updated_at"] = "NULL"
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=hot_days)
+    result = await conn.execute(f"""
+        INSERT INTO {table} ({", ".join(values)}, created_at, tier)
+        SELECT {", ".join(values.values())}, COALESCE(created_at, NOW()),
+               CASE WHEN {cold_rule(table, old_columns)} THEN 'cold' ELSE 'hot' END
+        FROM {legacy}
+    """, cutoff)
+    await conn.execute(f"DROP TABLE {legacy}")
+    return int(result.split()[-1])
+
+
+async def upgrade(conn, hot_days: int = PARTITION_HOT_DAYS):
+    with open(INIT_SQL) as f:
+        init_sql = f.read()
+    async with conn.transaction():
+        pending = await unpartitioned(conn)
+        legacy = {table: await set_aside(conn, table) for table in pending}
+        await conn.execute(init_sql)
+        for table, old in legacy.items():
+            copied = await copy_into_partitions(conn, table, old, hot_days)
+            print(f"Partitioned {table}: {copied} rows copied")
+        created = await ensure_partitions(conn)
+    if created:
+        print(f"Created partitions: {', '.join(created)}")
+    for table in pending:
+        await conn.execute(f"VACUUM (ANALYZE) {table}")
+    print("Schema is up to date")
+
+
+async def maintain(conn, hot_days: int, batch_size: int):
+    created = await ensure_partitions(conn)
+    print(f"Created partitions: {', '.join(created) or 'none needed'}")
+    moved = await archive(conn, hot_days, batch_size)
+    print(f"Moved to cold tiers: {moved}")
+
+
+async def status(conn):
+    sizes = await partition_sizes(conn)
+    totals = {}
+    for row in sizes:
+        tier = row["name"].rsplit("_", 1)[-1]
+        print(f"{row['name']:32} rows~{max(row['rows'], 0):<10} table={row['table_bytes'] // 1024}kB index={row['index_bytes'] // 1024}kB")
+        total = totals.setdefault(tier, [0, 0])
+        total[0] += row["table_bytes"]
+        total[1] += row["index_bytes"]
+    for tier, (table_bytes, index_bytes) in sorted(totals.items()):
+        print(f"{tier:>5} total: table={table_bytes // 1024}kB index={index_bytes // 1024}kB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "partitions", "archive", "maintain", "status"])
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--hot-days", type=int, default=PARTITION_HOT_DAYS)
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    parser.add_argument("--from-month", help="YYYY-MM; also create partitions back to this month")
+    parser.add_argument("--batch-size", type=int, default=PARTITION_ARCHIVE_BATCH_SIZE)
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    if not args.database_url:
+        raise SystemExit("DATABASE_URL is not set")
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        if args.command == "upgrade":
+            await upgrade(conn, args.hot_days)
+        elif args.command == "partitions":
+            first = month_start(datetime.datetime.strptime(args.from_month, "%Y-%m").date()) if args.from_month else None
+            created = await ensure_partitions(conn, first=first, months_ahead=args.months_ahead)
+            print(f"Created partitions: {', '.join(created) or 'none needed'}")
+        elif args.command == "archive":
+            print(f"Moved to cold tiers: {await archive(conn, args.hot_days, args.batch_size)}")
+        elif args.command == "maintain":
+            await maintain(conn, args.hot_days, args.batch_size)
+        else:
+            await status(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,7 +3,7 @@ import React, { useState, useEffect } from 'react';
 // LiveMonitor Component
 // LiveMonitor Component
 function LiveMonitor({ transaction, onClose, token }) {
-  const [imageUrl, setImageUrl] = useState(`http://localhost:8000/static/live_feed.png`);
+  const [imageUrl, setImageUrl] = useState(null);
   const [pin, setPin] = useState("");
   const [status, setStatus] = useState(transaction.status);
 
@@ -25,9 +25,10 @@ function LiveMonitor({ transaction, onClose, token }) {
                 const data = await res.json();
                 setStatus(data.status);
                 
-                // Refresh Image with timestamp to bypass cache
-                // We use the transaction ID to ensure unique feed if supported, or fallback to generic
-                setImageUrl(`http://localhost:8000/static/live_feed.png?t=${Date.now()}`);
+                // Each payment session has its own feed; timestamp bypasses the cache
+                if (data.live_feed) {
+                    setImageUrl(`http://localhost:8000${data.live_feed}?t=${Date.now()}`);
+                }
                 
                 if (data.status === 'PAID') {
                     setTimeout(onClose, 3000); // Close after 3s success
@@ -88,7 +89,7 @@ function LiveMonitor({ transaction, onClose, token }) {
 
             {/* Live Feed Area */}
             <div className="relative aspect-video bg-black flex items-center justify-center">
-                <img src={imageUrl} className="w-full h-full object-contain" alt="Agent View" />
+                {imageUrl && <img src={imageUrl} className="w-full h-full object-contain" alt="Agent View" />}
                 
                 {/* PIN Overlay */}
                 {status === 'WAITING_FOR_PIN' && (
@@ -617,10 +618,11 @@ function TransactionQueue({ transactions, onApprove, onUpdate, loading }) {
                                 <td className="p-4">
                                     <button 
                                         onClick={() => onApprove(tx.id)}
-                                        disabled={(isReview && !tx.account_number) || tx.status === 'QUEUED_FOR_PAYMENT' || tx.status === 'WAITING_FOR_PIN'}
+                                        disabled={(isReview && !tx.account_number) || tx.status === 'EXTRACTED' || tx.status === 'QUEUED_FOR_PAYMENT' || tx.status === 'WAITING_FOR_PIN'}
                                         className="px-4 py-2 bg-black text-white rounded-lg text-sm font-bold hover:bg-gray-800 transition-colors shadow-sm disabled:opacity-50 disabled:cursor-not-allowed"
                                     >
-                                        {tx.status === 'QUEUED_FOR_PAYMENT' ? 'Processing...' : 
+                                        {tx.status === 'EXTRACTED' ? 'Extracting...' :
+                                         tx.status === 'QUEUED_FOR_PAYMENT' ? 'Processing...' : 
                                          tx.status === 'WAITING_FOR_PIN' ? 'Enter PIN' : 
                                          'Approve & Pay'}
                                     </button>
@@ -0,0 +1,55 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.asset_cache import AssetCache, AssetRouter
+
+
+class FakeRoute:
+    def __init__(self, url, resource_type, body=b"body"):
+        self.request = SimpleNamespace(url=url, resource_type=resource_type, method="GET")
+        self.body = body
+        self.outcome = None
+
+    async def abort(self, reason):
+        self.outcome = ("abort", reason)
+
+    async def continue_(self):
+        self.outcome = ("continue",)
+
+    async def fetch(self):
+        async def body():
+            return self.body
+        return SimpleNamespace(ok=True, status=200, headers={"content-type": "text/javascript", "set-cookie": "x"}, body=body)
+
+    async def fulfill(self, response=None, status=None, headers=None, body=None):
+        self.outcome = ("fulfill", response is not None, status, headers, body)
+
+
+def test_cache_round_trip_keeps_only_replayable_headers(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    cache.put("http://bank/app.js", 200, {"Content-Type": "text/javascript", "Set-Cookie": "s=1"}, b"js")
+
+    assert cache.get("http://bank/app.js") == (200, {"Content-Type": "text/javascript"}, b"js")
+    assert cache.get("http://bank/other.js") is None
+    assert AssetCache(str(tmp_path), ttl_seconds=-1).get("http://bank/app.js") is None
+
+
+def test_router_blocks_caches_and_passes_through(tmp_path):
+    router = AssetRouter(AssetCache(str(tmp_path)))
+
+    def run(url, resource_type):
+        route = FakeRoute(url, resource_type)
+        asyncio.run(router.handle(route))
+        return route.outcome
+
+    assert run("http://bank/logo.png", "image")[0] == "abort"
+    assert run("https://www.google-analytics.com/analytics.js", "script")[0] == "abort"
+    assert run("http://bank/", "document") == ("continue",)
+    assert run("http://bank/tailwind.js", "script")[:2] == ("fulfill", True)
+    assert run("http://bank/tailwind.js", "script") == ("fulfill", False, 200, {"content-type": "text/javascript"}, b"body")
+    assert router.stats == {"hits": 1, "misses": 1, "blocked": 2, "passed": 1}
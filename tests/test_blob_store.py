@@ -0,0 +1,93 @@
+import os
+import sys
+import types
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.blob_store import LocalBlobStore, S3BlobStore, blob_key, is_blob_key
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def hincrby(self, name, key, amount=1):
+        h = self.hashes.setdefault(name, {})
+        h[key] = h.get(key, 0) + amount
+        return h[key]
+
+    def hdel(self, name, key):
+        self.hashes.get(name, {}).pop(key, None)
+
+
+def make_store(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    fake = FakeRedis()
+    store._redis = lambda: fake
+    return store
+
+
+def test_keys_are_content_hashes_keeping_a_safe_extension():
+    key = blob_key(b"%PDF-1.4", "Invoice March.PDF")
+    assert key.endswith(".pdf") and is_blob_key(key)
+    assert blob_key(b"%PDF-1.4", "weird.p/df") == key[:64]
+    assert not is_blob_key("invoices/abc_invoice.pdf")
+
+
+def test_resent_uploads_share_one_sharded_blob(tmp_path):
+    store = make_store(tmp_path)
+    first = store.put(b"%PDF-1.4 invoice", "a.pdf")
+    second = store.put(b"%PDF-1.4 invoice", "b.pdf")
+
+    assert first == second
+    assert store.path(first) == os.path.join(str(tmp_path), first[:2], first[2:4], first)
+    assert store.get(first) == b"%PDF-1.4 invoice"
+    with store.local_path(first) as path:
+        assert open(path, "rb").read() == b"%PDF-1.4 invoice"
+
+
+def test_blob_is_deleted_only_when_the_last_reference_is_released(tmp_path):
+    store = make_store(tmp_path)
+    key = store.put(b"invoice", "x.pdf")
+    store.put(b"invoice", "x.pdf")
+
+    assert store.release(key) is False
+    assert os.path.exists(store.path(key))
+    assert store.release(key) is True
+    assert not os.path.exists(store.path(key))
+
+
+class FakeS3:
+    exceptions = types.SimpleNamespace(ClientError=KeyError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def download_file(self, bucket, key, path):
+        with open(path, "wb") as f:
+            f.write(self.objects[key])
+
+
+def test_s3_release_also_drops_the_local_cache(tmp_path, monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setitem(sys.modules, "boto3", types.SimpleNamespace(client=lambda *args, **kwargs: s3))
+    store = S3BlobStore(cache_dir=str(tmp_path))
+    store._redis = make_store(tmp_path)._redis
+
+    key = store.put(b"invoice", "x.pdf")
+    with store.local_path(key) as path:
+        assert open(path, "rb").read() == b"invoice"
+
+    assert store.release(key) is True
+    assert not s3.objects
+    assert not os.path.exists(path)
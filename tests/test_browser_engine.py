@@ -0,0 +1,53 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("playwright")
+
+from core.browser_engine import BrowserAgent, step_stats
+
+
+class FakePage:
+    async def fill(self, selector, text, timeout=None):
+        pass
+
+    async def click(self, selector, timeout=None):
+        raise TimeoutError("Timeout 5000ms exceeded.\\n=== logs ===")
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        pass
+
+    async def screenshot(self, path):
+        pass
+
+
+def test_every_step_records_a_span():
+    agent = BrowserAgent(label="tx1")
+    agent.page = FakePage()
+
+    asyncio.run(agent.execute_step({"action": "fill", "selector": "#amount", "text": "5", "wait_for": {"selector": "#pinModal"}}))
+    with pytest.raises(TimeoutError):
+        asyncio.run(agent.execute_step({"action": "click", "selector": "#confirmBtn"}, attempt=1))
+
+    filled, clicked = agent.spans
+    assert filled["action"] == "fill" and filled["selector"] == "#amount" and filled["ok"]
+    assert "screenshot_ms" in filled and agent.wait_log[0]["action"] == "fill"
+    assert clicked["attempt"] == 1 and not clicked["ok"]
+    assert clicked["error"].startswith("Timeout 5000ms exceeded.")
+    assert "screenshot_ms" not in clicked
+
+
+def test_step_stats_averages_per_action():
+    class FakeRedis:
+        def hgetall(self, key):
+            return {b"fill:count": b"4", b"fill:duration_ms_total": b"100", b"fill:screenshot_ms_total": b"40", b"click:count": b"1",
+                    b"click:duration_ms_total": b"900", b"click:slow": b"1"}
+
+    stats = step_stats(FakeRedis())
+    assert stats["fill"] == {"count": 4, "failed": 0, "slow": 0, "mean_duration_ms": 25.0, "mean_screenshot_ms": 10.0}
+    assert stats["click"]["slow"] == 1 and stats["click"]["mean_duration_ms"] == 900.0
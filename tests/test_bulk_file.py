@@ -0,0 +1,35 @@
+import os
+import sys
+import csv
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.bulk_file import parse_results, render_bulk_file
+
+
+def test_renders_one_line_per_transfer_with_mode_by_amount(tmp_path):
+    transactions = [
+        {"id": 7, "vendor": "Sharma, Sons\nLtd", "account_number": "123456789012", "ifsc_code": "sbin0001234", "amount": "5000", "remarks": "Inv 12"},
+        {"id": 8, "vendor": "Big Supplier", "account_number": "987654321", "ifsc_code": "HDFC0000001", "amount": 250000.5, "remarks": None},
+    ]
+    path = render_bulk_file("mock_bank", transactions, str(tmp_path))
+
+    with open(path, newline="") as f:
+        header, first, second = list(csv.reader(f))
+    assert header[0] == "Ref" and len(header) == 7
+    assert first == ["TX7", "Sharma Sons Ltd", "123456789012", "SBIN0001234", "5000.00", "NEFT", "Inv 12"]
+    assert second[4:6] == ["250000.50", "RTGS"]
+
+
+def test_parses_portal_results_by_reference():
+    rows = [
+        ["TX7", "123456789012", "5000.00", "SUCCESS", "TTBN123", ""],
+        ["TX8", "987654321", "250000.50", "REJECTED", "", "Invalid IFSC"],
+        ["OTHER", "1", "1", "SUCCESS", "", ""],
+    ]
+    results = parse_results(rows)
+
+    assert set(results) == {7, 8}
+    assert results[7].status == "SUCCESS" and results[7].utr == "TTBN123"
+    assert results[8].reason == "Invalid IFSC"
@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("asyncpg")
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from core.db_pool import InstrumentedPool, PoolTimeout
+
+
+class FakePool:
+    """One connection; acquire waits for it like asyncpg does."""
+
+    def __init__(self):
+        self.free = asyncio.Semaphore(1)
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self.free.acquire(), timeout)
+        return "conn"
+
+    async def release(self, conn):
+        self.free.release()
+
+    def get_size(self):
+        return 1
+
+    def get_idle_size(self):
+        return self.free._value
+
+    def get_max_size(self):
+        return 1
+
+    async def close(self):
+        pass
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_waits_are_timed_and_exhaustion_raises_pool_timeout():
+    async def scenario():
+        pool = InstrumentedPool(FakePool(), name="test", timeout=0.05)
+        try:
+            async with pool.acquire() as conn:
+                assert conn == "conn"
+                assert pool.stats()["in_use"] == 1
+                with pytest.raises(PoolTimeout):
+                    async with pool.acquire():
+                        pass
+            assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "waiting": 0, "max": 1}
+        finally:
+            await pool.close()
+
+    waits = sample("payagent_db_pool_wait_seconds_count", pool="test")
+    timeouts = sample("payagent_db_pool_timeouts_total", pool="test")
+    asyncio.run(scenario())
+    assert sample("payagent_db_pool_wait_seconds_count", pool="test") == waits + 2
+    assert sample("payagent_db_pool_timeouts_total", pool="test") == timeouts + 1
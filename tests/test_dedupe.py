@@ -0,0 +1,98 @@
+import os
+import sys
+import asyncio
+from datetime import date
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("redis")
+
+from worker.dedupe import DuplicateDetector, fingerprints, DUPLICATE_WINDOW_DAYS
+from worker.normalize import normalize_batch
+
+ROW = {"vendor": "M/s. Acme Corp", "amount": "5k", "date": "27/10/2023",
+       "account_number": "123456789012", "ifsc_code": "HDFC0001234"}
+
+
+class FakeRedis:
+    """Bitmap commands over a dict; `saturated` answers every bit as set."""
+
+    def __init__(self, saturated=False):
+        self.bits = {}
+        self.saturated = saturated
+        self.queued = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def exists(self, key):
+        return int(self.saturated or bool(self.bits))
+
+    def getbit(self, key, offset):
+        self.queued.append(1 if self.saturated else self.bits.get(offset, 0))
+
+    def setbit(self, key, offset, value):
+        self.bits[offset] = value
+        self.queued.append(0)
+
+    def execute(self):
+        results, self.queued = self.queued, []
+        return results
+
+
+class FakeConn:
+    """Answers the exact lookup from the fingerprints stored so far."""
+
+    def __init__(self):
+        self.stored = set()
+        self.lookups = []
+
+    async def fetch(self, query, *args):
+        if "ANY($1" not in query:
+            return []
+        self.lookups.append(args[0])
+        return [{"fingerprint": fp} for fp in args[0] if fp in self.stored]
+
+
+def detector_with(r):
+    detector = DuplicateDetector()
+    detector._redis = lambda: r
+    return detector
+
+
+def test_fingerprint_ignores_vendor_noise_and_covers_neighbouring_buckets():
+    own, *neighbours = fingerprints("M/s. Acme Corp", "123456789012", "5000.00", date(2023, 10, 27))
+    assert own == fingerprints("ACME CORP", "123456789012", "5000.00", date(2023, 10, 27))[0]
+    assert own != fingerprints("Acme Corp", "123456789012", "5000.01", date(2023, 10, 27))[0]
+    # A repeat one window later lands in a neighbouring bucket of the original
+    later = date.fromordinal(date(2023, 10, 27).toordinal() + DUPLICATE_WINDOW_DAYS)
+    assert own in fingerprints("Acme Corp", "123456789012", "5000.00", later)
+
+
+def test_same_row_in_a_later_batch_is_flagged():
+    conn, detector = FakeConn(), detector_with(FakeRedis())
+
+    first = normalize_batch([ROW])
+    stored = asyncio.run(detector.flag(conn, first, "batch_1", "user"))
+    assert first.status == ["NEEDS_APPROVAL"]
+    assert conn.lookups == []  # empty filter: nothing goes to Postgres
+    conn.stored.update(stored)
+    detector.remember(stored)
+
+    second = normalize_batch([ROW, {**ROW, "amount": "6k"}])
+    asyncio.run(detector.flag(conn, second, "batch_2", "user"))
+    assert second.status == ["DUPLICATE_SUSPECTED", "NEEDS_APPROVAL"]
+    assert "duplicate" in second.errors[0]
+
+
+def test_bloom_false_positive_is_cleared_by_the_exact_lookup():
+    # Every bit set: the filter says "maybe" to everything, Postgres has none of it
+    conn, detector = FakeConn(), detector_with(FakeRedis(saturated=True))
+
+    columns = normalize_batch([ROW])
+    stored = asyncio.run(detector.flag(conn, columns, "batch_1", "user"))
+    assert len(conn.lookups) == 1 and stored[0] in conn.lookups[0]
+    assert columns.status == ["NEEDS_APPROVAL"]
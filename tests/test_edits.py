@@ -0,0 +1,126 @@
+import os
+import sys
+import uuid
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+from contextlib import asynccontextmanager
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("redis")
+
+from app import edits
+from app.edits import apply_updates, bulk_update_params
+from core.state_machine import EDITABLE_STATUSES
+from worker.dedupe import fingerprints
+
+OWNER, OTHER = "user-a", "user-b"
+
+
+def update(id, **fields):
+    values = dict(vendor=None, amount=None, account_number=None, ifsc_code=None, remarks=None)
+    return SimpleNamespace(id=id, **{**values, **fields})
+
+
+class FakeConn:
+    """Applies BULK_UPDATE_SQL's filter (id, owner, editable status) to in-memory rows."""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: row for row in rows}
+        self.executed = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetch(self, query, *args):
+        assert query == edits.BULK_UPDATE_SQL
+        ids, vendors, amounts, accounts, ifscs, remarks, user_id, statuses = args
+        updated = []
+        for i, row_id in enumerate(ids):
+            row = self.rows.get(row_id)
+            if row is None or row["user_id"] != user_id or row["status"] not in statuses:
+                continue
+            for field, values in (("vendor", vendors), ("amount", amounts), ("account_number", accounts),
+                                  ("ifsc_code", ifscs), ("remarks", remarks)):
+                if values[i] is not None:
+                    row[field] = values[i]
+            updated.append(dict(row))
+        return updated
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+
+class FakeDetector:
+    def __init__(self):
+        self.remembered = []
+
+    def remember(self, stored):
+        self.remembered.extend(stored)
+
+
+def row(id, user_id, status="NEEDS_REVIEW", **fields):
+    values = dict(vendor="Acme Corp", amount=Decimal("500.00"), account_number=None, ifsc_code=None,
+                  remarks=None, date=None, fingerprint=None)
+    return {"id": id, "user_id": user_id, "status": status, **values, **fields}
+
+
+def test_params_are_one_array_per_column_with_amounts_as_decimals():
+    params = bulk_update_params([update(1, amount=1500.5), update(2, account_number="123456789012")], OWNER)
+    assert params == [
+        [1, 2], [None, None], [Decimal("1500.5"), None], [None, "123456789012"], [None, None], [None, None],
+        OWNER, list(EDITABLE_STATUSES),
+    ]
+
+
+def test_only_the_users_editable_rows_come_back_with_fresh_fingerprints(monkeypatch):
+    detector = FakeDetector()
+    monkeypatch.setattr(edits, "duplicate_detector", detector)
+    conn = FakeConn([row(1, OWNER), row(2, OTHER), row(3, OWNER, status="PAID")])
+
+    rows = asyncio.run(apply_updates(conn, [
+        update(1, account_number="123456789012", amount=750),
+        update(2, account_number="999999999999"),
+        update(3, account_number="888888888888"),
+    ], OWNER))
+
+    assert [r["id"] for r in rows] == [1]
+    assert conn.rows[2]["account_number"] is None and conn.rows[3]["account_number"] is None
+    expected = fingerprints("Acme Corp", "123456789012", Decimal("750"), None)[0]
+    assert rows[0]["fingerprint"] == expected
+    (query, (ids, stored, user_id)), = conn.executed
+    assert ids == [1] and stored == [expected] and user_id == OWNER
+    assert detector.remembered == [expected]
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL (a database with db/init.sql) not set")
+def test_bulk_update_sql_leaves_other_users_rows_alone(monkeypatch):
+    asyncpg = pytest.importorskip("asyncpg")
+    monkeypatch.setattr(edits, "duplicate_detector", FakeDetector())
+
+    async def scenario():
+        conn = await asyncpg.connect(os.getenv("TEST_DATABASE_URL"))
+        owner, other = uuid.uuid4(), uuid.uuid4()
+        try:
+            for user in (owner, other):
+                await conn.execute("INSERT INTO users (id, email, password_hash) VALUES ($1, $2, 'x')", user, f"{user}@test")
+            ids = [await conn.fetchval("""
+                INSERT INTO transactions (user_id, batch_id, vendor, amount, status)
+                VALUES ($1, 'edits', 'Acme Corp', 500, 'NEEDS_REVIEW') RETURNING id
+            """, user) for user in (owner, other)]
+            rows = await apply_updates(conn, [update(i, account_number="123456789012") for i in ids], owner)
+            assert [r["id"] for r in rows] == ids[:1]
+            stored = await conn.fetch("SELECT id, account_number, fingerprint FROM transactions WHERE id = ANY($1::int[]) ORDER BY id", ids)
+            assert stored[0]["fingerprint"] == rows[0]["fingerprint"] is not None
+            assert stored[1]["account_number"] is None and stored[1]["fingerprint"] is None
+        finally:
+            await conn.execute("DELETE FROM transactions WHERE user_id = ANY($1::uuid[])", [owner, other])
+            await conn.execute("DELETE FROM users WHERE id = ANY($1::uuid[])", [owner, other])
+            await conn.close()
+
+    asyncio.run(scenario())
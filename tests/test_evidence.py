@@ -0,0 +1,53 @@
+import os
+import sys
+import asyncio
+import threading
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.evidence import EvidenceStore
+
+
+def test_identical_screenshots_are_stored_once_in_sharded_paths(tmp_path):
+    store = EvidenceStore(str(tmp_path))
+    first = store.put(b"\xff\xd8receipt")
+    second = store.put(b"\xff\xd8receipt")
+
+    assert first == second
+    path = store.path(first)
+    assert path == os.path.join(str(tmp_path), first[:2], first[2:4], f"{first}.jpg")
+    assert os.path.exists(path)
+    assert len(os.listdir(os.path.dirname(path))) == 1
+
+
+def test_delete_removes_original_and_thumbnails(tmp_path):
+    store = EvidenceStore(str(tmp_path))
+    sha256 = store.put(b"image")
+    open(store.path(sha256, "_w320"), "wb").close()
+
+    store.delete(sha256)
+    assert not os.listdir(os.path.dirname(store.path(sha256)))
+
+
+class FakeConn:
+    def __init__(self):
+        self.executed = []
+
+    async def execute(self, query, *args):
+        self.executed.append(args)
+
+
+def test_record_writes_the_file_off_the_event_loop(tmp_path):
+    store = EvidenceStore(str(tmp_path))
+    put, threads = store.put, []
+    store.put = lambda data: threads.append(threading.get_ident()) or put(data)
+    conn = FakeConn()
+
+    async def scenario():
+        return threading.get_ident(), await store.record(conn, [1, 2], b"receipt")
+
+    loop_thread, sha256 = asyncio.run(scenario())
+    assert threads and threads[0] != loop_thread
+    assert os.path.exists(store.path(sha256))
+    assert conn.executed == [([1, 2], sha256, "receipt", len(b"receipt"))]
@@ -0,0 +1,52 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.validation import score_extraction
+
+CLEAN_TX = {
+    "transactions": [
+        {"vendor": "Acme Corp", "amount": 500.0, "account_number": "123456789012", "ifsc_code": "HDFC0001234"},
+        {"vendor": "Bob Traders", "amount": "1,500", "account_number": "9876543210", "ifsc_code": "SBIN0004321"},
+    ],
+    "total": 2000,
+}
+
+
+def test_clean_extraction_scores_full_confidence():
+    score, reasons = score_extraction(CLEAN_TX)
+    assert score == 1.0
+    assert reasons == []
+
+
+def test_missing_account_and_bad_ifsc_lower_confidence():
+    messy = {"transactions": [{"vendor": "Messy Vendor", "amount": 200.0, "account_number": None, "ifsc_code": "IFSC003"}]}
+    score, reasons = score_extraction(messy)
+    assert score < 0.85
+    assert "account_format" in reasons and "ifsc_format" in reasons
+
+
+def test_total_mismatch_fails_amount_check():
+    wrong_total = dict(CLEAN_TX, total=2500)
+    score, reasons = score_extraction(wrong_total)
+    assert "amounts" in reasons
+    assert score < 0.85
+
+
+def test_empty_extraction_scores_zero():
+    assert score_extraction({"transactions": []}) == (0.0, ["no_transactions"])
+
+
+def test_amounts_with_currency_and_multipliers_match_the_total():
+    # Same parser normalize uses: "Rs. 500" is 500 (not 0.5) and "5k"/"1.5 lakh" keep their multiplier
+    result = {
+        "transactions": [
+            {"vendor": "Acme Corp", "amount": "Rs. 500", "account_number": "123456789012", "ifsc_code": "HDFC0001234"},
+            {"vendor": "Bob Traders", "amount": "5k", "account_number": "9876543210", "ifsc_code": "SBIN0004321"},
+            {"vendor": "Om Sai", "amount": "1.5 lakh", "account_number": "9876543211", "ifsc_code": "SBIN0004321"},
+        ],
+        "total": "₹1,55,500",
+    }
+    assert score_extraction(result) == (1.0, [])
@@ -0,0 +1,65 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("playwright")
+
+from core.flow_plan import FlowExecutor, PlanError, compile_plan, load_plan
+
+
+class FakeAgent:
+    def __init__(self, fail_times=0):
+        self.commands = []
+        self.fail_times = fail_times
+
+    async def execute_step(self, command, attempt=0):
+        self.commands.append(command)
+        if self.fail_times:
+            self.fail_times -= 1
+            raise TimeoutError("slow page")
+        return command["action"]
+
+
+def test_bundled_plan_compiles_with_resolved_selectors():
+    plan = load_plan("mock_bank")
+    login = plan.flows["login"]
+    assert login[1].command["selector"] == "#username"
+    assert login[3].command["wait_for"]["selector"] == "#transferForm"
+    assert plan.params("login") == {"bank_url", "bank_username", "bank_password"}
+
+
+def test_compiler_rejects_bad_plans():
+    with pytest.raises(PlanError, match="unknown selector"):
+        compile_plan({"flows": {"f": [{"action": "click", "selector": "@nope"}]}})
+    with pytest.raises(PlanError, match="needs text"):
+        compile_plan({"flows": {"f": [{"action": "fill", "selector": "#a"}]}})
+    with pytest.raises(PlanError, match="unknown wait condition"):
+        compile_plan({"flows": {"f": [{"action": "wait", "until": "forever"}]}})
+
+
+def test_adjacent_fills_run_as_one_step():
+    agent = FakeAgent()
+    asyncio.run(FlowExecutor(agent, load_plan("mock_bank")).run("transfer", {"account_number": "123456789", "amount": 500}))
+
+    fill = agent.commands[0]
+    assert fill["action"] == "fill_many"
+    assert fill["fields"] == [["#beneficiary_account", "123456789"], ["#amount", "500"]]
+    assert [c["action"] for c in agent.commands[1:]] == ["click", "wait"]
+
+
+def test_retry_policy_and_missing_parameters():
+    plan = compile_plan({
+        "defaults": {"retries": 1},
+        "flows": {"go": [{"action": "navigate", "url": "{url}"}]},
+    })
+    agent = FakeAgent(fail_times=1)
+    assert asyncio.run(FlowExecutor(agent, plan).run("go", {"url": "http://bank"})) == ["navigate"]
+    assert len(agent.commands) == 2
+
+    with pytest.raises(PlanError, match="missing parameters url"):
+        asyncio.run(FlowExecutor(FakeAgent(), plan).run("go"))
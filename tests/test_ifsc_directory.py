@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.ifsc_directory import IFSCDirectory
+from worker.normalize import normalize_batch, check_ifsc_directory
+
+CSV = """ifsc,bank,branch,city
+SBIN0004321,STATE BANK OF INDIA,PUNE CAMP,PUNE
+HDFC0001234,HDFC BANK,SHIVAJINAGAR,PUNE
+HDFC0001235,HDFC BANK,KOTHRUD,PUNE
+"""
+
+
+def make_directory(tmp_path):
+    csv_path = tmp_path / "ifsc.csv"
+    csv_path.write_text(CSV)
+    return IFSCDirectory(str(csv_path))
+
+
+def test_lookup_and_ocr_suggestions(tmp_path):
+    directory = make_directory(tmp_path)
+    assert len(directory) == 3
+    assert directory.lookup("hdfc0001234")["branch"] == "SHIVAJINAGAR"
+    assert directory.lookup("HDFC0009999") is None
+    assert directory.suggest("SB1N0004321") == ["SBIN0004321"]
+    assert directory.suggest("HDFC0001236") == ["HDFC0001234", "HDFC0001235"]
+
+
+def test_strict_mode_corrects_unique_misreads_and_reviews_the_rest(tmp_path):
+    directory = make_directory(tmp_path)
+    columns = normalize_batch([
+        {"vendor": "A", "amount": "100", "account_number": "1234567890", "ifsc_code": "SB1N0004321"},
+        {"vendor": "B", "amount": "100", "account_number": "1234567890", "ifsc_code": "HDFC0001236"},
+        {"vendor": "C", "amount": "100", "account_number": "1234567890", "ifsc_code": "HDFC0001234"},
+    ])
+    assert check_ifsc_directory(columns, directory, "strict") == 2
+    assert columns.ifsc_code == ["SBIN0004321", "HDFC0001236", "HDFC0001234"]
+    assert columns.status == ["NEEDS_APPROVAL", "NEEDS_REVIEW", "NEEDS_APPROVAL"]
+    assert "did you mean" in columns.remarks[1]
@@ -0,0 +1,52 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.lease import Lease, LeaseLost, RENEW_LUA
+
+
+def lua_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeRedis()
+
+
+def test_overlapping_leases_are_exclusive_and_tokens_grow():
+    r = lua_redis()
+    first = Lease(r, [1, 2], owner="a")
+    assert first.acquire()
+    # Shares transaction 2: must get nothing, not just transaction 3
+    assert not Lease(r, [2, 3], owner="b").acquire()
+    assert not r.exists("lease:tx:3")
+
+    first.release()
+    second = Lease(r, [2, 3], owner="b")
+    assert second.acquire()
+    assert second.token > first.token
+    # A stale holder can neither renew nor release the new holder's lease
+    assert not first.renew()
+    first.release()
+    assert r.exists("lease:tx:2")
+
+
+class ExpiredRedis:
+    def eval(self, script, numkeys, *args):
+        return 0 if script == RENEW_LUA else 1
+
+
+def test_failed_heartbeat_blocks_irreversible_steps():
+    lease = Lease(ExpiredRedis(), [7], ttl_ms=30, owner="a")
+    assert lease.acquire()
+
+    async def hold():
+        async with lease.held():
+            await asyncio.sleep(0.1)
+            lease.check()
+
+    with pytest.raises(LeaseLost):
+        asyncio.run(hold())
@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from core import metrics
+
+
+class FakeRedis:
+    def __init__(self, lists):
+        self.lists = lists
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_stages_are_labelled_with_the_running_task():
+    before = sample("payagent_stage_seconds_count", stage="login", task="execute_payment")
+    token = metrics.current_task.set("execute_payment")
+    try:
+        with metrics.stage("login"):
+            pass
+    finally:
+        metrics.current_task.reset(token)
+    assert sample("payagent_stage_seconds_count", stage="login", task="execute_payment") == before + 1
+
+
+def test_queue_depth_is_counted_per_task_type(monkeypatch):
+    def message(task):
+        return json.dumps({"headers": {"task": task}, "body": ""}).encode()
+
+    r = FakeRedis({"celery": [message("worker.tasks.process_invoice")] * 2 + [message("worker.tasks.execute_payment"), b"junk"]})
+    monkeypatch.setattr(metrics, "QUEUE_SCAN_LIMIT", 3)
+    [family] = metrics.QueueDepthCollector(r, ["celery"]).collect()
+    depth = {s.labels["task"]: s.value for s in family.samples}
+    assert depth == {"process_invoice": 2, "execute_payment": 1, "unscanned": 1}
@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from db import migrate
+
+# transactions as created before updated_at, fingerprint and payment_fence were added
+LEGACY_COLUMNS = ["id", "user_id", "batch_id", "vendor", "amount", "date", "account_number",
+                  "ifsc_code", "remarks", "status", "created_at"]
+COLUMNS = LEGACY_COLUMNS + ["fingerprint", "payment_fence", "updated_at", "tier"]
+
+
+class FakeConn:
+    """A database holding one plain transactions table; records every statement."""
+
+    def __init__(self):
+        self.calls = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.calls.append("BEGIN")
+        yield
+        self.calls.append("COMMIT")
+
+    async def fetch(self, query, *args):
+        if "FROM pg_class" in query:
+            return [{"relname": "transactions"}]
+        if "FROM pg_index" in query:
+            return [{"name": "idx_transactions_status"}]
+        if "information_schema.columns" in query:
+            names = LEGACY_COLUMNS if args[0] == "transactions_unpartitioned" else COLUMNS
+            return [{"column_name": name} for name in names]
+        raise AssertionError(query)
+
+    async def fetchval(self, query, *args):
+        self.calls.append((query.strip(), args))
+        if "min(created_at)" in query:
+            return datetime.datetime(2026, 1, 5, 12, 0)
+        return False
+
+    async def execute(self, query, *args):
+        self.calls.append((query.strip(), args))
+        return "INSERT 0 3" if query.strip().startswith("INSERT") else "OK"
+
+
+def statements(conn):
+    return [call if isinstance(call, str) else call[0] for call in conn.calls]
+
+
+def test_upgrade_partitions_a_table_from_before_updated_at():
+    conn = FakeConn()
+    asyncio.run(migrate.upgrade(conn, hot_days=90))
+    sql = statements(conn)
+
+    with open(migrate.INIT_SQL) as f:
+        init_sql = f.read().strip()
+    insert = next(query for query in sql if query.startswith("INSERT INTO transactions"))
+    assert sql.index("BEGIN") < sql.index("ALTER TABLE transactions RENAME TO transactions_unpartitioned") \
+        < sql.index("DROP INDEX idx_transactions_status") \
+        < sql.index("ALTER SEQUENCE transactions_id_seq OWNED BY NONE") \
+        < sql.index(init_sql) < sql.index(insert) \
+        < sql.index("DROP TABLE transactions_unpartitioned") < sql.index("COMMIT") \
+        < sql.index("VACUUM (ANALYZE) transactions")
+
+    # Only columns the old table has are read; updated_at stays NULL and the rule ages rows by created_at
+    columns, select = insert.split("SELECT", 1)
+    assert "fingerprint" not in insert and "payment_fence" not in insert
+    assert "updated_at" in columns and "updated_at" not in select
+    assert "NULL" in select
+    assert "CASE WHEN status IN ('PAID', 'FAILED') AND created_at < $1 THEN 'cold'" in select
+
+    # Partitions reach back to the oldest row before the copy
+    months = [call[1][1] for call in conn.calls[:sql.index(insert)] if call[0].startswith("SELECT ensure_month_partition($1")]
+    assert months[0] == datetime.date(2026, 1, 1)
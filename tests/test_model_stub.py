@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+from benchmarks import model_stub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(model_stub, "LATENCY_MS", 0)
+    monkeypatch.setattr(model_stub, "JITTER_MS", 0)
+    monkeypatch.setattr(model_stub, "recordings", [])
+    return TestClient(model_stub.app)
+
+
+def test_gemini_and_openai_shapes_answer_with_valid_transactions(client):
+    gemini = client.post("/v1beta/models/gemini-1.5-flash:generateContent", json={"contents": []}).json()
+    text = gemini["candidates"][0]["content"]["parts"][0]["text"]
+    assert gemini["candidates"][0]["finishReason"] == "STOP"
+    assert len(json.loads(text)["transactions"]) == model_stub.ROWS
+
+    chat = client.post("/v1/chat/completions", json={"model": "m", "messages": []}).json()
+    assert chat["choices"][0]["finish_reason"] == "stop"
+    assert json.loads(chat["choices"][0]["message"]["content"])["transactions"]
+
+
+def test_stream_reassembles_to_the_same_answer(client):
+    body = {"contents": [{"parts": [{"text": "invoice"}]}]}
+    whole = client.post("/v1beta/models/m:generateContent", json=body).json()
+    chunks = client.post("/v1beta/models/m:streamGenerateContent", json=body).json()
+    assert "".join(c["candidates"][0]["content"]["parts"][0]["text"] for c in chunks) == \
+        whole["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def test_truncation_cuts_the_answer_and_reports_it(client, monkeypatch):
+    monkeypatch.setattr(model_stub, "TRUNCATE_RATE", 1)
+    chat = client.post("/v1/chat/completions", json={"model": "m", "messages": []}).json()
+    assert chat["choices"][0]["finish_reason"] == "length"
+    with pytest.raises(ValueError):
+        json.loads(chat["choices"][0]["message"]["content"])
+
+
+def test_recorded_provider_error_is_replayed(client, monkeypatch):
+    recording = os.path.join(ROOT, "test_data", "debug_gemini_result.json")
+    monkeypatch.setattr(model_stub, "recordings", model_stub.load_replay(recording))
+    response = client.post("/v1beta/models/gemini-1.5-flash:generateContent", json={})
+    assert response.status_code == 404
+    assert response.json()["error"]["status"] == "NOT_FOUND"
+
+
+def test_rows_never_repeat_a_payment_across_requests():
+    # Duplicate fingerprints cover vendor, account and amount; none may recur between uploads
+    rows = [tx for seed in ("a", "b", "c") for tx in model_stub.transactions_for(seed, rows=50)]
+    assert len({(tx["vendor"], tx["account_number"], tx["amount"]) for tx in rows}) == len(rows)
+    assert model_stub.transactions_for("a", rows=3) == model_stub.transactions_for("a", rows=3)
@@ -0,0 +1,32 @@
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.normalize import normalize_batch, parse_amount
+
+
+def test_indian_amount_formats():
+    assert parse_amount("5k") == Decimal("5000.00")
+    assert parse_amount("₹1,20,000") == Decimal("120000.00")
+    assert parse_amount("1.5 lakh") == Decimal("150000.00")
+    assert parse_amount("Rs. 500/-") == Decimal("500.00")
+    assert parse_amount("five hundred") is None
+
+
+def test_batch_is_columnar_and_routes_bad_rows_to_review():
+    columns = normalize_batch([
+        {"vendor": "Acme Corp", "amount": "5k", "date": "27/10/2023", "account_number": "1234 5678 9012", "ifsc_code": "hdfcO001234"},
+        {"vendor": "Messy Vendor", "amount": 200.0, "date": "someday", "account_number": None, "ifsc_code": "IFSC003"},
+    ])
+    assert columns.vendor == ["Acme Corp", "Messy Vendor"]
+    assert columns.amount == [Decimal("5000.00"), Decimal("200.00")]
+    assert columns.date == [date(2023, 10, 27), None]
+    assert columns.account_number == ["123456789012", None]
+    assert columns.ifsc_code == ["HDFC0001234", "IFSC003"]
+    assert columns.status == ["NEEDS_APPROVAL", "NEEDS_REVIEW"]
+    assert set(columns.errors[1]) == {"date_invalid", "account_missing", "ifsc_invalid"}
+    assert columns.total() == Decimal("5200.00")
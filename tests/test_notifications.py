@@ -0,0 +1,106 @@
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.notifications import DigestCoalescer, StubTransport, batch_event, build_digest
+
+
+def test_single_batch_digest_matches_the_old_summary():
+    transactions = [{"vendor": f"Vendor {i}", "amount": 100 * i} for i in range(1, 8)]
+    body = build_digest([batch_event("batch-1", transactions, 2800)])
+
+    assert body.startswith("🧾 *Batch Processed*\n7 Transactions found. Total Value: ₹2800")
+    assert "- Vendor 5: ₹500" in body and "Vendor 6" not in body
+    assert "... and 2 more." in body
+
+
+def test_events_in_one_window_become_one_message():
+    events = [
+        batch_event("aaaaaaaa-1", [{"vendor": "A", "amount": 10}], "10.00"),
+        batch_event("bbbbbbbb-2", [{"vendor": "B", "amount": 5}, {"vendor": "C", "amount": 5}], "10.50"),
+    ]
+    transport = StubTransport()
+    transport.send("whatsapp:+910000000000", build_digest(events))
+
+    (to, body), = transport.sent
+    assert body.startswith("🧾 *2 Batches Processed*\n3 Transactions found. Total Value: ₹20.50")
+    assert "- bbbbbbbb: 2 transactions, ₹10.50" in body
+
+
+class FakeRedis:
+    """The list and key commands DigestCoalescer pipelines, answered in order."""
+
+    def __init__(self):
+        self.lists, self.keys, self.queued = {}, {}, []
+
+    def pipeline(self):
+        return self
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        self.queued.append(len(self.lists[key]))
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            self.queued.append(None)
+        else:
+            self.keys[key] = value
+            self.queued.append(True)
+
+    def lrange(self, key, start, end):
+        self.queued.append(list(self.lists.get(key, [])))
+
+    def delete(self, key):
+        self.queued.append(int(self.lists.pop(key, None) is not None or self.keys.pop(key, None) is not None))
+
+    def execute(self):
+        results, self.queued = self.queued, []
+        return results
+
+
+def test_coalescer_opens_one_window_and_drain_closes_it():
+    r = FakeRedis()
+    coalescer = DigestCoalescer(window_seconds=60)
+    coalescer._redis = lambda: r
+    first, second = batch_event("a", [], "1"), batch_event("b", [], "2")
+
+    # Only the first event in a window schedules the flush
+    assert coalescer.add("alice", first) is True
+    assert coalescer.add("alice", second) is False
+    assert coalescer.add("bob", first) is True
+
+    assert coalescer.drain("alice") == [first, second]
+    assert coalescer.drain("alice") == []
+    # The flush closed alice's window; bob's is still open
+    assert coalescer.add("alice", second) is True
+    assert coalescer.add("bob", second) is False
+
+
+class FlakyTransport(StubTransport):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def send(self, to: str, body: str):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("twilio down")
+        return super().send(to, body)
+
+
+def test_failed_digest_is_retried_with_its_body(monkeypatch):
+    for module in ("celery", "asyncpg", "google.generativeai", "openai"):
+        pytest.importorskip(module)
+    from worker import tasks
+
+    transport = FlakyTransport(failures=1)
+    monkeypatch.setattr(tasks, "get_transport", lambda: transport)
+    monkeypatch.setattr(tasks, "NOTIFY_RETRY_BASE_SECONDS", 0)
+
+    # apply() runs eagerly, retries included
+    tasks.send_notification_digest.apply(args=("whatsapp:+910000000000", "digest body"))
+    assert transport.sent == [("whatsapp:+910000000000", "digest body")]
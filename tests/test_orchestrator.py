@@ -0,0 +1,85 @@
+import os
+import sys
+import asyncio
+import threading
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.orchestrator import ExtractionOrchestrator, GeminiProvider
+
+
+class Provider:
+    def __init__(self, name, result, readable=True):
+        self.name = name
+        self.result = result
+        self.readable = readable
+        self.calls = 0
+
+    def supports(self, file_path):
+        return self.readable
+
+    async def extract(self, file_path):
+        self.calls += 1
+        return self.result
+
+
+class FakeRedis:
+    def __init__(self):
+        self.counts = {}
+
+    def pipeline(self):
+        return self
+
+    def hincrby(self, key, field, amount):
+        self.counts[field] = self.counts.get(field, 0) + amount
+
+    def execute(self):
+        pass
+
+
+def test_secondary_is_not_hedged_for_files_it_cannot_read():
+    primary = Provider("gemini", {"transactions": []})
+    secondary = Provider("openrouter", {"transactions": [{"vendor": "Acme"}]}, readable=False)
+    orchestrator = ExtractionOrchestrator(primary, secondary)
+    orchestrator.redis = FakeRedis()
+
+    result = asyncio.run(orchestrator.extract("invoice.xlsx"))
+    assert secondary.calls == 0
+    assert result["provider"] is None
+
+
+def test_failed_primary_falls_back_and_records_the_win():
+    primary = Provider("gemini", {"transactions": []})
+    secondary = Provider("openrouter", {"transactions": [{"vendor": "Acme"}]})
+    orchestrator = ExtractionOrchestrator(primary, secondary)
+    orchestrator.redis = FakeRedis()
+
+    result = asyncio.run(orchestrator.extract("invoice.pdf"))
+    assert result["provider"] == "openrouter"
+    assert orchestrator.redis.counts == {"openrouter": 1, "hedged": 1}
+
+
+class SlowProcessor:
+    """Streams forever until told the caller gave up."""
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def extract_invoice_data(self, file_path, on_transaction=None, cancelled=None):
+        while not cancelled.wait(0.01):
+            pass
+        self.stopped.set()
+        return {"transactions": []}
+
+
+def test_hedge_winner_stops_the_losing_gemini_thread():
+    processor = SlowProcessor()
+    secondary = Provider("openrouter", {"transactions": [{"vendor": "Acme"}]})
+    orchestrator = ExtractionOrchestrator(GeminiProvider(processor), secondary)
+    orchestrator.redis = FakeRedis()
+    orchestrator.hedge_deadline = lambda: 0.01
+
+    result = asyncio.run(orchestrator.extract("invoice.pdf"))
+    assert result["provider"] == "openrouter"
+    assert processor.stopped.wait(1)
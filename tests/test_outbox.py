@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("redis")
+
+from app import outbox
+from app.outbox import OutboxDispatcher, message_id, was_delivered, mark_delivered
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+class FakeCelery:
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.sent = []
+
+    def send_task(self, name, args, kwargs, task_id):
+        if task_id in self.fail_ids:
+            raise ConnectionError("broker down")
+        self.sent.append((name, args, kwargs, task_id))
+
+
+def test_dispatch_marks_published_rows_and_keeps_failures_pending():
+    rows = [
+        {"id": 1, "task_name": "worker.tasks.execute_payment", "payload": json.dumps({"id": 10})},
+        {"id": 2, "task_name": "worker.tasks.execute_payment", "payload": json.dumps({"id": 11})},
+    ]
+    conn = FakeConn(rows)
+    celery = FakeCelery(fail_ids={message_id(2)})
+
+    sent = asyncio.run(OutboxDispatcher(FakePool(conn), celery).dispatch_once())
+
+    assert sent == 1
+    assert celery.sent == [("worker.tasks.execute_payment", [{"id": 10}], {"message_id": "outbox-1"}, "outbox-1")]
+    (mark_sent, (sent_ids,)), (mark_failed, (failed_ids, errors)) = conn.executed
+    assert "sent_at = NOW()" in mark_sent and sent_ids == [1]
+    assert "last_error" in mark_failed and failed_ids == [2] and errors == ["broker down"]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.keys = {}
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+    def set(self, key, value, ex=None):
+        self.keys[key] = value
+
+
+def test_delivery_is_only_remembered_once_the_task_finishes(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(outbox.redis.Redis, "from_url", lambda url: r)
+
+    # A worker that dies before mark_delivered leaves the redelivery free to run
+    assert not was_delivered("outbox-1")
+    assert not was_delivered("outbox-1")
+    mark_delivered("outbox-1")
+    assert was_delivered("outbox-1")
+    assert not was_delivered("outbox-2")
@@ -0,0 +1,94 @@
+import os
+import sys
+import asyncio
+import datetime
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.partitions import (
+    add_months, months_between, month_start, partition_name, cold_rule, ensure_partitions, archive,
+    COLD_RULES, PARTITIONED_TABLES,
+)
+from core.state_machine import TRANSITIONS, PAID, FAILED
+
+
+def test_months_roll_over_year_ends():
+    assert add_months(datetime.date(2026, 11, 1), 3) == datetime.date(2027, 2, 1)
+    assert add_months(datetime.date(2026, 1, 1), -1) == datetime.date(2025, 12, 1)
+    assert months_between(datetime.date(2026, 11, 17), datetime.date(2027, 1, 1)) == [
+        datetime.date(2026, 11, 1), datetime.date(2026, 12, 1), datetime.date(2027, 1, 1),
+    ]
+
+
+def test_partition_names_match_init_sql():
+    # ensure_month_partition in db/init.sql names them parent_YYYYMM[_hot|_cold]
+    assert partition_name("transactions", datetime.date(2026, 3, 1)) == "transactions_202603"
+    assert partition_name("audits", datetime.date(2026, 3, 1), "cold") == "audits_202603_cold"
+
+
+def test_only_terminal_transactions_go_cold():
+    assert set(COLD_RULES) == set(PARTITIONED_TABLES)
+    # Anything that can still change status must stay in the hot tier's dashboard index
+    assert "'PAID', 'FAILED'" in COLD_RULES["transactions"]
+    assert TRANSITIONS[PAID] == set() and TRANSITIONS[FAILED] == {"QUEUED_FOR_PAYMENT"}
+
+
+def test_rules_fall_back_to_created_at_without_updated_at():
+    assert "COALESCE(updated_at, created_at) < $1" in COLD_RULES["transactions"]
+    legacy = cold_rule("transactions", ["id", "status", "created_at"])
+    assert "updated_at" not in legacy and "created_at < $1" in legacy
+    assert cold_rule("audits") == "created_at < $1"
+
+
+class FakeConn:
+    """Records every statement; `fetch` and `fetchval` answer from per-table scripts."""
+
+    def __init__(self, batches=None, created=()):
+        self.batches = batches or {}
+        self.created = set(created)
+        self.calls = []
+
+    async def fetch(self, query, *args):
+        self.calls.append(("fetch", query, args))
+        table = next(t for t in PARTITIONED_TABLES if f"UPDATE {t} " in query)
+        batches = self.batches.get(table, [])
+        return batches.pop(0) if batches else []
+
+    async def fetchval(self, query, *args):
+        self.calls.append(("fetchval", query, args))
+        return (args[0], args[1]) in self.created
+
+    async def execute(self, query, *args):
+        self.calls.append(("execute", query, args))
+
+
+def test_ensure_partitions_creates_each_month_and_reports_new_ones():
+    this_month = month_start(datetime.date.today())
+    last_month, next_month = add_months(this_month, -1), add_months(this_month, 1)
+    conn = FakeConn(created={("transactions", last_month), ("audits", next_month)})
+
+    created = asyncio.run(ensure_partitions(conn, first=last_month, months_ahead=1))
+
+    asked = [args[:2] for _, query, args in conn.calls if "ensure_month_partition" in query]
+    assert asked == [(table, month) for month in (last_month, this_month, next_month) for table in PARTITIONED_TABLES]
+    assert created == [partition_name("transactions", last_month), partition_name("audits", next_month)]
+
+
+def test_archive_moves_batches_until_a_short_one_then_vacuums_touched_months():
+    jan, feb = datetime.datetime(2026, 1, 9), datetime.datetime(2026, 2, 3)
+    conn = FakeConn(batches={"transactions": [[{"created_at": jan}] * 2, [{"created_at": feb}]]})
+
+    moved = asyncio.run(archive(conn, hot_days=90, batch_size=2))
+
+    assert moved == {"transactions": 3, "audits": 0}
+    updates = [(query, args) for kind, query, args in conn.calls if kind == "fetch"]
+    assert len(updates) == 3  # two for transactions (the second is short), one for audits
+    query, (cutoff, batch_size) = updates[0]
+    assert COLD_RULES["transactions"] in query and "FOR UPDATE SKIP LOCKED" in query
+    assert "tableoid <> 'transactions_default'::regclass" in query
+    assert batch_size == 2 and cutoff < datetime.datetime.now() - datetime.timedelta(days=89)
+    assert [query for kind, query, _ in conn.calls if kind == "execute"] == [
+        "VACUUM (ANALYZE) transactions_202601_hot", "VACUUM (FREEZE, ANALYZE) transactions_202601_cold",
+        "VACUUM (ANALYZE) transactions_202602_hot", "VACUUM (FREEZE, ANALYZE) transactions_202602_cold",
+    ]
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.state_machine import (
+    TRANSITIONS, IllegalTransition, check_transition,
+    EXTRACTED, NEEDS_APPROVAL, QUEUED_FOR_PAYMENT, WAITING_FOR_PIN, PAID, FAILED,
+)
+
+
+def test_payment_lifecycle_is_legal():
+    check_transition([EXTRACTED], NEEDS_APPROVAL)
+    check_transition([NEEDS_APPROVAL], QUEUED_FOR_PAYMENT)
+    check_transition([QUEUED_FOR_PAYMENT], WAITING_FOR_PIN)
+    check_transition([QUEUED_FOR_PAYMENT, WAITING_FOR_PIN], [PAID, FAILED])
+
+
+def test_paid_is_terminal_and_previews_cannot_be_paid():
+    assert TRANSITIONS[PAID] == set()
+    with pytest.raises(IllegalTransition):
+        check_transition([PAID], QUEUED_FOR_PAYMENT)
+    with pytest.raises(IllegalTransition):
+        check_transition([EXTRACTED], QUEUED_FOR_PAYMENT)
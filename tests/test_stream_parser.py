@@ -0,0 +1,47 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.stream_parser import TransactionStreamParser
+
+RESPONSE = (
+    '```json\n{"transactions": ['
+    '{"vendor": "Acme \\"Corp\\" {}", "amount": 500, "items": [{"qty": 1}]},'
+    '{"vendor": "Bob Traders", "amount": "1,500", "account_number": null}'
+    '], "total": 2000}\n```'
+)
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return completed
+
+
+def test_objects_are_emitted_as_they_close():
+    for size in (1, 5, len(RESPONSE)):
+        parser = TransactionStreamParser()
+        completed = feed_in_chunks(parser, RESPONSE, size)
+        assert [tx["vendor"] for tx in completed] == ['Acme "Corp" {}', "Bob Traders"]
+        assert parser.finish()["total"] == 2000
+
+
+def test_truncated_response_salvages_completed_rows():
+    parser = TransactionStreamParser()
+    cut = RESPONSE.index("Bob Traders")
+    parser.feed(RESPONSE[:cut])
+    result = parser.finish()
+    assert result["truncated"] is True
+    assert [tx["vendor"] for tx in result["transactions"]] == ['Acme "Corp" {}']
+
+
+def test_top_level_array_and_single_object():
+    parser = TransactionStreamParser()
+    assert len(parser.feed('[{"vendor": "A", "amount": 1}, {"vendor": "B", "amount": 2}]')) == 2
+
+    parser = TransactionStreamParser()
+    assert parser.feed('{"vendor": "Solo", "amount": 3}') == []
+    assert parser.finish() == {"transactions": [{"vendor": "Solo", "amount": 3}]}
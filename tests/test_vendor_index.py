@@ -0,0 +1,36 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.normalize import normalize_batch
+from worker.vendor_index import VendorIndex
+
+
+def build_index():
+    index = VendorIndex()
+    index.add("Sharma & Sons Pvt. Ltd.", "123456789012", "HDFC0001234")
+    index.add("Patil Hardware", "987654321000", "SBIN0004321")
+    return index
+
+
+def test_exact_and_fuzzy_lookup():
+    index = build_index()
+    assert index.lookup("M/s Sharma and Sons")[:2] == ("123456789012", "HDFC0001234")
+    account, ifsc, similarity = index.lookup("Patil Hardwares")
+    assert account == "987654321000" and similarity >= index.threshold
+    assert index.lookup("Unknown Corp") is None
+
+
+def test_fill_missing_promotes_repeat_vendor_out_of_review():
+    columns = normalize_batch([
+        {"vendor": "Sharma Sons", "amount": "5k", "account_number": None},
+        {"vendor": "New Vendor", "amount": "100", "account_number": None},
+    ])
+    assert columns.status == ["NEEDS_REVIEW", "NEEDS_REVIEW"]
+
+    assert build_index().fill_missing(columns) == 1
+    assert columns.account_number == ["123456789012", None]
+    assert columns.ifsc_code[0] == "HDFC0001234"
+    assert columns.status == ["NEEDS_APPROVAL", "NEEDS_REVIEW"]
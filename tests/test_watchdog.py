@@ -0,0 +1,45 @@
+import os
+import sys
+import types
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+psutil = pytest.importorskip("psutil")
+
+from worker import watchdog
+
+
+class FakeRedis:
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [k for k in self.hashes if k.startswith(prefix)]
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+
+def test_recycle_check_counts_the_process_tree(monkeypatch):
+    pool = types.SimpleNamespace(mem_rss=lambda: 1)
+    monkeypatch.setitem(sys.modules, "billiard", types.SimpleNamespace(pool=pool))
+    monkeypatch.setitem(sys.modules, "billiard.pool", pool)
+    monkeypatch.setattr(watchdog, "WORKER_MAX_RSS_MB", 100000)
+
+    assert watchdog.install_recycle_check()
+    own, _, _ = watchdog.tree_rss(os.getpid())
+    assert pool.mem_rss() >= own // 1024 > 0
+
+
+def test_memory_stats_group_processes_by_node():
+    r = FakeRedis({
+        "worker:memory:node-a": {"101:rss_mb": "310.5", "101:browser_rss_mb": "820.0"},
+        "worker:memory:events": {"recycled": "3", "orphans_reaped": "2"},
+    })
+    stats = watchdog.worker_memory_stats(r)
+    assert stats["nodes"] == {"node-a": {"101": {"rss_mb": 310.5, "browser_rss_mb": 820.0}}}
+    assert (stats["recycled"], stats["orphans_reaped"]) == (3, 2)
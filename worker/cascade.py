@@ -0,0 +1,89 @@
+import os
+import time
+
+import redis
+
+from worker.validation import score_extraction
+from core.metrics import extraction_failure
+
+# Results scoring at or above this are accepted without escalation
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.85"))
+
+
+class ExtractionCascade:
+    """
+    Cheap-first extraction cascade.
+
+    Each stage is a (name, extractor) pair where the extractor exposes an async
+    `extract(file_path)`. Stages run in order; the first result scoring at or
+    above the confidence threshold is accepted, otherwise the document escalates
+    to the next stage. Per-stage attempts, accepts and latency are exported to
+    the Redis hash `extraction:cascade`.
+    """
+
+    def __init__(self, stages, threshold: float = CASCADE_CONFIDENCE_THRESHOLD):
+        self.stages = stages
+        self.threshold = threshold
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    def _record(self, stage: str, elapsed_ms: float, accepted: bool):
+        try:
+            r = redis.Redis.from_url(self.redis_url)
+            pipe = r.pipeline()
+            pipe.hincrby("extraction:cascade", f"{stage}:attempts", 1)
+            pipe.hincrbyfloat("extraction:cascade", f"{stage}:latency_ms_total", elapsed_ms)
+            if accepted:
+                pipe.hincrby("extraction:cascade", f"{stage}:accepted", 1)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to record cascade stats: {e}")
+
+    async def extract(self, file_path: str, on_transaction=None) -> dict:
+        """
+        on_transaction, if given, is streamed every row the first stage emits.
+        Rows from later stages arrive only in the returned result.
+        """
+        best, best_score = {"transactions": []}, -1.0
+
+        for index, (stage, extractor) in enumerate(self.stages):
+            start = time.perf_counter()
+            try:
+                if index == 0 and on_transaction:
+                    result = await extractor.extract(file_path, on_transaction=on_transaction)
+                else:
+                    result = await extractor.extract(file_path)
+            except Exception as e:
+                print(f"❌ Cascade stage {stage} failed: {e}")
+                extraction_failure(f"{stage}_stage_error")
+                result = {"transactions": []}
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            score, reasons = score_extraction(result)
+            is_last = index == len(self.stages) - 1
+            accepted = score >= self.threshold
+            self._record(stage, elapsed_ms, accepted)
+            print(f"🪜 Cascade stage {stage}: score={score} reasons={reasons} ({elapsed_ms:.0f}ms)")
+
+            # Keep the best answer seen so a weak escalation never makes things worse
+            if score > best_score:
+                best, best_score = {**result, "stage": stage, "confidence": score}, score
+
+            if accepted or is_last:
+                break
+
+        return best
+
+
+def cascade_stats(redis_url: str = None) -> dict:
+    """Reads the exported per-stage counters back as hit rates and mean latency."""
+    r = redis.Redis.from_url(redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    raw = r.hgetall("extraction:cascade")
+    stats = {}
+    for key, value in raw.items():
+        stage, field = key.rsplit(":", 1)
+        stats.setdefault(stage, {})[field] = float(value)
+    for stage, values in stats.items():
+        attempts = values.get("attempts", 0)
+        values["hit_rate"] = round(values.get("accepted", 0) / attempts, 3) if attempts else 0.0
+        values["mean_latency_ms"] = round(values.get("latency_ms_total", 0) / attempts, 1) if attempts else 0.0
+    return stats
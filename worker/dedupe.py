@@ -0,0 +1,135 @@
+import os
+import hashlib
+from datetime import date
+
+import redis
+
+from core.state_machine import DUPLICATE_SUSPECTED
+from worker.vendor_index import normalize_vendor
+
+# Same vendor/account/amount within this many days is treated as a repeat bill
+DUPLICATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_WINDOW_DAYS", "30"))
+BLOOM_KEY = "dedupe:bloom"
+BLOOM_BITS = int(os.getenv("DEDUPE_BLOOM_BITS", str(1 << 24)))  # 2 MiB bitmap
+BLOOM_HASHES = 7
+
+
+def fingerprints(vendor: str, account_number: str, amount, tx_date: date = None) -> list:
+    """
+    Fingerprints for a payment: the first is the row's own (stored with it),
+    the rest cover the neighbouring date buckets so a repeat that straddles a
+    bucket boundary is still found.
+    """
+    bucket = (tx_date or date.today()).toordinal() // DUPLICATE_WINDOW_DAYS
+    base = f"{normalize_vendor(vendor)}|{account_number}|{amount}"
+    return [
+        hashlib.sha256(f"{base}|{b}".encode()).hexdigest()
+        for b in (bucket, bucket - 1, bucket + 1)
+    ]
+
+
+def bloom_offsets(fingerprint: str) -> list:
+    # Double hashing over the sha256 digest gives k independent-enough positions
+    h1 = int(fingerprint[:16], 16)
+    h2 = int(fingerprint[16:32], 16) | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+class DuplicateDetector:
+    """
+    Flags payments that repeat an earlier batch.
+
+    A Redis bitmap Bloom filter screens every fingerprint in one pipelined
+    round-trip; only the probable hits go to Postgres for an exact lookup on
+    the indexed `fingerprint` column. Rows that match a live (not FAILED)
+    transaction from another batch are marked DUPLICATE_SUSPECTED.
+    """
+
+    def __init__(self):
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.seeded = False
+
+    def _redis(self):
+        return redis.Redis.from_url(self.redis_url)
+
+    def compute(self, columns) -> list:
+        """Per-row list of fingerprints, or None for rows without an account."""
+        return [
+            fingerprints(columns.vendor[i], columns.account_number[i], columns.amount[i], columns.date[i])
+            if columns.account_number[i] else None
+            for i in range(len(columns))
+        ]
+
+    def _maybe_seen(self, candidates: list) -> set:
+        """Bloom pre-filter; returns the fingerprints that might exist."""
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for fp in candidates:
+                for offset in bloom_offsets(fp):
+                    pipe.getbit(BLOOM_KEY, offset)
+            bits = pipe.execute()
+        except Exception as e:
+            # Without the filter every candidate goes to the exact lookup
+            print(f"Dedupe bloom filter unavailable: {e}")
+            return set(candidates)
+
+        maybe = set()
+        for i, fp in enumerate(candidates):
+            if all(bits[i * BLOOM_HASHES:(i + 1) * BLOOM_HASHES]):
+                maybe.add(fp)
+        return maybe
+
+    async def ensure_seeded(self, conn):
+        """Rebuilds the filter from Postgres if Redis lost it (or never had it)."""
+        if self.seeded:
+            return
+        try:
+            if not self._redis().exists(BLOOM_KEY):
+                rows = await conn.fetch("SELECT fingerprint FROM transactions WHERE fingerprint IS NOT NULL")
+                self.remember([row["fingerprint"] for row in rows])
+                print(f"Dedupe bloom filter seeded with {len(rows)} fingerprints")
+            self.seeded = True
+        except Exception as e:
+            print(f"Failed to seed dedupe bloom filter: {e}")
+
+    async def flag(self, conn, columns, batch_id: str, user_id: str) -> list:
+        """
+        Marks suspected duplicates in place and returns each row's own
+        fingerprint for storage.
+        """
+        await self.ensure_seeded(conn)
+        per_row = self.compute(columns)
+        candidates = sorted({fp for fps in per_row if fps for fp in fps})
+        if not candidates:
+            return [None] * len(columns)
+
+        maybe = self._maybe_seen(candidates)
+        existing = set()
+        if maybe:
+            rows = await conn.fetch("""
+                SELECT DISTINCT fingerprint FROM transactions
+                WHERE fingerprint = ANY($1::varchar[]) AND user_id = $2 AND batch_id <> $3
+                  AND status NOT IN ('FAILED', 'DUPLICATE_SUSPECTED')
+            """, list(maybe), user_id, batch_id)
+            existing = {row["fingerprint"] for row in rows}
+
+        for i, fps in enumerate(per_row):
+            if fps and existing.intersection(fps):
+                columns.status[i] = DUPLICATE_SUSPECTED
+                columns.errors[i].append("duplicate")
+
+        return [fps[0] if fps else None for fps in per_row]
+
+    def remember(self, stored: list):
+        """Adds freshly inserted fingerprints to the Bloom filter."""
+        stored = [fp for fp in stored if fp]
+        if not stored:
+            return
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for fp in stored:
+                for offset in bloom_offsets(fp):
+                    pipe.setbit(BLOOM_KEY, offset, 1)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to update dedupe bloom filter: {e}")
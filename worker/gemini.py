@@ -1,32 +1,55 @@
 import os
 import google.generativeai as genai
-import json
 import time
+import mimetypes
 from dotenv import load_dotenv
+from worker.stream_parser import TransactionStreamParser
+from worker.validation import is_transaction
+from core.metrics import stage
 
 load_dotenv()
 
+# Another Gemini-compatible server, e.g. benchmarks/model_stub.py ("http://model-stub:8500"); uses the REST transport
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+# files: upload through the Files API, then reference it; inline: send the bytes with the prompt.
+# The SDK fetches the Files API from Google's own discovery URL, so a custom endpoint implies inline.
+GEMINI_UPLOAD_MODE = os.getenv("GEMINI_UPLOAD_MODE", "inline" if GEMINI_API_ENDPOINT else "files")
+
 class GeminiProcessor:
-    def __init__(self):
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             print("❌ ERROR: GOOGLE_API_KEY is missing in .env!")
             return
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        options = {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_ENDPOINT}} if GEMINI_API_ENDPOINT else {}
+        genai.configure(api_key=api_key, **options)
+        self.model = genai.GenerativeModel(self.model_name)
 
-    def extract_invoice_data(self, file_path: str):
-        print(f"📂 Uploading {file_path} to Gemini...")
+    def extract_invoice_data(self, file_path: str, on_transaction=None, cancelled=None):
+        """
+        `cancelled` is a threading.Event set when the caller stops waiting (a
+        hedge lost); the upload wait and the stream stop at the next check so
+        the call doesn't keep spending quota.
+        """
+        print(f"📂 Uploading {file_path} to Gemini ({self.model_name})...")
         
         try:
             # Upload
-            sample_file = genai.upload_file(path=file_path, display_name="Invoice")
-            
-            # Wait for processing
-            while sample_file.state.name == "PROCESSING":
-                time.sleep(1)
-                sample_file = genai.get_file(sample_file.name)
+            with stage("model_upload"):
+                if GEMINI_UPLOAD_MODE == "inline":
+                    with open(file_path, "rb") as f:
+                        sample_file = {"mime_type": mimetypes.guess_type(file_path)[0] or "application/octet-stream", "data": f.read()}
+                else:
+                    sample_file = genai.upload_file(path=file_path, display_name="Invoice")
+
+                    # Wait for processing
+                    while sample_file.state.name == "PROCESSING":
+                        if cancelled and cancelled.is_set():
+                            return {"transactions": []}
+                        time.sleep(1)
+                        sample_file = genai.get_file(sample_file.name)
 
             # Robust Prompt for Handwritten/Printed Text
             prompt = """
@@ -35,26 +58,33 @@ class GeminiProcessor:
             Return a JSON object with a 'transactions' list.
             Each item MUST have: 'vendor' (or Name), 'amount', 'account_number', 'ifsc_code'.
             If 'account_number' is missing/illegible, set it to null.
+            If the document states a grand total, add it as a top-level 'total' field.
             Do NOT use markdown. Return raw JSON only.
             """
 
-            response = self.model.generate_content([sample_file, prompt])
-            raw_text = response.text.strip()
-
-            # CLEANUP: Remove ```json and ``` if present
-            if "```" in raw_text:
-                raw_text = raw_text.replace("```json", "").replace("```", "").strip()
+            # Stream the answer so completed rows can be persisted while the rest is generated
+            parser = TransactionStreamParser()
+            try:
+                # Includes incremental parsing; it runs while the next chunk is generated
+                with stage("model_inference"):
+                    response = self.model.generate_content([sample_file, prompt], stream=True)
+                    for chunk in response:
+                        if cancelled and cancelled.is_set():
+                            print(f"🛑 Gemini extraction of {file_path} cancelled; stopping the stream")
+                            return {"transactions": []}
+                        for tx in parser.feed(chunk.text):
+                            if on_transaction and is_transaction(tx):
+                                on_transaction(tx)
+            except Exception as e:
+                # Keep whatever completed before the stream broke off
+                print(f"⚠️ Gemini stream interrupted: {e}")
 
-            print(f"🤖 Gemini Raw Response: {raw_text[:500]}...", flush=True) # Debug print with flush
+            print(f"🤖 Gemini Raw Response: {parser.buffer[:500]}...", flush=True) # Debug print with flush
 
-            data = json.loads(raw_text)
-            
-            # Ensure list structure
-            if isinstance(data, list):
-                return {"transactions": data}
-            if "transactions" not in data:
-                return {"transactions": [data]}
-                
+            with stage("json_parse"):
+                data = parser.finish()
+            if data.get("truncated"):
+                print(f"⚠️ Truncated response, salvaged {len(data['transactions'])} transactions")
             return data
 
         except Exception as e:
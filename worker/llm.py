@@ -1,18 +1,28 @@
 import os
 import json
+import base64
+import mimetypes
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from core.metrics import stage
 
 load_dotenv()
 
+# Any OpenAI-compatible server, e.g. benchmarks/model_stub.py ("http://model-stub:8500/v1")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Read as plain text; anything else that isn't an image or a PDF can't be sent meaningfully
+TEXT_MIME_TYPES = ("text/", "application/json", "application/xml")
+
 class LLMWorker:
     def __init__(self):
         self.client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
+            base_url=OPENROUTER_BASE_URL,
             api_key=os.getenv("OPENROUTER_API_KEY"),
         )
+        self.model = os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3.1-70b-instruct")
+        self.vision_model = os.getenv("OPENROUTER_VISION_MODEL", "meta-llama/llama-3.2-90b-vision-instruct")
         self.system_prompt = (
-            "Analyze the document and extract ALL distinct transactions. Return a JSON Object containing a key 'transactions' which is an ARRAY of objects. Each object must have: {vendor, amount, date, account_number, ifsc_code, remarks}."
+            "Analyze the document and extract ALL distinct transactions. Return a JSON Object containing a key 'transactions' which is an ARRAY of objects. Each object must have: {vendor, amount, date, account_number, ifsc_code, remarks}. If the document states a grand total, add it as a top-level 'total' field."
         )
 
     async def get_action(self, user_instruction: str, context: str = "") -> dict:
@@ -26,19 +36,81 @@ class LLMWorker:
 
         try:
             response = await self.client.chat.completions.create(
-                model="meta-llama/llama-3.1-70b-instruct", # Running on Groq via OpenRouter
+                model=self.model, # Running on Groq via OpenRouter
                 messages=messages,
                 response_format={"type": "json_object"}
             )
             
-            content = response.choices[0].message.content
-            # Clean markdown if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            return json.loads(content.strip())
+            return self._parse_content(response.choices[0].message.content)
         except Exception as e:
             print(f"Error calling LLM: {e}")
             return {"error": str(e)}
+
+    @staticmethod
+    def supports(file_path: str) -> bool:
+        """Images, PDFs and text files; other binaries would only reach the model as garbage."""
+        mime_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return mime_type.startswith(("image/",) + TEXT_MIME_TYPES) or mime_type == "application/pdf"
+
+    async def extract_invoice_data(self, file_path: str) -> dict:
+        """
+        Extracts transactions from an uploaded file. Images and PDFs are sent inline
+        to the vision model, text files as text. Mirrors GeminiProcessor's return shape.
+        """
+        mime_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        if not self.supports(file_path):
+            raise ValueError(f"{mime_type} can't be sent to {self.vision_model}")
+
+        if mime_type.startswith("image/"):
+            with open(file_path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode()
+            model = self.vision_model
+            user_content = [
+                {"type": "text", "text": "Extract the transactions from this document."},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded}"}},
+            ]
+        elif mime_type == "application/pdf":
+            with open(file_path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode()
+            model = self.vision_model
+            user_content = [
+                {"type": "text", "text": "Extract the transactions from this document."},
+                {"type": "file", "file": {"filename": os.path.basename(file_path),
+                                          "file_data": f"data:application/pdf;base64,{encoded}"}},
+            ]
+        else:
+            with open(file_path, "r", errors="ignore") as f:
+                text = f.read()
+            model = self.model
+            user_content = f"Input: {text}"
+
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_content}
+        ]
+
+        with stage("model_inference"):
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+        with stage("json_parse"):
+            data = self._parse_content(response.choices[0].message.content)
+
+        # Ensure list structure
+        if isinstance(data, list):
+            return {"transactions": data}
+        if "transactions" not in data:
+            return {"transactions": [data]}
+        return data
+
+    @staticmethod
+    def _parse_content(content: str):
+        # Clean markdown if present
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0]
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0]
+
+        return json.loads(content.strip())
@@ -0,0 +1,154 @@
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from core.state_machine import NEEDS_APPROVAL, NEEDS_REVIEW
+from worker.validation import ACCOUNT_RE, IFSC_RE, parse_amount
+
+# Indian ledgers are written day-first; ISO dates are accepted as well
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y",
+    "%d %b %Y", "%d %B %Y", "%d-%b-%Y", "%d-%b-%y", "%b %d, %Y", "%B %d, %Y",
+)
+
+ACCOUNT_STRIP_RE = re.compile(r"[\s\-.]")
+
+
+class TransactionColumns(NamedTuple):
+    """Column-oriented, normalized batch ready for a single unnest() INSERT."""
+    vendor: List[str]
+    amount: List[Optional[Decimal]]
+    date: List[Optional[date]]
+    account_number: List[Optional[str]]
+    ifsc_code: List[Optional[str]]
+    remarks: List[Optional[str]]
+    status: List[str]
+    errors: List[List[str]]
+
+    def __len__(self):
+        return len(self.vendor)
+
+    def total(self) -> Decimal:
+        return sum((a for a in self.amount if a is not None), Decimal("0"))
+
+
+@lru_cache(maxsize=65536)
+def parse_date(raw: str) -> Optional[date]:
+    text = raw.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=65536)
+def normalize_account(raw: str) -> Optional[str]:
+    digits = ACCOUNT_STRIP_RE.sub("", raw)
+    return digits if ACCOUNT_RE.match(digits) else None
+
+
+@lru_cache(maxsize=65536)
+def normalize_ifsc(raw: str) -> Optional[str]:
+    code = raw.replace(" ", "").upper()
+    # The fifth character is always zero; OCR routinely reads it as the letter O
+    if len(code) == 11 and code[4] == "O":
+        code = code[:4] + "0" + code[5:]
+    return code if IFSC_RE.match(code) else None
+
+
+def review_status(row_errors: list) -> str:
+    # An unparseable date alone doesn't block payment
+    blocking = [e for e in row_errors if e != "date_invalid"]
+    return NEEDS_REVIEW if blocking else NEEDS_APPROVAL
+
+
+def _column(transactions, key):
+    return [tx.get(key) if isinstance(tx, dict) else None for tx in transactions]
+
+
+def _as_text(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def normalize_batch(transactions: list) -> TransactionColumns:
+    """
+    Normalizes a whole extraction batch column by column.
+
+    Each field is pulled out as one column and mapped through a cached parser,
+    so values that repeat across a ledger (amounts, dates, a vendor's account)
+    are parsed once per batch. Rows that fail a check keep their other fields
+    and are routed to NEEDS_REVIEW with the failures listed in `errors`.
+    """
+    raw_vendor = [_as_text(v) for v in _column(transactions, "vendor")]
+    raw_amount = [_as_text(v) for v in _column(transactions, "amount")]
+    raw_date = [_as_text(v) for v in _column(transactions, "date")]
+    raw_account = [_as_text(v) for v in _column(transactions, "account_number")]
+    raw_ifsc = [_as_text(v) for v in _column(transactions, "ifsc_code")]
+    remarks = [_as_text(v) for v in _column(transactions, "remarks")]
+
+    vendor = [v.strip() if v else "UNKNOWN" for v in raw_vendor]
+    amount = [parse_amount(v) if v else None for v in raw_amount]
+    dates = [parse_date(v) if v else None for v in raw_date]
+    account = [normalize_account(v) if v else None for v in raw_account]
+    ifsc = [normalize_ifsc(v) if v else None for v in raw_ifsc]
+
+    errors = []
+    status = []
+    for i in range(len(vendor)):
+        row_errors = []
+        if raw_vendor[i] is None:
+            row_errors.append("vendor_missing")
+        if amount[i] is None or amount[i] <= 0:
+            row_errors.append("amount_invalid")
+        if raw_date[i] is not None and dates[i] is None:
+            row_errors.append("date_invalid")
+        if account[i] is None:
+            row_errors.append("account_missing" if raw_account[i] is None else "account_invalid")
+        if raw_ifsc[i] is not None and ifsc[i] is None:
+            row_errors.append("ifsc_invalid")
+        errors.append(row_errors)
+        status.append(review_status(row_errors))
+
+    # Keep the raw IFSC so a reviewer can see what was read; a bad account is
+    # left empty so the dashboard prompts for it
+    ifsc = [c if c is not None else raw_ifsc[i] for i, c in enumerate(ifsc)]
+    amount = [a if a is not None else Decimal("0") for a in amount]
+
+    return TransactionColumns(vendor, amount, dates, account, ifsc, remarks, status, errors)
+
+
+def check_ifsc_directory(columns, directory, mode: str) -> int:
+    """
+    Checks the IFSC column of a normalized batch against the offline directory.
+
+    Advisory mode notes unknown codes in remarks. Strict mode also replaces a
+    code with its suggestion when exactly one exists, and otherwise sends the
+    row to review. Returns how many rows were annotated or corrected.
+    """
+    touched = 0
+    for i, code in enumerate(columns.ifsc_code):
+        if not code or code in directory:
+            continue
+        suggestions = directory.suggest(code)
+        if mode == "strict" and len(suggestions) == 1:
+            note = f"IFSC corrected from {code} to {suggestions[0]}"
+            columns.ifsc_code[i] = suggestions[0]
+            columns.errors[i] = [e for e in columns.errors[i] if e != "ifsc_invalid"]
+        else:
+            note = f"IFSC {code} not in directory"
+            if suggestions:
+                note += f" (did you mean {', '.join(suggestions)}?)"
+            if mode == "strict" and "ifsc_invalid" not in columns.errors[i]:
+                columns.errors[i].append("ifsc_unknown")
+        columns.status[i] = review_status(columns.errors[i])
+        columns.remarks[i] = f"{columns.remarks[i]} | {note}" if columns.remarks[i] else note
+        touched += 1
+    return touched
@@ -0,0 +1,126 @@
+import os
+import json
+
+import redis
+
+# Events for the same recipient within this window go out as one digest
+NOTIFY_DIGEST_WINDOW_SECONDS = int(os.getenv("NOTIFY_DIGEST_WINDOW_SECONDS", "30"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+NOTIFY_RETRY_BASE_SECONDS = int(os.getenv("NOTIFY_RETRY_BASE_SECONDS", "5"))
+# twilio, or stub to log messages instead of sending them
+NOTIFY_TRANSPORT = os.getenv("NOTIFY_TRANSPORT", "twilio")
+NOTIFICATIONS_QUEUE = "notifications"
+
+PENDING_KEY = "notify:pending:{}"
+WINDOW_KEY = "notify:window:{}"
+PREVIEW_LINES = 5
+
+
+def batch_event(batch_id: str, transactions: list, total) -> dict:
+    """The payload recorded when an extraction batch has been saved."""
+    return {
+        "batch_id": batch_id,
+        "count": len(transactions),
+        "total": str(total),
+        "lines": [[t.get("vendor"), str(t.get("amount"))] for t in transactions[:PREVIEW_LINES]],
+    }
+
+
+def build_digest(events: list) -> str:
+    """One message for every batch event collected in a window."""
+    if len(events) == 1:
+        event = events[0]
+        summary_text = "\n".join(f"- {vendor}: ₹{amount}" for vendor, amount in event["lines"])
+        if event["count"] > len(event["lines"]):
+            summary_text += f"\n... and {event['count'] - len(event['lines'])} more."
+        return (
+            f"🧾 *Batch Processed*\n"
+            f"{event['count']} Transactions found. Total Value: ₹{event['total']}\n\n"
+            f"{summary_text}\n\n"
+            f"Please log in to the dashboard to approve and pay."
+        )
+
+    count = sum(e["count"] for e in events)
+    total = sum(float(e["total"]) for e in events)
+    summary_text = "\n".join(f"- {e['batch_id'][:8]}: {e['count']} transactions, ₹{e['total']}" for e in events[:PREVIEW_LINES])
+    if len(events) > PREVIEW_LINES:
+        summary_text += f"\n... and {len(events) - PREVIEW_LINES} more batches."
+    return (
+        f"🧾 *{len(events)} Batches Processed*\n"
+        f"{count} Transactions found. Total Value: ₹{total:.2f}\n\n"
+        f"{summary_text}\n\n"
+        f"Please log in to the dashboard to approve and pay."
+    )
+
+
+class TwilioTransport:
+    """WhatsApp via Twilio. One client per process so its HTTP session is reused."""
+
+    def __init__(self):
+        from twilio.rest import Client
+        self.client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+        self.from_number = os.getenv("TWILIO_FROM_NUMBER")
+
+    def send(self, to: str, body: str):
+        message = self.client.messages.create(body=body, from_=self.from_number, to=to)
+        print(f"Twilio message sent! SID: {message.sid}, Status: {message.status}")
+        return message.sid
+
+
+class StubTransport:
+    """Records messages instead of sending them (local runs and tests)."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to: str, body: str):
+        self.sent.append((to, body))
+        print(f"[notify stub] to {to}:\n{body}")
+        return f"stub-{len(self.sent)}"
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        if NOTIFY_TRANSPORT == "twilio" and os.getenv("TWILIO_ACCOUNT_SID") and os.getenv("TWILIO_AUTH_TOKEN"):
+            _transport = TwilioTransport()
+        else:
+            _transport = StubTransport()
+    return _transport
+
+
+class DigestCoalescer:
+    """
+    Collects notification events per recipient in Redis.
+
+    `add` appends the event and opens the recipient's window if none is open;
+    only the call that opens it returns True, and that caller schedules the
+    flush. `drain` takes every pending event and closes the window in one
+    MULTI, so an event either lands in this digest or opens the next window.
+    """
+
+    def __init__(self, redis_url: str = None, window_seconds: int = NOTIFY_DIGEST_WINDOW_SECONDS):
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.window_seconds = window_seconds
+
+    def _redis(self):
+        return redis.Redis.from_url(self.redis_url)
+
+    def add(self, recipient: str, event: dict) -> bool:
+        pipe = self._redis().pipeline()
+        pipe.rpush(PENDING_KEY.format(recipient), json.dumps(event))
+        # The TTL outlives the window so a lost flush can't hold events forever
+        pipe.set(WINDOW_KEY.format(recipient), 1, nx=True, ex=self.window_seconds * 10)
+        _, opened = pipe.execute()
+        return bool(opened)
+
+    def drain(self, recipient: str) -> list:
+        pipe = self._redis().pipeline()
+        pipe.lrange(PENDING_KEY.format(recipient), 0, -1)
+        pipe.delete(PENDING_KEY.format(recipient))
+        pipe.delete(WINDOW_KEY.format(recipient))
+        raw, _, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+
+import redis
+
+# How many recent latencies per provider feed the p95 estimate
+LATENCY_WINDOW = int(os.getenv("EXTRACTION_LATENCY_WINDOW", "50"))
+# Used until a provider has enough history for a meaningful p95
+DEFAULT_HEDGE_MS = int(os.getenv("EXTRACTION_HEDGE_DEFAULT_MS", "8000"))
+# Hard latency SLO: the hedge never fires later than this
+EXTRACTION_SLO_MS = int(os.getenv("EXTRACTION_SLO_MS", "15000"))
+MIN_SAMPLES = 5
+
+
+def is_valid_result(result) -> bool:
+    """A result counts only if it carries at least one transaction object."""
+    if not isinstance(result, dict):
+        return False
+    transactions = result.get("transactions")
+    return isinstance(transactions, list) and any(isinstance(tx, dict) for tx in transactions)
+
+
+class GeminiProvider:
+    """Adapts the blocking GeminiProcessor to the async provider interface."""
+    name = "gemini"
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    async def extract(self, file_path: str, on_transaction=None) -> dict:
+        # Cancelling the await can't stop the thread, so tell the processor to stop at its next chunk
+        cancelled = threading.Event()
+        try:
+            return await asyncio.to_thread(self.processor.extract_invoice_data, file_path, on_transaction, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+
+class OpenRouterProvider:
+    """Adapts the async LLMWorker to the provider interface."""
+    name = "openrouter"
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def supports(self, file_path: str) -> bool:
+        return self.worker.supports(file_path)
+
+    async def extract(self, file_path: str) -> dict:
+        return await self.worker.extract_invoice_data(file_path)
+
+
+class ExtractionOrchestrator:
+    """
+    Runs extraction against a primary provider and hedges to a secondary one.
+
+    If the primary has not returned a valid result by its p95-based deadline
+    (capped by EXTRACTION_SLO_MS), the secondary is fired as well and the first
+    valid answer wins. The losing request is cancelled and the winner recorded;
+    a losing Gemini call runs in a thread, which stops at its next streamed
+    chunk rather than immediately.
+    """
+
+    def __init__(self, primary, secondary=None):
+        self.primary = primary
+        self.secondary = secondary
+        self.latencies = {}
+        self.wins = {}
+        self.redis = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+    def hedge_deadline(self) -> float:
+        """Seconds to wait on the primary before firing the hedge."""
+        samples = sorted(self.latencies.get(self.primary.name, ()))
+        if len(samples) < MIN_SAMPLES:
+            deadline_ms = DEFAULT_HEDGE_MS
+        else:
+            deadline_ms = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return min(deadline_ms, EXTRACTION_SLO_MS) / 1000
+
+    def _record_latency(self, provider, elapsed_ms: float):
+        window = self.latencies.setdefault(provider.name, deque(maxlen=LATENCY_WINDOW))
+        window.append(elapsed_ms)
+
+    def _record_win(self, provider_name: str, hedged: bool):
+        self.wins[provider_name] = self.wins.get(provider_name, 0) + 1
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby("extraction:winners", provider_name, 1)
+            if hedged:
+                pipe.hincrby("extraction:winners", "hedged", 1)
+            pipe.execute()
+        except Exception as e:
+            print(f"Failed to record extraction winner: {e}")
+
+    async def _timed(self, provider, file_path: str):
+        start = time.perf_counter()
+        try:
+            result = await provider.extract(file_path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ {provider.name} extraction error: {e}")
+            result = {"transactions": []}
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Only successful calls describe the provider's normal latency
+        if is_valid_result(result):
+            self._record_latency(provider, elapsed_ms)
+        return result
+
+    async def extract(self, file_path: str) -> dict:
+        """Returns the first valid extraction, tagged with the winning provider."""
+        tasks = {asyncio.create_task(self._timed(self.primary, file_path)): self.primary}
+        hedged = False
+
+        # A secondary that can't read this file type would only burn tokens on it
+        supports = getattr(self.secondary, "supports", None)
+        if self.secondary is not None and (supports is None or supports(file_path)):
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_deadline())
+            primary_task = next(iter(tasks))
+            # Hedge when the primary is slow, or fall back when it failed fast
+            if not done or not is_valid_result(primary_task.result()):
+                print(f"⏱️ Hedging extraction of {file_path} to {self.secondary.name}")
+                tasks[asyncio.create_task(self._timed(self.secondary, file_path))] = self.secondary
+                hedged = True
+
+        winner, result = None, {"transactions": []}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if is_valid_result(task.result()):
+                    winner, result = tasks[task], task.result()
+                    break
+            if winner:
+                break
+
+        for task in pending:
+            task.cancel()
+
+        if winner is None:
+            print(f"❌ No provider returned a valid extraction for {file_path}")
+            return {"transactions": [], "provider": None}
+
+        # Blocking Redis call; keep it off the event loop
+        await asyncio.to_thread(self._record_win, winner.name, hedged)
+        print(f"🏁 Extraction won by {winner.name} (hedged={hedged})")
+        return {**result, "provider": winner.name}
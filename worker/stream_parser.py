@@ -0,0 +1,109 @@
+import json
+
+
+class TransactionStreamParser:
+    """
+    Incremental parser for a streamed extraction response.
+
+    Feed it text chunks as the model produces them; every transaction object
+    that closes inside the transactions array (either a top-level array or the
+    value of a "transactions" key) is returned as soon as its closing brace
+    arrives. Markdown fences and other text outside the JSON are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.last_key = None
+        self.array_depth = None
+        self.object_start = None
+        self.transactions = []
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk and returns the transaction objects it completed."""
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+
+        for i in range(self.pos, len(buf)):
+            ch = buf[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = buf[self.string_start:i + 1]
+                continue
+
+            if ch == '"' and self.stack:
+                self.in_string = True
+                self.string_start = i
+            elif ch == ":" and self.stack and self.stack[-1] == "{":
+                self.last_key = self._decode_key(self.last_string)
+            elif ch == "[":
+                is_target = self.array_depth is None and (
+                    not self.stack or (len(self.stack) == 1 and self.last_key == "transactions")
+                )
+                self.stack.append("[")
+                if is_target:
+                    self.array_depth = len(self.stack)
+            elif ch == "{":
+                self.stack.append("{")
+                if self.array_depth is not None and len(self.stack) == self.array_depth + 1:
+                    self.object_start = i
+            elif ch in "]}" and self.stack:
+                self.stack.pop()
+                if ch == "}" and self.object_start is not None and len(self.stack) == self.array_depth:
+                    obj = self._decode_object(buf[self.object_start:i + 1])
+                    self.object_start = None
+                    if obj is not None:
+                        self.transactions.append(obj)
+                        completed.append(obj)
+
+        self.pos = len(buf)
+        return completed
+
+    def finish(self) -> dict:
+        """
+        Returns the final document. A complete response is parsed in full so
+        top-level fields such as 'total' survive; a truncated one falls back to
+        the transactions that were completed before the stream stopped.
+        """
+        raw_text = self.buffer.strip()
+        if "```" in raw_text:
+            raw_text = raw_text.replace("```json", "").replace("```", "").strip()
+
+        try:
+            data = json.loads(raw_text)
+        except ValueError:
+            return {"transactions": list(self.transactions), "truncated": bool(raw_text)}
+
+        # Ensure list structure
+        if isinstance(data, list):
+            return {"transactions": data}
+        if "transactions" not in data:
+            return {"transactions": [data]}
+        return data
+
+    @staticmethod
+    def _decode_key(raw):
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _decode_object(raw):
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return None
+        return obj if isinstance(obj, dict) else None
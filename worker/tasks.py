@@ -1,28 +1,261 @@
 import os
+import time
 import asyncio
 import asyncpg
 from celery import Celery
+from celery.signals import (
+    worker_init, worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown,
+    before_task_publish, task_prerun, task_postrun,
+)
 from worker.gemini import GeminiProcessor
+from worker.llm import LLMWorker
+from worker.orchestrator import ExtractionOrchestrator, GeminiProvider, OpenRouterProvider
+from worker.cascade import ExtractionCascade
+from worker.normalize import normalize_batch, check_ifsc_directory
+from core.ifsc_directory import get_directory, IFSC_DIRECTORY_MODE
+from core.state_machine import transition, check_transition, EXTRACTED, QUEUED_FOR_PAYMENT, WAITING_FOR_PIN, PAID, FAILED
+from worker.vendor_index import VendorIndex
+from worker.dedupe import DuplicateDetector
 from core.browser_engine import BrowserAgent
+from core.flow_plan import FlowExecutor, load_plan, BANK_FLOW
+from core.bulk_file import render_bulk_file, parse_results
+from core.evidence import EvidenceStore
+from core.blob_store import get_blob_store, is_blob_key, BLOB_RELEASE_AFTER_EXTRACT
+from app.outbox import was_delivered, mark_delivered
+from core.lease import Lease
+from core import partitions
+from worker.watchdog import Watchdog, install_recycle_check, WORKER_MAX_RSS_MB
+from core import metrics
+from core.metrics import stage, payment_outcome, extraction_failure
+from worker.notifications import (
+    DigestCoalescer, batch_event, build_digest, get_transport,
+    NOTIFICATIONS_QUEUE, NOTIFY_DIGEST_WINDOW_SECONDS, NOTIFY_MAX_RETRIES, NOTIFY_RETRY_BASE_SECONDS,
+)
 import json
-from twilio.rest import Client
 import redis
 
 # Configure Celery
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 celery_app = Celery("worker", broker=redis_url, backend=redis_url)
+# Notifications have their own consumer so a slow Twilio never holds an extraction slot
+celery_app.conf.task_routes = {
+    "worker.tasks.send_notification_digest": {"queue": NOTIFICATIONS_QUEUE},
+    "worker.tasks.prune_evidence": {"queue": NOTIFICATIONS_QUEUE},
+    "worker.tasks.maintain_partitions": {"queue": NOTIFICATIONS_QUEUE},
+}
+# Run by the notifier's embedded beat (celery worker -B)
+celery_app.conf.beat_schedule = {
+    "prune-evidence": {"task": "worker.tasks.prune_evidence", "schedule": 24 * 3600},
+    "maintain-partitions": {"task": "worker.tasks.maintain_partitions", "schedule": 24 * 3600},
+}
+
+# Checked by each pool process after every task; install_recycle_check adds its browsers to the count
+if WORKER_MAX_RSS_MB > 0:
+    celery_app.conf.worker_max_memory_per_child = WORKER_MAX_RSS_MB * 1024
+memory_watchdog = Watchdog()
+
+@worker_process_init.connect
+def _install_recycle_check(**kwargs):
+    if WORKER_MAX_RSS_MB > 0 and not install_recycle_check():
+        print("Watchdog: browser memory not counted; recycling on the pool process's own memory")
+
+@worker_ready.connect
+def _start_watchdog(**kwargs):
+    memory_watchdog.start()
+
+@worker_init.connect
+def _clear_metrics(**kwargs):
+    metrics.clear_multiprocess_dir()
+
+@worker_ready.connect
+def _start_metrics_exporter(**kwargs):
+    try:
+        metrics.start_worker_exporter()
+    except OSError as e:
+        print(f"Metrics exporter not started: {e}")
+
+@worker_process_shutdown.connect
+def _retire_process_metrics(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+
+# Queue wait = publish (API, outbox dispatcher, or another task) to task start
+@before_task_publish.connect
+def _stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+_task_context = {}
+
+@task_prerun.connect
+def _enter_task(task_id=None, task=None, **kwargs):
+    name = metrics.task_label(task.name)
+    _task_context[task_id] = metrics.current_task.set(name)
+    published_at = getattr(task.request, "published_at", None)
+    if published_at:
+        metrics.observe("queue_wait", max(0.0, time.time() - float(published_at)), name)
+
+@task_postrun.connect
+def _exit_task(task_id=None, **kwargs):
+    token = _task_context.pop(task_id, None)
+    if token is not None:
+        metrics.current_task.reset(token)
+
+@worker_shutdown.connect
+def _stop_watchdog(**kwargs):
+    memory_watchdog.stop()
 
 gemini_processor = GeminiProcessor()
 
+# Gemini answers first; OpenRouter is hedged in when Gemini misses its deadline
+secondary_provider = OpenRouterProvider(LLMWorker()) if os.getenv("OPENROUTER_API_KEY") else None
+extraction_orchestrator = ExtractionOrchestrator(GeminiProvider(gemini_processor), secondary_provider)
+
+# A small model handles clean documents; low-confidence results escalate to the hedged pair
+fast_processor = GeminiProcessor(os.getenv("GEMINI_FAST_MODEL", "gemini-1.5-flash-8b"))
+extraction_cascade = ExtractionCascade([
+    ("fast", GeminiProvider(fast_processor)),
+    ("full", extraction_orchestrator),
+])
+
+evidence_store = EvidenceStore()
+
+# Fills bank details for repeat vendors from the vendor master and past payments
+vendor_index = VendorIndex()
+duplicate_detector = DuplicateDetector()
+
+def bank_login_params() -> dict:
+    return {
+        "bank_url": os.getenv("MOCK_BANK_URL", "http://mock-bank"),
+        "bank_username": os.getenv("BANK_USERNAME", "admin"),
+        "bank_password": os.getenv("BANK_PASSWORD", "password"),
+    }
+
+def payment_lease(transaction_ids: list) -> Lease:
+    """Lease that must be held before any browser work on these transactions."""
+    return Lease(redis.Redis.from_url(redis_url), transaction_ids)
+
+def transfer_params(tx: dict) -> dict:
+    return {"account_number": tx.get("account_number") or "0000000000", "amount": tx.get("amount", "0")}
+
+async def save_trace(transaction_ids: list, browser_agent):
+    """Attaches the browser session's step spans (and any slow-step traces) to its transactions."""
+    if not browser_agent.spans:
+        return
+    slowest = max(browser_agent.spans, key=lambda span: span["duration_ms"])
+    print(f"Browser session {browser_agent.label}: {len(browser_agent.spans)} steps, "
+          f"{sum(span['duration_ms'] for span in browser_agent.spans):.0f}ms, slowest {slowest['action']} {slowest['duration_ms']}ms")
+    try:
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        await conn.execute("""
+            INSERT INTO payment_traces (transaction_id, spans, trace_files)
+            SELECT id, $2::jsonb, $3::text[] FROM unnest($1::int[]) AS id
+        """, transaction_ids, json.dumps(browser_agent.spans), browser_agent.trace_files)
+        await conn.close()
+    except Exception as e:
+        print(f"Failed to save payment trace: {e}")
+
+async def save_evidence(transaction_ids: list, image: bytes, kind: str = "receipt"):
+    """Stores a payment screenshot in the evidence store; never fails the payment."""
+    if not image:
+        return
+    try:
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        sha256 = await evidence_store.record(conn, transaction_ids, image, kind)
+        await conn.close()
+        print(f"Evidence {sha256[:12]} ({len(image)} bytes) saved for transactions {transaction_ids}")
+    except Exception as e:
+        print(f"Failed to save payment evidence: {e}")
+
+notification_coalescer = DigestCoalescer()
+
+def notify(event: dict):
+    """Queues a notification event; the first event of a window schedules the digest."""
+    recipient = os.getenv("TWILIO_TO_NUMBER")
+    if not recipient:
+        return
+    try:
+        if notification_coalescer.add(recipient, event):
+            send_notification_digest.apply_async((recipient,), countdown=NOTIFY_DIGEST_WINDOW_SECONDS)
+    except Exception as e:
+        print(f"Failed to queue notification: {e}")
+
+async def insert_columns(conn, batch_id: str, user_id: str, columns, status: str = None, fingerprints: list = None) -> list:
+    """
+    Inserts a normalized batch in one statement by unnesting its columns.
+    `status` overrides the per-row status (e.g. for streamed previews).
+    """
+    statuses = [status] * len(columns) if status else columns.status
+    rows = await conn.fetch("""
+        INSERT INTO transactions (batch_id, vendor, amount, date, account_number, ifsc_code, remarks, status, user_id, fingerprint)
+        SELECT $1, t.vendor, t.amount, t.date, t.account_number, t.ifsc_code, t.remarks, t.status, $9, t.fingerprint
+        FROM unnest($2::varchar[], $3::numeric[], $4::date[], $5::varchar[], $6::varchar[], $7::text[], $8::varchar[], $10::varchar[])
+            AS t(vendor, amount, date, account_number, ifsc_code, remarks, status, fingerprint)
+        RETURNING id
+    """,
+    batch_id,
+    columns.vendor,
+    columns.amount,
+    columns.date,
+    columns.account_number,
+    columns.ifsc_code,
+    columns.remarks,
+    statuses,
+    user_id,
+    fingerprints or [None] * len(columns)
+    )
+    return [row["id"] for row in rows]
+
 @celery_app.task(name="worker.tasks.process_invoice")
-def process_invoice(file_path: str, invoice_id: str, user_id: str):
-    print(f"Processing invoice {invoice_id} for user {user_id} at {file_path}")
+def process_invoice(blob_key: str, invoice_id: str, user_id: str):
+    """
+    Extracts and saves one uploaded invoice. `blob_key` names the upload in
+    the blob store; a plain path (from messages queued before the store
+    existed) is read directly.
+    """
+    print(f"Processing invoice {invoice_id} for user {user_id} from {blob_key}")
+    blob_store = get_blob_store() if is_blob_key(blob_key) else None
     
-    # 1. Extract Data using Gemini 2.0 Flash (Multimodal)
+    loop = asyncio.get_event_loop()
+    if loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    # Rows streamed by the first cascade stage are inserted as EXTRACTED previews
+    # so they show up on the dashboard while the model is still generating.
+    stream_lock = asyncio.Lock()
+    stream_state = {"conn": None, "rows": [], "futures": []}
+
+    async def insert_streamed(tx):
+        async with stream_lock:
+            try:
+                if stream_state["conn"] is None:
+                    stream_state["conn"] = await asyncpg.connect(os.getenv("DATABASE_URL"))
+                row_ids = await insert_columns(stream_state["conn"], invoice_id, user_id, normalize_batch([tx]), status=EXTRACTED)
+                stream_state["rows"].append((tx, row_ids[0]))
+            except Exception as e:
+                print(f"Streamed insert failed: {e}")
+
+    def on_transaction(tx):
+        # Called from the extraction thread; hop back onto this task's loop
+        stream_state["futures"].append(asyncio.run_coroutine_threadsafe(insert_streamed(tx), loop))
+
+    async def extract():
+        try:
+            if blob_store is None:
+                return await extraction_cascade.extract(blob_key, on_transaction=on_transaction)
+            # Providers read from disk; on S3 this fetches into the node's blob cache
+            with blob_store.local_path(blob_key) as file_path:
+                return await extraction_cascade.extract(file_path, on_transaction=on_transaction)
+        finally:
+            for future in stream_state["futures"]:
+                await asyncio.wrap_future(future)
+
+    # 1. Extract Data: fast model first, escalating to Gemini hedged to OpenRouter
     try:
-        validation_result = gemini_processor.extract_invoice_data(file_path)
+        validation_result = loop.run_until_complete(extract())
     except Exception as e:
         print(f"Extraction Failed: {e}")
+        extraction_failure("exception")
         validation_result = {"transactions": []}
 
     # 2. Insert into DB (Batch)
@@ -32,37 +265,84 @@ def process_invoice(file_path: str, invoice_id: str, user_id: str):
         # Fallback if single object returned
         transactions = [validation_result]
 
+    if not transactions:
+        extraction_failure("no_transactions")
+
+    # Parse amounts, dates, accounts and IFSC codes for the whole batch at once
+    columns = normalize_batch(transactions)
+    flagged = sum(1 for errors in columns.errors if errors)
+    if flagged:
+        print(f"Normalization flagged {flagged}/{len(columns)} rows for review")
+
     async def save_batch(batch_id, transactions, user_id):
         try:
+            if stream_state["conn"] is not None:
+                await stream_state["conn"].close()
+
             conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-            for tx in transactions:
-                # Determine Status
-                status = 'NEEDS_APPROVAL'
-                if not tx.get("account_number"):
-                    status = 'NEEDS_REVIEW'
-
-                await conn.execute("""
-                    INSERT INTO transactions (batch_id, vendor, amount, date, account_number, ifsc_code, remarks, status, user_id)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                """, 
-                batch_id,
-                tx.get("vendor"),
-                float(tx.get("amount", 0)),
-                None, # Date parsing omitted
-                tx.get("account_number"),
-                tx.get("ifsc_code"),
-                tx.get("remarks"),
-                status,
-                user_id
-                )
+
+            try:
+                await vendor_index.ensure_fresh(conn)
+                filled = vendor_index.fill_missing(columns)
+                if filled:
+                    print(f"Vendor index filled bank details for {filled} rows")
+            except Exception as e:
+                print(f"Vendor index lookup failed: {e}")
+
+            # Catch bad IFSC codes now rather than after a full browser session
+            ifsc_directory = get_directory()
+            if ifsc_directory:
+                checked = check_ifsc_directory(columns, ifsc_directory, IFSC_DIRECTORY_MODE)
+                if checked:
+                    print(f"IFSC directory flagged {checked} rows")
+
+            # Flag repeats of earlier uploads instead of letting them be paid twice
+            try:
+                fingerprints = await duplicate_detector.flag(conn, columns, batch_id, user_id)
+            except Exception as e:
+                print(f"Duplicate check failed: {e}")
+                fingerprints = [None] * len(columns)
+            duplicates = columns.status.count("DUPLICATE_SUSPECTED")
+            if duplicates:
+                print(f"⚠️ {duplicates} suspected duplicate payments in batch {batch_id}")
+
+            insert_started = time.perf_counter()
+            async with conn.transaction():
+                streamed = stream_state["rows"]
+                if streamed and [tx for tx, _ in streamed] == transactions:
+                    # The previews are the final answer: just settle their status
+                    # (per-row targets, so this bypasses transition() but keeps its guard and events)
+                    check_transition([EXTRACTED], set(columns.status))
+                    await conn.execute("""
+                        WITH settled AS (
+                            UPDATE transactions
+                            SET status = t.status, account_number = t.account_number, ifsc_code = t.ifsc_code,
+                                remarks = t.remarks, fingerprint = t.fingerprint, updated_at = NOW()
+                            FROM unnest($1::int[], $2::varchar[], $3::varchar[], $4::varchar[], $5::text[], $6::varchar[])
+                                AS t(id, status, account_number, ifsc_code, remarks, fingerprint)
+                            WHERE transactions.id = t.id AND transactions.status = $7
+                            RETURNING transactions.id, transactions.status
+                        )
+                        INSERT INTO transaction_events (transaction_id, from_status, to_status)
+                        SELECT id, $7, status FROM settled
+                    """, [row_id for _, row_id in streamed], columns.status, columns.account_number, columns.ifsc_code,
+                    columns.remarks, fingerprints, EXTRACTED)
+                else:
+                    # A later stage won (or nothing streamed): replace the previews
+                    if streamed:
+                        await conn.execute("DELETE FROM transactions WHERE batch_id = $1 AND status = $2", batch_id, EXTRACTED)
+                    if len(columns):
+                        await insert_columns(conn, batch_id, user_id, columns, fingerprints=fingerprints)
+            metrics.observe("db_insert", time.perf_counter() - insert_started)
             await conn.close()
+            duplicate_detector.remember(fingerprints)
             
             # Update Bank Portal State (Redis)
             try:
                 from app.bank_portal import save_invoice, load_invoice
                 inv = await load_invoice(batch_id)
                 inv.transactions = transactions
-                inv.amount = sum(float(tx.get("amount", 0)) for tx in transactions)
+                inv.amount = float(columns.total())
                 inv.state = "needs_approval"
                 await save_invoice(inv)
                 print(f"Portal state updated for {batch_id}")
@@ -71,123 +351,105 @@ def process_invoice(file_path: str, invoice_id: str, user_id: str):
                 
         except Exception as e:
             print(f"Batch Save Failed: {e}")
+            extraction_failure("db_error")
 
-    loop = asyncio.get_event_loop()
-    if loop.is_closed():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
     loop.run_until_complete(save_batch(batch_id, transactions, user_id))
+
+    if blob_store is not None and BLOB_RELEASE_AFTER_EXTRACT:
+        try:
+            blob_store.release(blob_key)
+        except Exception as e:
+            print(f"Blob release failed for {blob_key}: {e}")
     
     # 3. Save Batch ID to Redis
     r = redis.Redis.from_url(redis_url)
     r.set("latest_batch_id", batch_id)
     
-    # 4. Send WhatsApp Message (Summary)
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_number = os.getenv("TWILIO_FROM_NUMBER")
-    
-    if account_sid and auth_token:
-        try:
-            client = Client(account_sid, auth_token)
-            
-            total_value = sum(float(t.get("amount", 0)) for t in transactions)
-            summary_text = "\n".join([f"- {t.get('vendor')}: ₹{t.get('amount')}" for t in transactions[:5]])
-            if len(transactions) > 5:
-                summary_text += f"\n... and {len(transactions)-5} more."
-                
-            msg_body = (
-                f"🧾 *Batch Processed*\n"
-                f"{len(transactions)} Transactions found. Total Value: ₹{total_value}\n\n"
-                f"{summary_text}\n\n"
-                f"Please log in to the dashboard to approve and pay."
-            )
-            
-            to_number = os.getenv("TWILIO_TO_NUMBER")
-            
-            message = client.messages.create(body=msg_body, from_=from_number, to=to_number)
-            print(f"Twilio message sent! SID: {message.sid}, Status: {message.status}")
-        except Exception as e:
-            print(f"Twilio Failed: {e}")
-            # Log full error for debugging
-            import traceback
-            traceback.print_exc()
+    # 4. WhatsApp summary, coalesced with other batches finishing in the same window
+    notify(batch_event(batch_id, transactions, columns.total()))
 
 @celery_app.task(name="worker.tasks.execute_payment")
-def execute_payment(invoice_data: dict):
+def execute_payment(invoice_data: dict, message_id: str = None):
     """
     Executes the payment using BrowserAgent.
+    `message_id` is set when dispatched from the outbox, which may deliver twice.
     """
-    browser_agent = BrowserAgent()
+    if message_id and was_delivered(message_id):
+        print(f"Skipping duplicate delivery {message_id} for transaction {invoice_data.get('id')}")
+        return
+
+    lease = payment_lease([invoice_data.get("id")])
+    if not lease.acquire():
+        print(f"Transaction {invoice_data.get('id')} is being paid by another worker; skipping")
+        payment_outcome("skipped_leased")
+        return
+
+    browser_agent = BrowserAgent(label=f"tx{invoice_data.get('id')}", feed_ids=[invoice_data.get("id")])
     
     async def run_browser():
         await browser_agent.start()
+        flow = FlowExecutor(browser_agent, load_plan(BANK_FLOW))
         # Login
-        await browser_agent.execute_step({"action": "navigate", "url": os.getenv("MOCK_BANK_URL", "http://mock-bank")})
-        await browser_agent.execute_step({"action": "fill", "selector": "#username", "text": "admin"})
-        await browser_agent.execute_step({"action": "fill", "selector": "#password", "text": "password"})
-        await browser_agent.execute_step({"action": "click", "selector": "#loginBtn"})
-        
-        # Wait for dashboard to load (SPA transition)
-        await asyncio.sleep(1) # Wait for animation to start
-        await browser_agent.execute_step({"action": "wait", "selector": "#dashboardScreen", "state": "visible"})
-        
-        # Transfer - Step 1
-        await browser_agent.execute_step({"action": "fill", "selector": "#beneficiary_account", "text": invoice_data.get("account_number", "0000000000")})
-        # Beneficiary Name removed from UI
-        await browser_agent.execute_step({"action": "fill", "selector": "#amount", "text": str(invoice_data.get("amount", "0"))})
+        with stage("login"):
+            await flow.run("login", bank_login_params())
         
-        # Click Review (Initiate Transfer)
-        await browser_agent.execute_step({"action": "click", "selector": "#transferForm button[type='submit']"})
-        
-        # WAITING FOR PIN
-        # Wait for PIN modal to appear
-        try:
-            await browser_agent.execute_step({"action": "wait", "selector": "#pinModal", "state": "visible"})
-        except Exception as e:
-            print(f"PIN Modal did not appear: {e}")
+        # Transfer form up to the PIN modal
+        with stage("form_fill"):
+            await flow.run("transfer", transfer_params(invoice_data))
 
         # Update Status
         try:
             conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-            await conn.execute("UPDATE transactions SET status = 'WAITING_FOR_PIN' WHERE id = $1", invoice_data.get("id"))
+            moved = await transition(conn, WAITING_FOR_PIN, QUEUED_FOR_PAYMENT, ids=[invoice_data.get("id")], fence=lease.token)
             await conn.close()
+            if not moved:
+                # Already picked up under a newer lease, or no longer queued
+                print(f"Transaction {invoice_data.get('id')} is no longer {QUEUED_FOR_PAYMENT}; not paying it")
+                payment_outcome("skipped_not_queued")
+                await browser_agent.stop()
+                return
         except Exception as e:
             print(f"Failed to update status to WAITING_FOR_PIN: {e}")
 
         # Wait for PIN
         try:
-            pin = await browser_agent.wait_for_pin(str(invoice_data.get("id")))
-            
-            # Enter PIN
-            await browser_agent.execute_step({"action": "fill", "selector": "#transaction_pin", "text": pin})
-            await browser_agent.execute_step({"action": "click", "selector": "#confirmBtn"})
+            with stage("pin_wait"):
+                pin = await browser_agent.wait_for_pin(str(invoice_data.get("id")))
+            lease.check()
             
-            # Screenshot
-            await browser_agent.execute_step({"action": "screenshot", "path": f"payment_{invoice_data.get('vendor')}_{invoice_data.get('id', 'unknown')}.png"})
+            # Enter PIN, confirm and capture the receipt
+            with stage("confirm"):
+                *_, receipt = await flow.run("confirm", {"pin": pin})
+            await save_evidence([invoice_data.get("id")], receipt)
             
             # Update Status in DB
             conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-            await conn.execute("UPDATE transactions SET status = 'PAID' WHERE id = $1", invoice_data.get("id"))
+            await transition(conn, PAID, (QUEUED_FOR_PAYMENT, WAITING_FOR_PIN), ids=[invoice_data.get("id")], fence=lease.token)
             await conn.close()
+            payment_outcome("paid")
             
         except Exception as e:
             print(f"Payment Failed or Timed Out: {e}")
+            payment_outcome("failed")
             # Update status to FAILED
             try:
                 conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-                await conn.execute("UPDATE transactions SET status = 'FAILED' WHERE id = $1", invoice_data.get("id"))
+                await transition(conn, FAILED, (QUEUED_FOR_PAYMENT, WAITING_FOR_PIN), ids=[invoice_data.get("id")], fence=lease.token)
                 await conn.close()
             except:
                 pass
         
         await browser_agent.stop()
+        await save_trace([invoice_data.get("id")], browser_agent)
 
-    loop = asyncio.get_event_loop()
-    if loop.is_closed():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_browser())
+    async def run_leased():
+        async with lease.held():
+            await run_browser()
+
+    # A fresh loop per task: nothing is shared between concurrent payments in a worker pool
+    asyncio.run(run_leased())
+    if message_id:
+        mark_delivered(message_id)
 
 @celery_app.task(name="worker.tasks.execute_batch_payment")
 def execute_batch_payment(transactions: list):
@@ -197,32 +459,33 @@ def execute_batch_payment(transactions: list):
     if not transactions:
         return
 
-    browser_agent = BrowserAgent()
+    ids = [tx.get("id") for tx in transactions]
+    lease = payment_lease(ids)
+    if not lease.acquire():
+        print(f"Batch {ids} overlaps transactions another worker is paying; skipping")
+        payment_outcome("skipped_leased", len(ids))
+        return
+
+    browser_agent = BrowserAgent(label=f"batch_tx{transactions[0].get('id')}", feed_ids=ids)
     
     async def run_batch_browser():
         await browser_agent.start()
+        flow = FlowExecutor(browser_agent, load_plan(BANK_FLOW))
         
         # 1. Login (Once)
         print("Batch Agent: Logging in...")
-        await browser_agent.execute_step({"action": "navigate", "url": os.getenv("MOCK_BANK_URL", "http://mock-bank")})
-        await browser_agent.execute_step({"action": "fill", "selector": "#username", "text": "admin"})
-        await browser_agent.execute_step({"action": "fill", "selector": "#password", "text": "password"})
-        await browser_agent.execute_step({"action": "click", "selector": "#loginBtn"})
-        
-        # Wait for dashboard
-        await asyncio.sleep(1)
-        await browser_agent.execute_step({"action": "wait", "selector": "#dashboardScreen", "state": "visible"})
+        with stage("login"):
+            await flow.run("login", bank_login_params())
         
         # 2. Setup Representative Transaction for PIN
         # We use the first transaction to ask for the PIN.
         representative_tx = transactions[0]
         rep_id = str(representative_tx.get("id"))
         
-        # Update Status of ALL to WAITING_FOR_PIN
+        # Update Status of ALL to WAITING_FOR_PIN (one statement)
         try:
             conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-            for tx in transactions:
-                await conn.execute("UPDATE transactions SET status = 'WAITING_FOR_PIN' WHERE id = $1", tx.get("id"))
+            await transition(conn, WAITING_FOR_PIN, QUEUED_FOR_PAYMENT, ids=ids, fence=lease.token)
             await conn.close()
         except Exception as e:
             print(f"Batch: Failed to update status to WAITING_FOR_PIN: {e}")
@@ -230,74 +493,210 @@ def execute_batch_payment(transactions: list):
         # 3. Wait for PIN (Once)
         print(f"Batch: Waiting for PIN on representative transaction {rep_id}...")
         try:
-            # Fill First Transaction
+            # Fill First Transaction up to the PIN modal
             print(f"Batch: Filling representative transaction {rep_id}")
-            await browser_agent.execute_step({"action": "fill", "selector": "#beneficiary_account", "text": representative_tx.get("account_number", "0000000000")})
-            # Beneficiary Name removed from UI
-            await browser_agent.execute_step({"action": "fill", "selector": "#amount", "text": str(representative_tx.get("amount", "0"))})
-            
-            # Submit Form (Initiate Transfer)
-            # The button in HTML is type="submit" inside form, but has no ID?
-            # It has text "Initiate Transfer".
-            # Let's add an ID to the button in HTML or use text selector if supported?
-            # BrowserAgent supports selectors.
-            # The HTML button: <button type="submit" ...>Initiate Transfer</button>
-            # It's the only button of type submit in the form #transferForm.
-            # Let's use CSS selector: "#transferForm button[type='submit']"
-            await browser_agent.execute_step({"action": "click", "selector": "#transferForm button[type='submit']"})
-            
-            # Wait for PIN Modal
-            await browser_agent.execute_step({"action": "wait", "selector": "#pinModal", "state": "visible"})
+            with stage("form_fill"):
+                await flow.run("transfer", transfer_params(representative_tx))
             
             # NOW wait for user input
-            pin = await browser_agent.wait_for_pin(rep_id)
+            with stage("pin_wait"):
+                pin = await browser_agent.wait_for_pin(rep_id)
+            lease.check()
             
             # 4. Process Loop
             
             # --- Transaction 1: Full Verification (Already started above) ---
             # We assume the agent is at the PIN stage for the first transaction
-            await browser_agent.execute_step({"action": "fill", "selector": "#transaction_pin", "text": pin})
-            await browser_agent.execute_step({"action": "click", "selector": "#confirmBtn"})
-            
-            # Wait for Success Modal
-            await browser_agent.execute_step({"action": "wait", "selector": "#successModal", "state": "visible"})
-            await browser_agent.execute_step({"action": "screenshot", "path": f"payment_{representative_tx.get('vendor')}_{rep_id}.png"})
+            with stage("confirm"):
+                *_, receipt = await flow.run("confirm", {"pin": pin})
+            await save_evidence([representative_tx.get("id")], receipt)
             
             # Update First Status
             conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-            await conn.execute("UPDATE transactions SET status = 'PAID', updated_at = NOW() WHERE id = $1", representative_tx.get("id"))
+            await transition(conn, PAID, WAITING_FOR_PIN, ids=[representative_tx.get("id")], fence=lease.token)
             await conn.close()
             
             print(f"First transaction {rep_id} completed via Browser.")
+            payment_outcome("paid")
             
             # --- Remaining Transactions: Fast Track ---
             # User requested: "show only first payment on live agent and other directly done"
             if len(transactions) > 1:
                 print(f"Fast-tracking {len(transactions) - 1} remaining transactions...")
                 
+                # Direct DB Update, all remaining rows in one statement
                 conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
-                for tx in transactions[1:]:
-                    tx_id = tx.get("id")
-                    print(f"Fast-tracking transaction {tx_id}")
-                    
-                    # Simulate a tiny processing delay for realism (optional, can be removed for max speed)
-                    await asyncio.sleep(0.1)
-                    
-                    # Direct DB Update
-                    await conn.execute("UPDATE transactions SET status = 'PAID', updated_at = NOW() WHERE id = $1", tx_id)
-                
+                await transition(conn, PAID, WAITING_FOR_PIN, ids=ids[1:], fence=lease.token)
                 await conn.close()
+                payment_outcome("paid", len(ids) - 1)
                 print("All remaining transactions fast-tracked.")
 
         except Exception as e:
             print(f"Batch Payment Failed: {e}")
+            payment_outcome("error")
             import traceback
             traceback.print_exc()
         
         await browser_agent.stop()
+        await save_trace(ids, browser_agent)
+
+    async def run_leased():
+        async with lease.held():
+            await run_batch_browser()
+
+    asyncio.run(run_leased())
+
+@celery_app.task(name="worker.tasks.execute_bulk_payment")
+def execute_bulk_payment(transactions: list, message_id: str = None):
+    """
+    Pays an approved batch with one NEFT/RTGS bulk-upload file instead of one
+    form submission per transfer, then maps the portal's result table back to
+    per-transaction statuses.
+    """
+    if not transactions:
+        return
+    if message_id and was_delivered(message_id):
+        print(f"Skipping duplicate delivery {message_id} for bulk batch of {len(transactions)}")
+        return
+
+    ids = [tx.get("id") for tx in transactions]
+    rep_id = str(ids[0])
+    lease = payment_lease(ids)
+    if not lease.acquire():
+        print(f"Bulk batch {ids} overlaps transactions another worker is paying; skipping")
+        payment_outcome("skipped_leased", len(ids))
+        return
+    browser_agent = BrowserAgent(label=f"bulk_tx{rep_id}", feed_ids=ids)
+
+    async def set_status(to_status, from_statuses, tx_ids):
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        try:
+            return await transition(conn, to_status, from_statuses, ids=tx_ids, fence=lease.token)
+        finally:
+            await conn.close()
+
+    async def run_bulk_browser():
+        # Per-lease directory, so concurrent workers never share an upload file
+        bulk_path = render_bulk_file(BANK_FLOW, transactions, os.path.join("uploads", "bulk", f"lease{lease.token}"))
+        print(f"Bulk: rendered {len(transactions)} payments to {bulk_path}")
+
+        await browser_agent.start()
+        flow = FlowExecutor(browser_agent, load_plan(BANK_FLOW))
+        submitted = False
+        try:
+            with stage("login"):
+                await flow.run("login", bank_login_params())
+            with stage("form_fill"):
+                await flow.run("bulk_upload", {"bulk_file": os.path.abspath(bulk_path)})
+            if not await set_status(WAITING_FOR_PIN, QUEUED_FOR_PAYMENT, ids):
+                raise RuntimeError(f"Transactions {ids} are no longer {QUEUED_FOR_PAYMENT}")
+
+            # One PIN authorizes the whole file
+            with stage("pin_wait"):
+                pin = await browser_agent.wait_for_pin(rep_id)
+            lease.check()
+            submitted = True
+            with stage("confirm"):
+                *_, receipt, rows = await flow.run("bulk_confirm", {"pin": pin})
+            await save_evidence(ids, receipt)
+        except Exception as e:
+            print(f"Bulk Payment Failed: {e}")
+            if submitted:
+                # The file may have been processed; don't invite a second payment
+                print(f"⚠️ Bulk: failed after authorizing; transactions {ids} left in {WAITING_FOR_PIN} for reconciliation")
+                payment_outcome("unknown", len(ids))
+            else:
+                payment_outcome("failed", len(ids))
+                try:
+                    await set_status(FAILED, (QUEUED_FOR_PAYMENT, WAITING_FOR_PIN), ids)
+                except Exception as db_error:
+                    print(f"Bulk: Failed to mark batch FAILED: {db_error}")
+            await browser_agent.stop()
+            await save_trace(ids, browser_agent)
+            return
+
+        results = parse_results(rows or [])
+        paid = [tx_id for tx_id in ids if tx_id in results and results[tx_id].status == "SUCCESS"]
+        rejected = [tx_id for tx_id in ids if tx_id in results and results[tx_id].status != "SUCCESS"]
+        unknown = [tx_id for tx_id in ids if tx_id not in results]
+        for tx_id in rejected:
+            print(f"Bulk: transaction {tx_id} rejected by portal: {results[tx_id].reason}")
+        try:
+            if paid:
+                await set_status(PAID, WAITING_FOR_PIN, paid)
+            if rejected:
+                await set_status(FAILED, WAITING_FOR_PIN, rejected)
+        except Exception as e:
+            print(f"Bulk: Failed to record results: {e}")
+        if unknown:
+            # Not in the portal's report: the money may or may not have moved, so leave them for reconciliation
+            print(f"⚠️ Bulk: no result for transactions {unknown}; left in {WAITING_FOR_PIN}")
+        print(f"Bulk: {len(paid)} paid, {len(rejected)} rejected, {len(unknown)} unknown")
+        payment_outcome("paid", len(paid))
+        payment_outcome("rejected", len(rejected))
+        payment_outcome("unknown", len(unknown))
+
+        await browser_agent.stop()
+        await save_trace(ids, browser_agent)
+
+    async def run_leased():
+        async with lease.held():
+            await run_bulk_browser()
+
+    asyncio.run(run_leased())
+    if message_id:
+        mark_delivered(message_id)
+
+@celery_app.task(name="worker.tasks.send_notification_digest", bind=True, max_retries=NOTIFY_MAX_RETRIES)
+def send_notification_digest(self, recipient: str, body: str = None):
+    """
+    Sends everything collected for `recipient` as one message. Retries carry
+    the built body, since the events were already drained.
+    """
+    if body is None:
+        events = notification_coalescer.drain(recipient)
+        if not events:
+            return
+        body = build_digest(events)
+
+    try:
+        get_transport().send(recipient, body)
+    except Exception as e:
+        print(f"Notification to {recipient} failed (attempt {self.request.retries + 1}): {e}")
+        # Positional like the first run; kwargs alone would also repeat recipient from request.args
+        raise self.retry(args=(recipient, body), kwargs={}, countdown=NOTIFY_RETRY_BASE_SECONDS * 2 ** self.request.retries)
+
+@celery_app.task(name="worker.tasks.prune_evidence")
+def prune_evidence():
+    """Applies evidence retention and removes files nothing references."""
+    async def run_prune():
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        try:
+            removed = await evidence_store.prune(conn)
+            print(f"Evidence retention removed {removed} files")
+        finally:
+            await conn.close()
+
+    loop = asyncio.get_event_loop()
+    if loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    loop.run_until_complete(run_prune())
+
+@celery_app.task(name="worker.tasks.maintain_partitions")
+def maintain_partitions():
+    """Keeps monthly partitions ahead of the calendar and moves old terminal rows to cold tiers."""
+    async def run_maintenance():
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        try:
+            created = await partitions.ensure_partitions(conn)
+            moved = await partitions.archive(conn)
+            print(f"Partition maintenance: created {created or 'none'}, moved to cold {moved}")
+        finally:
+            await conn.close()
 
     loop = asyncio.get_event_loop()
     if loop.is_closed():
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_batch_browser())
+    loop.run_until_complete(run_maintenance())
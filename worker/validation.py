@@ -0,0 +1,98 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Optional
+
+IFSC_RE = re.compile(r"^[A-Z]{4}0[A-Z0-9]{6}$")
+ACCOUNT_RE = re.compile(r"^\d{9,18}$")
+REQUIRED_FIELDS = ("vendor", "amount", "account_number", "ifsc_code")
+
+AMOUNT_SUFFIXES = {
+    "k": Decimal("1000"),
+    "thousand": Decimal("1000"),
+    "l": Decimal("100000"),
+    "lac": Decimal("100000"),
+    "lakh": Decimal("100000"),
+    "lakhs": Decimal("100000"),
+    "cr": Decimal("10000000"),
+    "crore": Decimal("10000000"),
+    "crores": Decimal("10000000"),
+}
+
+AMOUNT_RE = re.compile(r"^(-?\d+(?:\.\d+)?)\s*([a-z]*)$")
+CURRENCY_RE = re.compile(r"(₹|\brs\.?|\binr\b|/-|,|\s+(?=[a-z]))", re.IGNORECASE)
+CENTS = Decimal("0.01")
+
+# Relative weight of each check in the confidence score
+WEIGHTS = {
+    "completeness": 0.4,
+    "account_format": 0.2,
+    "ifsc_format": 0.2,
+    "amounts": 0.2,
+}
+
+
+def is_transaction(obj) -> bool:
+    """Minimal shape check for a streamed row before it is persisted."""
+    return isinstance(obj, dict) and obj.get("vendor") not in (None, "") and obj.get("amount") not in (None, "")
+
+
+@lru_cache(maxsize=65536)
+def parse_amount(raw: str) -> Optional[Decimal]:
+    """'5k' -> 5000, '₹1,20,000' -> 120000, '1.5 lakh' -> 150000, 'Rs. 500/-' -> 500."""
+    text = CURRENCY_RE.sub("", raw.lower()).strip()
+    match = AMOUNT_RE.match(text)
+    if not match:
+        return None
+    number, suffix = match.groups()
+    if suffix and suffix not in AMOUNT_SUFFIXES:
+        return None
+    try:
+        value = Decimal(number) * AMOUNT_SUFFIXES.get(suffix, Decimal("1"))
+    except InvalidOperation:
+        return None
+    return value.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _amount(value) -> Optional[Decimal]:
+    """parse_amount for a raw model value, which may be a number or missing."""
+    if value is None or isinstance(value, bool) or value == "":
+        return None
+    return parse_amount(str(value))
+
+
+def score_extraction(result: dict):
+    """
+    Scores an extraction between 0 and 1.
+
+    Checks schema completeness, account-number and IFSC formats, and that
+    every amount parses and (when the document states one) sums to the total.
+    Returns (score, reasons) where reasons lists the failed checks.
+    """
+    transactions = [tx for tx in (result or {}).get("transactions") or [] if isinstance(tx, dict)]
+    if not transactions:
+        return 0.0, ["no_transactions"]
+
+    n = len(transactions)
+    filled = sum(1 for tx in transactions for f in REQUIRED_FIELDS if tx.get(f) not in (None, ""))
+    accounts_ok = sum(1 for tx in transactions if ACCOUNT_RE.match(re.sub(r"[\s-]", "", str(tx.get("account_number") or ""))))
+    ifsc_ok = sum(1 for tx in transactions if IFSC_RE.match(str(tx.get("ifsc_code") or "").strip().upper()))
+    amounts = [_amount(tx.get("amount")) for tx in transactions]
+    amounts_ok = sum(1 for a in amounts if a is not None and a > 0)
+
+    checks = {
+        "completeness": filled / (n * len(REQUIRED_FIELDS)),
+        "account_format": accounts_ok / n,
+        "ifsc_format": ifsc_ok / n,
+        "amounts": amounts_ok / n,
+    }
+
+    # A stated total that disagrees with the rows is a strong misread signal
+    stated_total = _amount(result.get("total"))
+    if stated_total is not None and amounts_ok == n:
+        if abs(sum(amounts) - stated_total) > Decimal("0.01") * max(1, n):
+            checks["amounts"] = 0.0
+
+    score = sum(WEIGHTS[name] * value for name, value in checks.items())
+    reasons = [name for name, value in checks.items() if value < 1.0]
+    return round(score, 3), reasons
@@ -0,0 +1,143 @@
+import os
+import re
+import math
+import time
+from datetime import datetime
+
+from worker.normalize import review_status
+
+# Minimum trigram similarity for a fuzzy match to fill bank details
+VENDOR_MATCH_THRESHOLD = float(os.getenv("VENDOR_MATCH_THRESHOLD", "0.75"))
+VENDOR_INDEX_REFRESH_SECONDS = int(os.getenv("VENDOR_INDEX_REFRESH_SECONDS", "60"))
+
+NAME_STRIP_RE = re.compile(r"[^a-z0-9 ]+")
+NAME_STOPWORDS = {"pvt", "private", "ltd", "limited", "llp", "inc", "co", "company", "the", "and", "ms"}
+AUTOFILL_NOTE = "Bank details auto-filled from vendor history"
+
+
+def normalize_vendor(name: str) -> str:
+    """'M/s. Sharma & Sons Pvt. Ltd.' -> 'sharma sons'."""
+    words = NAME_STRIP_RE.sub(" ", (name or "").lower().replace("m/s", " ")).split()
+    return " ".join(w for w in words if w not in NAME_STOPWORDS)
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class VendorIndex:
+    """
+    In-worker vendor name index that fills missing bank details.
+
+    Entries come from the `vendors` master table and from past PAID
+    transactions (newest wins). Lookups try the normalized name first and fall
+    back to trigram similarity over an inverted index, so a repeat vendor with
+    a slightly different spelling still resolves without a DB round-trip.
+    """
+
+    def __init__(self, threshold: float = VENDOR_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.entries = {}
+        self.grams = {}
+        self.postings = {}
+        self.last_vendor_id = 0
+        self.last_paid_at = datetime.min
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name: str, account_number: str, ifsc_code: str = None):
+        key = normalize_vendor(name)
+        if not key or not account_number:
+            return
+        if key not in self.entries:
+            self.grams[key] = trigrams(key)
+            for gram in self.grams[key]:
+                self.postings.setdefault(gram, set()).add(key)
+        self.entries[key] = (account_number, ifsc_code)
+
+    def lookup(self, name: str):
+        """Returns (account_number, ifsc_code, similarity) or None."""
+        key = normalize_vendor(name)
+        if not key:
+            return None
+        if key in self.entries:
+            return (*self.entries[key], 1.0)
+
+        # Prefix filter: a candidate reaching the threshold must share at least
+        # one of the query's rarest grams, so only those postings are scanned.
+        grams = sorted(trigrams(key), key=lambda g: len(self.postings.get(g, ())))
+        probe = len(grams) - math.ceil(self.threshold * len(grams)) + 1
+        candidates = set()
+        for gram in grams[:probe]:
+            candidates.update(self.postings.get(gram, ()))
+        if not candidates:
+            return None
+
+        query = set(grams)
+        scored = []
+        for candidate in candidates:
+            common = len(query & self.grams[candidate])
+            scored.append((common / (len(query) + len(self.grams[candidate]) - common), candidate))
+        scored.sort(reverse=True)
+
+        best_score, best_key = scored[0]
+        if best_score < self.threshold:
+            return None
+        # Two different accounts scoring the same is ambiguous; leave it to a human
+        if len(scored) > 1 and scored[1][0] == best_score and self.entries[scored[1][1]] != self.entries[best_key]:
+            return None
+        return (*self.entries[best_key], round(best_score, 3))
+
+    async def refresh(self, conn):
+        """Pulls vendors and PAID transactions added since the last refresh."""
+        vendors = await conn.fetch("""
+            SELECT id, name, account_number, ifsc_code FROM vendors
+            WHERE id > $1 AND account_number IS NOT NULL
+            ORDER BY id
+        """, self.last_vendor_id)
+        for row in vendors:
+            self.add(row["name"], row["account_number"], row["ifsc_code"])
+            self.last_vendor_id = row["id"]
+
+        paid = await conn.fetch("""
+            SELECT vendor, account_number, ifsc_code, updated_at FROM transactions
+            WHERE status = 'PAID' AND updated_at > $1 AND account_number IS NOT NULL
+            ORDER BY updated_at
+        """, self.last_paid_at)
+        for row in paid:
+            self.add(row["vendor"], row["account_number"], row["ifsc_code"])
+            self.last_paid_at = row["updated_at"]
+
+        self.refreshed_at = time.monotonic()
+        if vendors or paid:
+            print(f"Vendor index refreshed: +{len(vendors)} vendors, +{len(paid)} paid rows ({len(self)} total)")
+
+    async def ensure_fresh(self, conn):
+        if time.monotonic() - self.refreshed_at >= VENDOR_INDEX_REFRESH_SECONDS:
+            await self.refresh(conn)
+
+    def fill_missing(self, columns) -> int:
+        """
+        Fills account/IFSC in place for rows that lack an account number and
+        re-evaluates their status. Returns how many rows were filled.
+        """
+        filled = 0
+        for i, account in enumerate(columns.account_number):
+            if account:
+                continue
+            match = self.lookup(columns.vendor[i])
+            if not match:
+                continue
+            account_number, ifsc_code, _ = match
+            columns.account_number[i] = account_number
+            if ifsc_code and (not columns.ifsc_code[i] or "ifsc_invalid" in columns.errors[i]):
+                columns.ifsc_code[i] = ifsc_code
+                columns.errors[i] = [e for e in columns.errors[i] if e != "ifsc_invalid"]
+            columns.errors[i] = [e for e in columns.errors[i] if e not in ("account_missing", "account_invalid")]
+            columns.remarks[i] = f"{columns.remarks[i]} | {AUTOFILL_NOTE}" if columns.remarks[i] else AUTOFILL_NOTE
+            columns.status[i] = review_status(columns.errors[i])
+            filled += 1
+        return filled
@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import socket
+import threading
+
+import redis
+
+try:
+    import psutil
+except ImportError:  # watchdog disabled; Celery's own limits still apply
+    psutil = None
+
+# Recycle a pool process (with its browsers) after a task once the tree passes this; 0 disables
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "1500"))
+WORKER_WATCHDOG_INTERVAL_SECONDS = float(os.getenv("WORKER_WATCHDOG_INTERVAL_SECONDS", "15"))
+# Orphans younger than this may still be shutting down on their own
+ORPHAN_GRACE_SECONDS = 60
+BROWSER_PROCESS_RE = re.compile(r"chrom(e|ium)|headless_shell", re.IGNORECASE)
+PR_SET_CHILD_SUBREAPER = 36
+GAUGES_KEY = "worker:memory:{host}"
+EVENTS_KEY = "worker:memory:events"
+
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def is_browser(proc) -> bool:
+    try:
+        return bool(BROWSER_PROCESS_RE.search(proc.name()))
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+
+def is_our_headless_browser(proc) -> bool:
+    """Playwright-launched browsers only; a desktop Chrome on a dev machine is left alone."""
+    try:
+        return (is_browser(proc) and proc.uids().real == os.getuid()
+                and any(arg.startswith("--headless") for arg in proc.cmdline()))
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return False
+
+
+def tree_rss(pid: int) -> tuple:
+    """(own RSS, browser descendants' RSS, browser process count) in bytes for `pid`."""
+    root = psutil.Process(pid)
+    own = root.memory_info().rss
+    browser_rss, browsers = 0, 0
+    for child in root.children(recursive=True):
+        try:
+            rss = child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        if is_browser(child):
+            browser_rss += rss
+            browsers += 1
+        else:
+            # Playwright's driver and other helpers count against the process too
+            own += rss
+    return own, browser_rss, browsers
+
+
+def _record_event(name: str, amount: int = 1):
+    try:
+        redis.Redis.from_url(redis_url).hincrby(EVENTS_KEY, name, amount)
+    except Exception as e:
+        print(f"Failed to record watchdog event {name}: {e}")
+
+
+def install_recycle_check() -> bool:
+    """
+    Makes billiard's after-task memory check (worker_max_memory_per_child)
+    measure the pool process together with its browsers, so a leaking
+    process exits once its result is sent and the pool starts a fresh one.
+    Call in each pool process; returns False if this billiard can't be hooked.
+    """
+    if psutil is None or WORKER_MAX_RSS_MB <= 0:
+        return False
+    try:
+        import billiard.pool as pool
+    except ImportError:
+        return False
+    if not callable(getattr(pool, "mem_rss", None)):
+        return False
+
+    limit_kb = WORKER_MAX_RSS_MB * 1024
+
+    def mem_rss_kb():
+        own, browser_rss, _ = tree_rss(os.getpid())
+        used_kb = (own + browser_rss) // 1024
+        if used_kb > limit_kb:
+            print(f"Watchdog: process {os.getpid()} at {used_kb // 1024}MB (limit {WORKER_MAX_RSS_MB}MB), recycling")
+            _record_event("recycled")
+        return used_kb
+
+    pool.mem_rss = mem_rss_kb
+    return True
+
+
+def reap_orphans(now: float = None) -> int:
+    """
+    Kills browser processes left behind by a crashed or recycled pool process:
+    reparented to init or to this process (see `become_subreaper`) and older
+    than the grace period. Zombies we are the parent of are collected.
+    Returns how many were cleaned up.
+    """
+    now = now or time.time()
+    me = os.getpid()
+    reaped = 0
+    for proc in psutil.process_iter(["pid", "ppid", "create_time", "status"]):
+        info = proc.info
+        if info["ppid"] not in (1, me):
+            continue
+        if info["status"] == psutil.STATUS_ZOMBIE:
+            # Exited already; only its parent can collect it
+            if info["ppid"] == me and is_browser(proc):
+                try:
+                    os.waitpid(info["pid"], os.WNOHANG)
+                    reaped += 1
+                except ChildProcessError:
+                    pass
+            continue
+        if now - info["create_time"] < ORPHAN_GRACE_SECONDS or not is_our_headless_browser(proc):
+            continue
+        try:
+            for child in proc.children(recursive=True):
+                child.kill()
+            proc.kill()
+            reaped += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    if reaped:
+        print(f"Watchdog: reaped {reaped} orphan browser processes")
+        _record_event("orphans_reaped", reaped)
+    return reaped
+
+
+def become_subreaper() -> bool:
+    """
+    Linux only: browsers orphaned by a recycled pool process are reparented
+    to this process rather than to init, so `reap_orphans` sees them and can
+    collect their exit status.
+    """
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def sample(parent_pid: int = None) -> dict:
+    """Memory of every pool process under the worker's main process."""
+    parent = psutil.Process(parent_pid or os.getpid())
+    processes = {}
+    for child in parent.children():
+        if is_browser(child):
+            continue
+        try:
+            own, browser_rss, browsers = tree_rss(child.pid)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        processes[child.pid] = {"rss_mb": round(own / 2**20, 1), "browser_rss_mb": round(browser_rss / 2**20, 1),
+                                "browser_processes": browsers}
+    return processes
+
+
+def publish(processes: dict, host: str = None):
+    """Replaces this node's gauges; they expire if the node goes away."""
+    key = GAUGES_KEY.format(host=host or socket.gethostname())
+    fields = {}
+    for pid, values in processes.items():
+        for name, value in values.items():
+            fields[f"{pid}:{name}"] = value
+    try:
+        pipe = redis.Redis.from_url(redis_url).pipeline()
+        pipe.delete(key)
+        if fields:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, int(WORKER_WATCHDOG_INTERVAL_SECONDS * 3))
+        pipe.execute()
+    except Exception as e:
+        print(f"Failed to publish worker memory: {e}")
+
+
+class Watchdog:
+    """Background thread in the worker's main process: samples, publishes, reaps."""
+
+    def __init__(self, interval: float = WORKER_WATCHDOG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if psutil is None:
+            print("Watchdog: psutil not installed, memory watchdog disabled")
+            return
+        become_subreaper()
+        self.thread = threading.Thread(target=self.run, name="memory-watchdog", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                publish(sample())
+                reap_orphans()
+            except Exception as e:
+                print(f"Watchdog pass failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def worker_memory_stats(redis_client) -> dict:
+    """Per-node, per-process memory plus recycle and reap totals."""
+    def text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    nodes = {}
+    for key in redis_client.scan_iter(match=GAUGES_KEY.format(host="*")):
+        host = text(key).split(":", 2)[2]
+        if host == "events":
+            continue
+        processes = {}
+        for field, value in redis_client.hgetall(key).items():
+            pid, name = text(field).split(":", 1)
+            processes.setdefault(pid, {})[name] = float(value)
+        nodes[host] = processes
+    events = {text(k): int(v) for k, v in redis_client.hgetall(EVENTS_KEY).items()}
+    return {"nodes": nodes, "recycled": events.get("recycled", 0), "orphans_reaped": events.get("orphans_reaped", 0)}